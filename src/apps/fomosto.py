@@ -8,6 +8,7 @@ from builtins import range
 
 import sys
 import re
+import time
 import os.path as op
 import logging
 import copy
@@ -42,6 +43,8 @@ subcommand_descriptions = {
     'download':      'download GF store from a server',
     'modelview':     'plot earthmodels',
     'upgrade':       'upgrade store format to latest version',
+    'compress':      'convert GF store to compressed format',
+    'decompress':    'convert GF store to uncompressed format',
     'addref':        'import citation references to GF store config',
     'qc':            'quality check',
     'report':        "report for Green's Function databases",
@@ -66,6 +69,8 @@ subcommand_usages = {
     'download':      'download [options] <site> <store-id>',
     'modelview':     'modelview <selection>',
     'upgrade':       'upgrade [store-dir] ...',
+    'compress':      'compress [store-dir] ... [options]',
+    'decompress':    'decompress [store-dir] ... [options]',
     'addref':        'addref [store-dir] ... <filename> ...',
     'qc':            'qc [store-dir]',
     'report':        'report <subcomamnd> <arguments>... [options]'
@@ -96,6 +101,8 @@ Subcommands:
     download      %(download)s
     modelview     %(modelview)s
     upgrade       %(upgrade)s
+    compress      %(compress)s
+    decompress    %(decompress)s
     addref        %(addref)s
     qc            %(qc)s
     report        %(report)s
@@ -857,11 +864,8 @@ def command_tttview(args):
             store.config.source_depth_max - store.config.source_depth_min)/2.
 
     if isinstance(store.config, gf.ConfigTypeA):
-        arrivals = num.empty(num_d)
         for phase_id in phase_ids:
-            arrivals[:] = num.NAN
-            for i, d in enumerate(distances):
-                arrivals[i] = store.t(phase_id, (depth, d))
+            arrivals = store.t(phase_id, (depth, distances))
             axes.plot(distances/1000, arrivals, label=phase_id)
         axes.set_title('source depth %s km' % (depth/1000))
         axes.set_xlabel('distance [km]')
@@ -873,6 +877,8 @@ def command_tttview(args):
 
 
 def command_tttextract(args):
+    import numpy as num
+
     def setup(parser):
         parser.add_option(
             '--output', dest='output_fn', metavar='TEMPLATE',
@@ -904,14 +910,16 @@ def command_tttextract(args):
 
     try:
         store = gf.Store(store_dir)
-        for args in store.config.iter_extraction(gdef, level=-1):
+        points = num.array(
+            list(store.config.iter_extraction(gdef, level=-1)),
+            dtype=num.float)
+
+        times = [store.t(phase, tuple(points.T)) for phase in phases]
+
+        for ipoint, args in enumerate(points):
             s = ['%e' % x for x in args]
-            for phase in phases:
-                t = store.t(phase, args)
-                if t is not None:
-                    s.append('%e' % t)
-                else:
-                    s.append('nan')
+            for times_phase in times:
+                s.append('%e' % times_phase[ipoint])
 
             if options.output_fn:
                 d = dict(
@@ -1094,6 +1102,57 @@ def command_upgrade(args):
         die(e)
 
 
+def recode_stores(command, args, setup=None):
+    parser, options, args = cl_parse(command, args, setup=setup)
+    store_dirs = get_store_dirs(args)
+    try:
+        for store_dir in store_dirs:
+            store = gf.Store(store_dir)
+            size_before = store.size_data
+            t0 = time.time()
+            if command == 'compress':
+                store.compress(
+                    accuracy=options.accuracy, show_progress=True)
+            else:
+                store.decompress(show_progress=True)
+
+            duration = time.time() - t0
+            size_after = store.size_data
+
+            store = gf.Store(store_dir)
+            nrecords, nsamples, duration_get = store.benchmark_get()
+
+            print('%s:' % store_dir)
+            print('  size of traces file: %s -> %s (ratio %.2f)' % (
+                util.human_bytesize(size_before),
+                util.human_bytesize(size_after),
+                float(size_before) / max(1, size_after)))
+
+            print('  conversion time: %.1f s' % duration)
+            print('  retrieval of %i records: %.3f s (%.2g samples/s)' % (
+                nrecords, duration_get,
+                nsamples / max(1e-9, duration_get)))
+
+    except gf.StoreError as e:
+        die(e)
+
+
+def command_compress(args):
+
+    def setup(parser):
+        parser.add_option(
+            '--accuracy', dest='accuracy', type='float', default=1e-5,
+            metavar='FLOAT',
+            help='quantization step size relative to the maximum absolute '
+                 'value of each trace. Default is %default.')
+
+    recode_stores('compress', args, setup=setup)
+
+
+def command_decompress(args):
+    recode_stores('decompress', args)
+
+
 def command_addref(args):
     parser, options, args = cl_parse('addref', args)
 
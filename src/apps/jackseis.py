@@ -16,6 +16,7 @@ from optparse import OptionParser
 import numpy as num
 
 from .. import util, config, pile, model, io, trace
+from ..parimap import parimap
 
 pjoin = os.path.join
 
@@ -68,6 +69,69 @@ def nice_seconds_floor(s):
     return s
 
 
+def process_window(window, pshared):
+    '''
+    Process the traces of one time window.
+
+    Runs in a worker process when ``--parallel`` is used, so it must only
+    depend on its (picklable) arguments. Returns the processed traces and
+    the additional template values for the output file names. The traces
+    are saved by the main process, so that output files are written in the
+    same way as in sequential mode.
+    '''
+
+    traces, twmin, twmax = window
+    target_deltat = pshared['target_deltat']
+    output_data_type = pshared['output_data_type']
+    replacements = pshared['replacements']
+
+    if target_deltat is not None:
+        out_traces = []
+        for tr in traces:
+            try:
+                tr.downsample_to(
+                    target_deltat, snap=True, demean=False)
+
+                if output_data_type == 'same':
+                    tr.ydata = tr.ydata.astype(tr.ydata.dtype)
+
+                tr.chop(twmin, twmax)
+                out_traces.append(tr)
+
+            except (trace.TraceTooShort, trace.NoData):
+                pass
+
+        traces = out_traces
+
+    if output_data_type != 'same':
+        for tr in traces:
+            tr.ydata = tr.ydata.astype(
+                name_to_dtype[output_data_type])
+
+    if replacements:
+        for tr in traces:
+            r = {}
+            for k, pat, repl in replacements:
+                oldval = getattr(tr, k)
+                newval, n = re.subn(pat, repl, oldval)
+                if n:
+                    r[k] = newval
+
+            tr.set_codes(**r)
+
+    additional = dict(
+        wmin_year=tts(twmin, format='%Y'),
+        wmin_month=tts(twmin, format='%m'),
+        wmin_day=tts(twmin, format='%d'),
+        wmin=tts(twmin, format='%Y-%m-%d_%H-%M-%S'),
+        wmax_year=tts(twmax, format='%Y'),
+        wmax_month=tts(twmax, format='%m'),
+        wmax_day=tts(twmax, format='%d'),
+        wmax=tts(twmax, format='%Y-%m-%d_%H-%M-%S'))
+
+    return traces, additional
+
+
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
@@ -115,6 +179,35 @@ def main(args=None):
         help='use directory DIR to cache trace metadata '
              '(default=\'%default\')')
 
+    parser.add_option(
+        '--scan-nprocs',
+        dest='scan_nprocs',
+        type='int',
+        default=1,
+        metavar='N',
+        help='use N processes to scan the headers of files not yet in the '
+             'cache, 0 to use all available cores [default: %default]')
+
+    parser.add_option(
+        '--prefetch',
+        dest='prefetch',
+        type='int',
+        default=0,
+        metavar='N',
+        help='read data for up to N time windows ahead in a background '
+             'thread, not used with --parallel [default: %default]')
+
+    parser.add_option(
+        '--parallel',
+        dest='parallel',
+        type='int',
+        default=1,
+        metavar='N',
+        help='process time windows in N worker processes, 0 to use all '
+             'available cores. Output is written by the main process in the '
+             'same order as in sequential mode, with at most N windows in '
+             'flight [default: %default]')
+
     parser.add_option(
         '--quiet',
         dest='quiet',
@@ -325,7 +418,8 @@ def main(args=None):
         regex=options.regex,
         fileformat=options.format,
         cachedirname=options.cache_dir,
-        show_progress=not options.quiet)
+        show_progress=not options.quiet,
+        nprocs=options.scan_nprocs or None)
 
     if p.tmin is None:
         die('data selection is empty')
@@ -367,7 +461,15 @@ def main(args=None):
             die('use --tinc=huge to really produce such large output files '
                 'or use --tinc=INC to split into smaller files.')
 
-    kwargs = dict(tmin=tmin, tmax=tmax, tinc=tinc, tpad=tpad)
+    prefetch = options.prefetch
+    if prefetch and options.parallel != 1:
+        # worker processes must not be forked while the prefetching thread
+        # is running, the main process reads ahead while the workers are busy
+        logger.warning('--prefetch is not used with --parallel')
+        prefetch = 0
+
+    kwargs = dict(tmin=tmin, tmax=tmax, tinc=tinc, tpad=tpad,
+                  prefetch=prefetch)
 
     if options.traversal == 'channel-by-channel':
         it = p.chopper_grouped(gather=lambda tr: tr.nslc_id, **kwargs)
@@ -385,65 +487,50 @@ def main(args=None):
 
     old = signal.signal(signal.SIGINT, got_sigint)
 
-    for traces in it:
-        if traces:
-            twmin = min(tr.wmin for tr in traces)
-            twmax = max(tr.wmax for tr in traces)
-            logger.info('processing %s - %s, %i traces' %
-                        (tts(twmin), tts(twmax), len(traces)))
-
-            if target_deltat is not None:
-                out_traces = []
-                for tr in traces:
-                    try:
-                        tr.downsample_to(
-                            target_deltat, snap=True, demean=False)
-
-                        if options.output_data_type == 'same':
-                            tr.ydata = tr.ydata.astype(tr.ydata.dtype)
-
-                        tr.chop(tr.wmin, tr.wmax)
-                        out_traces.append(tr)
-
-                    except (trace.TraceTooShort, trace.NoData):
-                        pass
-
-                traces = out_traces
-
-            if options.output_data_type != 'same':
-                for tr in traces:
-                    tr.ydata = tr.ydata.astype(
-                        name_to_dtype[options.output_data_type])
-
-            if replacements:
-                for tr in traces:
-                    r = {}
-                    for k, pat, repl in replacements:
-                        oldval = getattr(tr, k)
-                        newval, n = re.subn(pat, repl, oldval)
-                        if n:
-                            r[k] = newval
-
-                    tr.set_codes(**r)
-
-            if output_path:
-                try:
-                    io.save(traces, output_path, format=options.output_format,
-                            overwrite=options.force,
-                            additional=dict(
-                                wmin_year=tts(twmin, format='%Y'),
-                                wmin_month=tts(twmin, format='%m'),
-                                wmin_day=tts(twmin, format='%d'),
-                                wmin=tts(twmin, format='%Y-%m-%d_%H-%M-%S'),
-                                wmax_year=tts(twmax, format='%Y'),
-                                wmax_month=tts(twmax, format='%m'),
-                                wmax_day=tts(twmax, format='%d'),
-                                wmax=tts(twmax, format='%Y-%m-%d_%H-%M-%S')))
-                except io.FileSaveError as e:
-                    die(str(e))
-
-        if abort:
-            break
+    def windows():
+        for traces in it:
+            if traces:
+                twmin = min(tr.wmin for tr in traces)
+                twmax = max(tr.wmax for tr in traces)
+                logger.info('processing %s - %s, %i traces' %
+                            (tts(twmin), tts(twmax), len(traces)))
+
+                yield traces, twmin, twmax
+
+            if abort:
+                break
+
+    settings = dict(
+        target_deltat=target_deltat,
+        output_data_type=options.output_data_type,
+        replacements=replacements)
+
+    try:
+        writer = io.get_writer(
+            output_path, format=options.output_format,
+            overwrite=options.force)
+
+    except io.UnsupportedFormat:
+        writer = None
+
+    try:
+        for traces, additional in parimap(
+                process_window, windows(), nprocs=options.parallel or None,
+                pshared=settings):
+
+            if writer is not None:
+                writer.write(traces, additional=additional)
+            else:
+                io.save(
+                    traces, output_path, format=options.output_format,
+                    overwrite=options.force, additional=additional)
+
+    except io.FileSaveError as e:
+        die(str(e))
+
+    finally:
+        if writer is not None:
+            writer.close()
 
     signal.signal(signal.SIGINT, old)
 
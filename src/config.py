@@ -9,7 +9,7 @@ from copy import deepcopy
 
 from . import util
 from .guts import Object, Float, String, load, dump, List, Dict, TBase, \
-    Tuple, StringChoice, Bool
+    Tuple, StringChoice, Bool, Int
 
 guts_prefix = 'pf'
 
@@ -100,6 +100,13 @@ class PyrockoConfig(ConfigBase):
     gui_toolkit = StringChoice.T(
         choices=['auto', 'qt4', 'qt5'],
         default='auto')
+    pile_cache_backend = StringChoice.T(
+        choices=['pickle', 'sqlite'],
+        default='pickle')
+    object_cache = Bool.T(default=True)
+    object_cache_size = Int.T(default=256*1024**2)
+    gf_store_cache_size = Int.T(default=1024**3)
+    gf_store_readahead = Int.T(default=256*1024)
 
 
 config_cls = {
@@ -6,19 +6,169 @@ from __future__ import absolute_import, division
 from builtins import range
 
 import os
+import math
+import time
+import shutil
 import signal
 import errno
+import logging
+import multiprocessing
+from collections import defaultdict
 from os.path import join as pjoin
 import numpy as num
 
+from pyrocko import util
 from pyrocko.parimap import parimap
 from . import store
 
+logger = logging.getLogger('pyrocko.gf.builder')
+
 
 def int_arr(*args):
     return num.array(args, dtype=num.int)
 
 
+def shard_dir(store_dir):
+    return pjoin(store_dir, '.shards')
+
+
+def shard_path(store_dir, step, iblock, isub=0, nsub=1):
+    if nsub == 1:
+        name = '%i-%i' % (step, iblock)
+    else:
+        name = '%i-%i-%i-%i' % (step, iblock, isub, nsub)
+
+    return pjoin(shard_dir(store_dir), name + store.StoreShard.suffix)
+
+
+def read_status(status_fn):
+    '''
+    Read finished blocks from build status file.
+
+    Each line of the file holds step and block index, optionally followed by
+    the duration of the computation in [s] and, for parts of split blocks,
+    the part index and the number of parts.
+
+    :returns: dict mapping ``(step, iblock, isub, nsub)`` to duration
+        (``None`` if unknown)
+    '''
+
+    done = {}
+    with open(status_fn, 'r') as status:
+        for line in status:
+            toks = line.split()
+            if not toks:
+                continue
+
+            step, iblock = int(toks[0]), int(toks[1])
+            duration = float(toks[2]) if len(toks) > 2 else None
+            if len(toks) > 4:
+                isub, nsub = int(toks[3]), int(toks[4])
+            else:
+                isub, nsub = 0, 1
+
+            done[step, iblock, isub, nsub] = duration
+
+    return done
+
+
+def write_status(status_fn, step, iblock, isub, nsub, duration):
+    with open(status_fn, 'a') as status:
+        if nsub == 1:
+            status.write('%i %i %g\n' % (step, iblock, duration))
+        else:
+            status.write('%i %i %g %i %i\n' % (
+                step, iblock, duration, isub, nsub))
+
+
+def schedule_blocks(builder, done, nprocs=1, split=False):
+    '''
+    Get work items for unfinished blocks of a build step.
+
+    The cost of each block is estimated with
+    :py:meth:`Builder.estimate_block_cost`. Where durations of finished
+    blocks are known, the estimates are calibrated with the time per unit of
+    estimated cost measured on finished blocks in the same row of the block
+    grid (e.g. the same source depth) or, if there are none, on all finished
+    blocks. Work items are sorted by decreasing cost, so that long running
+    blocks are started first.
+
+    If ``split`` is ``True``, blocks expected to take longer than a fraction
+    of the total build time per worker are split into parts along the last
+    dimension of the block grid.
+
+    :param builder: :py:class:`Builder` instance for the step
+    :param done: finished blocks, as returned by :py:func:`read_status`
+    :param nprocs: number of parallel workers
+    :param split: whether blocks may be split
+    :returns: list of ``(iblock, isub, nsub)`` tuples
+    '''
+
+    step = builder.step
+    parts = defaultdict(lambda: defaultdict(dict))
+    for (step_, iblock, isub, nsub), duration in done.items():
+        if step_ == step:
+            parts[iblock][nsub][isub] = duration
+
+    dims = builder.block_dims
+    rates = defaultdict(list)
+    pending = []
+    for iblock in builder.all_block_indices():
+        cost = builder.estimate_block_cost(iblock)
+        complete = [
+            subs for (nsub, subs) in parts[iblock].items()
+            if len(subs) == nsub]
+
+        if complete:
+            durations = list(complete[0].values())
+            if None not in durations and cost > 0.:
+                row = num.unravel_index(iblock, dims)[:-1]
+                rates[row].append(sum(durations) / cost)
+
+        else:
+            pending.append((iblock, cost))
+
+    rates_all = [rate for row_rates in rates.values() for rate in row_rates]
+    rate_default = num.median(rates_all) if rates_all else 1.0
+
+    costs = []
+    for iblock, cost in pending:
+        row = num.unravel_index(iblock, dims)[:-1]
+        rate = num.mean(rates[row]) if rates.get(row) else rate_default
+        costs.append(cost * rate)
+
+    cost_max = sum(costs) / (2. * nprocs)
+
+    items = []
+    for (iblock, _), cost in zip(pending, costs):
+        if parts[iblock]:
+            # continue with the partitioning used before
+            nsub, subs = max(
+                parts[iblock].items(), key=lambda x: len(x[1]))
+        else:
+            nsub, subs = 1, {}
+            if split and cost_max > 0. and cost > cost_max:
+                # keep at least two nodes per part
+                ibegins, iends = builder.get_block(iblock)
+                nsub = max(1, min(
+                    int(math.ceil(cost / cost_max)),
+                    int(iends[-1] - ibegins[-1]) // 2))
+
+        for isub in range(nsub):
+            if isub not in subs:
+                items.append((cost / nsub, iblock, isub, nsub))
+
+    items.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+    nsplit = len(set(item[1] for item in items if item[3] != 1))
+    if nsplit:
+        logger.info(
+            'Splitting %i long running block%s into smaller parts.' % (
+                nsplit, ('s', '')[nsplit == 1]))
+
+    return [item[1:] for item in items]
+
+
 class Interrupted(store.StoreError):
     def __str__(self):
         return 'Interrupted.'
@@ -27,6 +177,11 @@ class Interrupted(store.StoreError):
 class Builder(object):
     nsteps = 1
 
+    # Blocks of single step builders can be split into parts, which are
+    # computed independently. Multi-step builders keep per-block
+    # intermediate results between steps and must not be split.
+    splittable = True
+
     def __init__(self, gf_config, step, block_size=None, force=False):
         if block_size is None:
             if len(gf_config.ns) == 3:
@@ -40,6 +195,8 @@ class Builder(object):
         self.force = force
         self.gf_config = gf_config
         self._block_size = int_arr(*block_size)
+        self._isub = 0
+        self._nsub = 1
 
     @property
     def nblocks(self):
@@ -57,8 +214,45 @@ class Builder(object):
         iblock = num.unravel_index(index, dims)
         ibegins = iblock * self._block_size
         iends = num.minimum(ibegins + self._block_size, self.gf_config.ns)
+        if self._nsub != 1:
+            ioffset = ibegins[-1]
+            n = iends[-1] - ioffset
+            ibegins[-1] = ioffset + (n * self._isub) // self._nsub
+            iends[-1] = ioffset + (n * (self._isub + 1)) // self._nsub
+
         return ibegins, iends
 
+    def set_part(self, isub, nsub):
+        '''
+        Restrict blocks to a part, split along the last dimension.
+
+        :param isub: index of the part
+        :param nsub: number of parts
+        '''
+
+        assert 0 <= isub < nsub
+        self._isub = isub
+        self._nsub = nsub
+
+    def estimate_block_cost(self, index):
+        '''
+        Estimate relative computational cost of a block from its geometry.
+
+        By default, the cost is taken proportional to the number of GF nodes
+        in the block, weighted by source-receiver distance, as traces get
+        longer at larger distances. Builders may override this with a better
+        model of their modelling code.
+        '''
+
+        ibegins, iends = self.get_block(index)
+        cost = float(num.prod(iends - ibegins))
+        conf = self.gf_config
+        if getattr(conf, 'distance_max', 0.) > 0.:
+            begins, ends, _ = self.get_block_extents(index)
+            cost *= 1.0 + 0.5 * (begins[-1] + ends[-1]) / conf.distance_max
+
+        return cost
+
     def get_block_extents(self, index):
         ibegins, iends = self.get_block(index)
         begins = self.gf_config.mins + ibegins * self.gf_config.deltas
@@ -68,9 +262,21 @@ class Builder(object):
     @classmethod
     def __work_block(cls, args):
         try:
-            store_dir, step, iblock, shared, force = args
+            store_dir, step, iblock, isub, nsub, shared, force = args
+            tstart = time.time()
             builder = cls(store_dir, step, shared, force=force)
-            builder.work_block(iblock)
+            builder.set_part(isub, nsub)
+            shard = builder.store.open_shard(
+                shard_path(store_dir, step, iblock, isub, nsub))
+
+            try:
+                builder.work_block(iblock)
+            except BaseException:
+                builder.store.close_shard(abort=True)
+                raise
+
+            builder.store.close_shard()
+
         except KeyboardInterrupt:
             raise Interrupted()
         except IOError as e:
@@ -79,7 +285,27 @@ class Builder(object):
             else:
                 raise
 
-        return store_dir, step, iblock
+        return (store_dir, step, iblock, isub, nsub, shard.nrecords,
+                shard.nbytes, time.time() - tstart)
+
+    @staticmethod
+    def merge_shards(store_dir):
+        '''
+        Merge shard files written by the workers into the store.
+        '''
+
+        tstart = time.time()
+        st = store.Store(store_dir, 'w')
+        try:
+            nshards, nrecords = st.merge_shards(shard_dir(store_dir))
+        finally:
+            st.close()
+
+        if nshards:
+            logger.info(
+                'Merged %i shard%s with %i records into store in %.1f s.' % (
+                    nshards, ('s', '')[nshards == 1], nrecords,
+                    time.time() - tstart))
 
     @classmethod
     def build(cls, store_dir, force=False, nworkers=None, continue_=False,
@@ -92,24 +318,25 @@ class Builder(object):
         if iblock is not None and step is None and cls.nsteps != 1:
             raise store.StoreError('--step option must be given')
 
-        done = set()
+        done = {}
         status_fn = pjoin(store_dir, '.status')
 
         if not continue_ and iblock in (None, -1) and step in (None, 0):
             store.Store.create_dependants(store_dir, force)
+            if os.path.exists(shard_dir(store_dir)):
+                shutil.rmtree(shard_dir(store_dir))
 
         if iblock is None:
             if not continue_:
-                with open(status_fn, 'w') as status:
+                with open(status_fn, 'w'):
                     pass
             else:
-                if iblock is None:
-                    try:
-                        with open(status_fn, 'r') as status:
-                            for line in status:
-                                done.add(tuple(int(x) for x in line.split()))
-                    except IOError:
-                        raise store.StoreError('nothing to continue')
+                try:
+                    done = read_status(status_fn)
+                except IOError:
+                    raise store.StoreError('nothing to continue')
+
+        nprocs = nworkers or multiprocessing.cpu_count()
 
         shared = {}
         for step in steps:
@@ -118,17 +345,19 @@ class Builder(object):
                 raise store.StoreError('invalid step: %i' % (step+1))
 
             if iblock in (None, -1):
-                iblocks = [x for x in builder.all_block_indices()
-                           if (step, x) not in done]
+                items = schedule_blocks(
+                    builder, done, nprocs=nprocs,
+                    split=(iblock is None and nprocs > 1
+                           and cls.nsteps == 1 and cls.splittable))
             else:
                 if not (0 <= iblock < builder.nblocks):
                     raise store.StoreError(
                         'invalid block index %i' % (iblock+1))
 
-                iblocks = [iblock]
+                items = [(iblock, 0, 1)]
 
             if iblock == -1:
-                for i in iblocks:
+                for i, _, _ in items:
                     c = ['fomosto', 'build']
                     if not os.path.samefile(store_dir, '.'):
                         c.append("'%s'" % store_dir)
@@ -144,23 +373,45 @@ class Builder(object):
 
             del builder
 
+            util.ensuredir(shard_dir(store_dir))
+
             original = signal.signal(signal.SIGINT, signal.SIG_IGN)
             try:
-                for x in parimap(
+                tstart = time.time()
+                nrecords_total = 0
+                for idone, x in enumerate(parimap(
                         cls.__work_block,
-                        [(store_dir, step, i, shared, force)
-                         for i in iblocks],
+                        [(store_dir, step, i, isub, nsub, shared, force)
+                         for (i, isub, nsub) in items],
                         nprocs=nworkers, eprintignore=(
-                            Interrupted, store.StoreError)):
-
-                    store_dir, step, i = x
-                    with open(status_fn, 'a') as status:
-                        status.write('%i %i\n' % (step, i))
+                            Interrupted, store.StoreError))):
+
+                    store_dir, step, i, isub, nsub, nrecords, nbytes, \
+                        duration = x
+
+                    write_status(status_fn, step, i, isub, nsub, duration)
+
+                    nrecords_total += nrecords
+                    elapsed = time.time() - tstart
+                    logger.info(
+                        'Step %i, block %i%s done (%i/%i): %i records, %s in '
+                        '%.1f s (%.1f records/s); total %.1f records/s.' % (
+                            step+1, i+1,
+                            ' (part %i/%i)' % (isub+1, nsub)
+                            if nsub != 1 else '',
+                            idone+1, len(items), nrecords,
+                            util.human_bytesize(nbytes), duration,
+                            nrecords / duration if duration > 0. else 0.,
+                            nrecords_total / elapsed if elapsed > 0. else 0.))
 
             finally:
                 signal.signal(signal.SIGINT, original)
 
+            cls.merge_shards(store_dir)
+
         os.remove(status_fn)
+        if iblock is None:
+            shutil.rmtree(shard_dir(store_dir))
 
 
 __all__ = ['Builder']
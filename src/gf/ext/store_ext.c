@@ -26,6 +26,7 @@
 #include <unistd.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <pthread.h>
 #if defined(_OPENMP)
     #include <omp.h>
 #endif
@@ -196,6 +197,11 @@ const mapping_scheme_t mapping_schemes[] = {
 #define REC_ZERO 1
 #define REC_SHORT 2
 
+/* highest bit of data_offset marks compressed records */
+#define REC_COMPRESSED ((uint64_t)1 << 63)
+#define COMPRESSED_HEADER_SIZE (4+4)
+#define COMPRESSED_GROUP_SIZE 64
+
 typedef struct {
     uint64_t data_offset;
     int32_t itmin;
@@ -204,6 +210,224 @@ typedef struct {
     gf_dtype end_value;
 } record_t;
 
+/* Bounded LRU cache for records which are read with pread or which have to
+ * be decoded. The byte budget is shared by all open stores. Entries handed
+ * out by store_get are pinned until released with store_release. */
+
+typedef struct cache_entry_s cache_entry_t;
+
+typedef struct {
+    cache_entry_t **entries;
+    uint64_t nrecords;
+    size_t nbytes;
+    uint64_t nentries;
+    uint64_t nhits;
+    uint64_t nmisses;
+    uint64_t nevictions;
+    uint64_t nreadahead;
+} store_cache_t;
+
+struct cache_entry_s {
+    store_cache_t *owner;
+    uint64_t irecord;
+    size_t nbytes;
+    int32_t refcount;
+    gf_dtype *data;
+    cache_entry_t *newer;
+    cache_entry_t *older;
+};
+
+#define CACHE_SIZE_DEFAULT ((size_t)1024*1024*1024)
+#define CACHE_READAHEAD_DEFAULT ((size_t)256*1024)
+#define CACHE_READAHEAD_NRECORDS_MAX 1024
+
+static struct {
+    cache_entry_t *newest;
+    cache_entry_t *oldest;
+    size_t nbytes;
+    size_t nbytes_max;
+    size_t readahead;
+} record_cache = { NULL, NULL, 0, CACHE_SIZE_DEFAULT, CACHE_READAHEAD_DEFAULT };
+
+static pthread_mutex_t record_cache_mutex = PTHREAD_MUTEX_INITIALIZER;
+
+static void cache_unlink(cache_entry_t *entry) {
+    if (NULL != entry->newer) {
+        entry->newer->older = entry->older;
+    } else {
+        record_cache.newest = entry->older;
+    }
+    if (NULL != entry->older) {
+        entry->older->newer = entry->newer;
+    } else {
+        record_cache.oldest = entry->newer;
+    }
+    entry->newer = NULL;
+    entry->older = NULL;
+}
+
+static void cache_push(cache_entry_t *entry) {
+    entry->older = record_cache.newest;
+    entry->newer = NULL;
+    if (NULL != record_cache.newest) {
+        record_cache.newest->newer = entry;
+    }
+    record_cache.newest = entry;
+    if (NULL == record_cache.oldest) {
+        record_cache.oldest = entry;
+    }
+}
+
+static void cache_remove(cache_entry_t *entry) {
+    cache_unlink(entry);
+    entry->owner->entries[entry->irecord] = NULL;
+    entry->owner->nbytes -= entry->nbytes;
+    entry->owner->nentries--;
+    record_cache.nbytes -= entry->nbytes;
+    free(entry->data);
+    free(entry);
+}
+
+static void cache_evict(void) {
+    cache_entry_t *entry, *newer;
+
+    entry = record_cache.oldest;
+    while (NULL != entry && record_cache.nbytes > record_cache.nbytes_max) {
+        newer = entry->newer;
+        if (0 == entry->refcount) {
+            entry->owner->nevictions++;
+            cache_remove(entry);
+        }
+        entry = newer;
+    }
+}
+
+static cache_entry_t *cache_lookup(store_cache_t *cache, uint64_t irecord) {
+    cache_entry_t *entry;
+
+    pthread_mutex_lock(&record_cache_mutex);
+    entry = cache->entries[irecord];
+    if (NULL != entry) {
+        entry->refcount++;
+        cache_unlink(entry);
+        cache_push(entry);
+        cache->nhits++;
+    } else {
+        cache->nmisses++;
+    }
+    pthread_mutex_unlock(&record_cache_mutex);
+    return entry;
+}
+
+/* Takes ownership of data. If pin is set, the entry is pinned and returned
+ * in *pinned. */
+static store_error_t cache_insert(
+        store_cache_t *cache,
+        uint64_t irecord,
+        gf_dtype *data,
+        size_t nbytes,
+        int pin,
+        cache_entry_t **pinned) {
+
+    cache_entry_t *entry;
+
+    pthread_mutex_lock(&record_cache_mutex);
+    entry = cache->entries[irecord];
+    if (NULL != entry) {
+        free(data);
+    } else {
+        entry = (cache_entry_t*)calloc(1, sizeof(cache_entry_t));
+        if (NULL == entry) {
+            pthread_mutex_unlock(&record_cache_mutex);
+            free(data);
+            return ALLOC_FAILED;
+        }
+        entry->owner = cache;
+        entry->irecord = irecord;
+        entry->nbytes = nbytes;
+        entry->data = data;
+        cache->entries[irecord] = entry;
+        cache->nbytes += nbytes;
+        cache->nentries++;
+        record_cache.nbytes += nbytes;
+        cache_push(entry);
+        if (!pin) {
+            cache->nreadahead++;
+        }
+    }
+
+    if (pin) {
+        entry->refcount++;
+        cache_unlink(entry);
+        cache_push(entry);
+        *pinned = entry;
+    }
+
+    cache_evict();
+    pthread_mutex_unlock(&record_cache_mutex);
+    return SUCCESS;
+}
+
+static int cache_contains(store_cache_t *cache, uint64_t irecord) {
+    int contains;
+
+    pthread_mutex_lock(&record_cache_mutex);
+    contains = NULL != cache->entries[irecord];
+    pthread_mutex_unlock(&record_cache_mutex);
+    return contains;
+}
+
+static void cache_release(cache_entry_t *entry) {
+    pthread_mutex_lock(&record_cache_mutex);
+    entry->refcount--;
+    cache_evict();
+    pthread_mutex_unlock(&record_cache_mutex);
+}
+
+static void cache_configure(size_t nbytes_max, size_t readahead) {
+    pthread_mutex_lock(&record_cache_mutex);
+    record_cache.nbytes_max = nbytes_max;
+    record_cache.readahead = readahead;
+    cache_evict();
+    pthread_mutex_unlock(&record_cache_mutex);
+}
+
+static store_cache_t *store_cache_new(uint64_t nrecords) {
+    store_cache_t *cache;
+
+    if (nrecords > SIZE_MAX / sizeof(cache_entry_t*)) {
+        return NULL;
+    }
+
+    cache = (store_cache_t*)calloc(1, sizeof(store_cache_t));
+    if (NULL == cache) {
+        return NULL;
+    }
+
+    /* large calloc'ed blocks are not committed until they are touched */
+    cache->entries = (cache_entry_t**)calloc(nrecords, sizeof(cache_entry_t*));
+    if (NULL == cache->entries) {
+        free(cache);
+        return NULL;
+    }
+    cache->nrecords = nrecords;
+    return cache;
+}
+
+static void store_cache_delete(store_cache_t *cache) {
+    uint64_t irecord;
+
+    pthread_mutex_lock(&record_cache_mutex);
+    for (irecord=0; irecord<cache->nrecords && cache->nentries > 0; irecord++) {
+        if (NULL != cache->entries[irecord]) {
+            cache_remove(cache->entries[irecord]);
+        }
+    }
+    pthread_mutex_unlock(&record_cache_mutex);
+    free(cache->entries);
+    free(cache);
+}
+
 typedef struct {
     int f_index;
     int f_data;
@@ -212,7 +436,7 @@ typedef struct {
     float32_t deltat;
     record_t *records;
     gf_dtype *data;
-    gf_dtype **memdata;
+    store_cache_t *cache;
     const mapping_scheme_t *mapping_scheme;
     mapping_t *mapping;
 } store_t;
@@ -224,6 +448,7 @@ typedef struct {
     gf_dtype begin_value;
     gf_dtype end_value;
     gf_dtype *data;
+    cache_entry_t *entry;
 } trace_t;
 
 /* component scheme defs */
@@ -365,7 +590,7 @@ int good_array(PyObject* o, int typenum_want, npy_intp size_want, int ndim_want,
     return 1;
 }
 
-static const trace_t ZERO_TRACE = { 1, 0, 0, 0.0, 0.0, NULL };
+static const trace_t ZERO_TRACE = { 1, 0, 0, 0.0, 0.0, NULL, NULL };
 static const store_t ZERO_STORE = { 0, 0, 0, 0, 0.0, NULL, NULL, NULL, NULL, NULL };
 
 static store_error_t store_get_span(const store_t *store, uint64_t irecord,
@@ -398,8 +623,9 @@ static store_error_t store_read(
 
     nhave = 0;
     while (nhave < nbytes) {
-        nread = pread(store->f_data, data, nbytes-nhave, data_offset+nhave);
-        if (-1 == nread) {
+        nread = pread(store->f_data, (char*)data + nhave, nbytes-nhave,
+                      data_offset+nhave);
+        if (nread <= 0) {
             return READ_DATA_FAILED;
         }
         nhave += nread;
@@ -408,15 +634,281 @@ static store_error_t store_read(
     return SUCCESS;
 }
 
+static store_error_t decode_compressed(
+        const uint8_t *payload,
+        uint32_t nbytes,
+        float32_t scale,
+        int32_t nsamples,
+        gf_dtype *out) {
+
+    /* reference implementation: pyrocko.gf.store.decode_record */
+
+    int32_t i, j, n;
+    uint32_t ipos, ngroup, k;
+    uint64_t ibit, acc, z, mask;
+    uint8_t width;
+    int64_t d, d1, q;
+    gf_dtype v;
+
+    ipos = 0;
+    d1 = 0;
+    q = 0;
+    for (i=0; i<nsamples; i+=COMPRESSED_GROUP_SIZE) {
+        n = min(COMPRESSED_GROUP_SIZE, nsamples - i);
+        if (ipos >= nbytes) {
+            return BAD_RECORD;
+        }
+        width = payload[ipos];
+        ipos++;
+        ngroup = (n*width + 7) / 8;
+        if (width > 32 || (uint64_t)ipos + ngroup > nbytes) {
+            return BAD_RECORD;
+        }
+
+        mask = ((uint64_t)1 << width) - 1;
+        for (j=0; j<n; j++) {
+            ibit = (uint64_t)j * width;
+            acc = 0;
+            for (k=0; k<5 && ibit/8 + k < ngroup; k++) {
+                acc |= (uint64_t)payload[ipos + ibit/8 + k] << (8*k);
+            }
+            z = (acc >> (ibit % 8)) & mask;
+            d = (int64_t)(z >> 1) ^ -(int64_t)(z & 1);
+            d1 += d;
+            q += d1;
+            v = (gf_dtype)((double)q * (double)scale);
+            out[i+j] = fe32toh(v);
+        }
+        ipos += ngroup;
+    }
+
+    return SUCCESS;
+}
+
+static store_error_t record_from_buffer(
+        const uint8_t *buf,
+        uint64_t buf_offset,
+        size_t buf_size,
+        uint64_t data_offset,
+        int compressed,
+        int32_t nsamples,
+        gf_dtype **data,
+        size_t *nbytes_data) {
+
+    /* copy or decode record data from buffer holding the contents of the
+     * traces file, starting at buf_offset */
+
+    const uint8_t *p;
+    uint64_t avail;
+    uint32_t nbytes;
+    float32_t scale;
+    gf_dtype *out;
+    store_error_t err;
+
+    if (data_offset < buf_offset || data_offset - buf_offset > buf_size) {
+        return BAD_DATA_OFFSET;
+    }
+
+    p = buf + (data_offset - buf_offset);
+    avail = buf_size - (data_offset - buf_offset);
+    *nbytes_data = nsamples * sizeof(gf_dtype);
+
+    out = (gf_dtype*)malloc(max((size_t)1, *nbytes_data));
+    if (NULL == out) {
+        return ALLOC_FAILED;
+    }
+
+    if (compressed) {
+        if (avail < COMPRESSED_HEADER_SIZE) {
+            free(out);
+            return BAD_DATA_OFFSET;
+        }
+        memcpy(&scale, p, 4);
+        scale = fe32toh(scale);
+        memcpy(&nbytes, p+4, 4);
+        nbytes = xe32toh(nbytes);
+        if (COMPRESSED_HEADER_SIZE + (uint64_t)nbytes > avail) {
+            free(out);
+            return BAD_DATA_OFFSET;
+        }
+        err = decode_compressed(
+            p + COMPRESSED_HEADER_SIZE, nbytes, scale, nsamples, out);
+        if (SUCCESS != err) {
+            free(out);
+            return err;
+        }
+    } else {
+        if (*nbytes_data > avail) {
+            free(out);
+            return BAD_DATA_OFFSET;
+        }
+        memcpy(out, p, *nbytes_data);
+    }
+
+    *data = out;
+    return SUCCESS;
+}
+
+static store_error_t store_read_record(
+        const store_t *store,
+        uint64_t irecord,
+        uint64_t data_offset,
+        int compressed,
+        int32_t nsamples,
+        cache_entry_t **entry) {
+
+    /* read record with pread and put it into the cache; records following in
+     * the index, which lie within the readahead window, are cached too */
+
+    uint8_t *region, *region_new;
+    size_t region_size, need, nbytes_data;
+    uint32_t nbytes;
+    uint64_t j, offset_j;
+    int32_t nsamples_j;
+    record_t *record;
+    gf_dtype *data;
+    store_error_t err;
+
+    if (data_offset >= store->data_size) {
+        return BAD_DATA_OFFSET;
+    }
+
+    need = compressed ? COMPRESSED_HEADER_SIZE : nsamples * sizeof(gf_dtype);
+    region_size = min(max(need, record_cache.readahead),
+                      store->data_size - data_offset);
+
+    if (need > region_size) {
+        return BAD_DATA_OFFSET;
+    }
+
+    region = (uint8_t*)malloc(max((size_t)1, region_size));
+    if (NULL == region) {
+        return ALLOC_FAILED;
+    }
+
+    err = store_read(store, data_offset, region_size, region);
+    if (SUCCESS != err) {
+        free(region);
+        return err;
+    }
+
+    if (compressed) {
+        memcpy(&nbytes, region+4, 4);
+        need = COMPRESSED_HEADER_SIZE + xe32toh(nbytes);
+        if (need > region_size) {
+            if (data_offset + need > store->data_size) {
+                free(region);
+                return BAD_DATA_OFFSET;
+            }
+            region_new = (uint8_t*)realloc(region, need);
+            if (NULL == region_new) {
+                free(region);
+                return ALLOC_FAILED;
+            }
+            region = region_new;
+            err = store_read(store, data_offset + region_size,
+                             need - region_size, region + region_size);
+            if (SUCCESS != err) {
+                free(region);
+                return err;
+            }
+            region_size = need;
+        }
+    }
+
+    err = record_from_buffer(region, data_offset, region_size, data_offset,
+                             compressed, nsamples, &data, &nbytes_data);
+    if (SUCCESS == err) {
+        err = cache_insert(store->cache, irecord, data, nbytes_data, 1, entry);
+    }
+
+    if (SUCCESS != err) {
+        free(region);
+        return err;
+    }
+
+    for (j=irecord+1;
+         j<store->nrecords && j<=irecord+CACHE_READAHEAD_NRECORDS_MAX; j++) {
+
+        record = &store->records[j];
+        offset_j = xe64toh(record->data_offset);
+        nsamples_j = xe32toh(record->nsamples);
+        if ((offset_j & ~REC_COMPRESSED) <= REC_SHORT) {
+            continue;
+        }
+
+        if (!inposlimits(nsamples_j) || cache_contains(store->cache, j)) {
+            continue;
+        }
+
+        if (SUCCESS != record_from_buffer(
+                region, data_offset, region_size, offset_j & ~REC_COMPRESSED,
+                0 != (offset_j & REC_COMPRESSED), nsamples_j,
+                &data, &nbytes_data)) {
+            break;
+        }
+
+        if (SUCCESS != cache_insert(
+                store->cache, j, data, nbytes_data, 0, NULL)) {
+            break;
+        }
+    }
+
+    free(region);
+    return SUCCESS;
+}
+
+static store_error_t store_get_cached(
+        const store_t *store,
+        uint64_t irecord,
+        uint64_t data_offset,
+        int compressed,
+        trace_t *trace) {
+
+    cache_entry_t *entry;
+    gf_dtype *data;
+    size_t nbytes_data;
+    store_error_t err;
+
+    entry = cache_lookup(store->cache, irecord);
+    if (NULL == entry) {
+        if (NULL != store->data) {
+            err = record_from_buffer(
+                (uint8_t*)store->data, 0, store->data_size, data_offset,
+                compressed, trace->nsamples, &data, &nbytes_data);
+
+            if (SUCCESS == err) {
+                err = cache_insert(
+                    store->cache, irecord, data, nbytes_data, 1, &entry);
+            }
+        } else {
+            err = store_read_record(
+                store, irecord, data_offset, compressed, trace->nsamples,
+                &entry);
+        }
+
+        if (SUCCESS != err) {
+            return err;
+        }
+    }
+
+    trace->data = entry->data;
+    trace->entry = entry;
+    return SUCCESS;
+}
+
 static store_error_t store_get(
         const store_t *store,
         uint64_t irecord,
         trace_t *trace) {
 
+    /* traces returned by this function must be released with
+     * store_release */
+
     record_t *record;
     uint64_t data_offset;
     store_error_t err;
-    size_t nbytes;
+    int compressed;
 
     if (irecord >= store->nrecords) {
         *trace = ZERO_TRACE;
@@ -425,10 +917,13 @@ static store_error_t store_get(
 
     record = &store->records[irecord];
     data_offset = xe64toh(record->data_offset);
+    compressed = 0 != (data_offset & REC_COMPRESSED);
+    data_offset &= ~REC_COMPRESSED;
     trace->itmin = xe32toh(record->itmin);
     trace->nsamples = xe32toh(record->nsamples);
     trace->begin_value = fe32toh(record->begin_value);
     trace->end_value = fe32toh(record->end_value);
+    trace->entry = NULL;
 
     if (!inlimits(trace->itmin) || !inposlimits(trace->nsamples) ||
             data_offset >= UINT64_MAX - SLIMIT * sizeof(gf_dtype)) {
@@ -448,37 +943,32 @@ static store_error_t store_get(
 
     trace->is_zero = 0;
 
-    if (data_offset + trace->nsamples*sizeof(gf_dtype) > store->data_size) {
-        *trace = ZERO_TRACE;
-        return BAD_DATA_OFFSET;
-    }
-
     if (REC_SHORT == data_offset) {
         trace->data = &record->begin_value;
-    } else {
-        if (NULL != store->data) {
-            trace->data = &store->data[data_offset/sizeof(gf_dtype)];
-        } else {
-            if (NULL == store->memdata[irecord]) {
-                nbytes = trace->nsamples * sizeof(gf_dtype);
-                store->memdata[irecord] = (gf_dtype*)malloc(nbytes);
-                if (NULL == store->memdata[irecord]) {
-                    *trace = ZERO_TRACE;
-                    return ALLOC_FAILED;
-                }
-                err = store_read(store, data_offset, nbytes, store->memdata[irecord]);
-                if (SUCCESS != err) {
-                    free(store->memdata[irecord]);
-                    store->memdata[irecord] = NULL;
-                    *trace = ZERO_TRACE;
-                    return err;
-                }
-            }
-            trace->data = store->memdata[irecord];
+        return SUCCESS;
+    }
+
+    if (!compressed && NULL != store->data) {
+        if (data_offset + trace->nsamples*sizeof(gf_dtype) > store->data_size) {
+            *trace = ZERO_TRACE;
+            return BAD_DATA_OFFSET;
         }
+        trace->data = &store->data[data_offset/sizeof(gf_dtype)];
+        return SUCCESS;
     }
 
-    return SUCCESS;
+    err = store_get_cached(store, irecord, data_offset, compressed, trace);
+    if (SUCCESS != err) {
+        *trace = ZERO_TRACE;
+    }
+    return err;
+}
+
+static void store_release(trace_t *trace) {
+    if (NULL != trace->entry) {
+        cache_release(trace->entry);
+        trace->entry = NULL;
+    }
 }
 
 static int clipint32(int32_t lo, int32_t hi, int32_t n) {
@@ -668,6 +1158,7 @@ static store_error_t store_sum(
 
         begin_value += trace.begin_value * weight;
         end_value += trace.end_value * weight;
+        store_release(&trace);
     }
 
     result->is_zero = 0;
@@ -677,6 +1168,56 @@ static store_error_t store_sum(
     return SUCCESS;
 }
 
+static store_error_t store_sum_multi(
+        const store_t *store,
+        const uint64_t *irecords,
+        const float32_t *delays,
+        const float32_t *weights,
+        const int64_t *offsets,
+        int32_t ntargets,
+        int32_t nthreads,
+        trace_t *results) {
+
+    int32_t itarget;
+    int err, err_this;
+    (void) nthreads;
+
+    err = SUCCESS;
+
+    Py_BEGIN_ALLOW_THREADS
+    #if defined(_OPENMP)
+        if (nthreads == 0)
+            nthreads = omp_get_num_procs();
+
+        #pragma omp parallel \
+            shared (store, irecords, delays, weights, offsets, ntargets, \
+                    results) \
+            private (err_this) \
+            reduction (max: err) \
+            num_threads (nthreads)
+        {
+        #pragma omp for schedule (dynamic)
+    #endif
+        for (itarget=0; itarget<ntargets; itarget++) {
+            err_this = store_sum(
+                store,
+                &irecords[offsets[itarget]],
+                &delays[offsets[itarget]],
+                &weights[offsets[itarget]],
+                offsets[itarget+1] - offsets[itarget],
+                &results[itarget]);
+
+            if (err_this > err)
+                err = err_this;
+        }
+    #if defined(_OPENMP)
+        }
+    #endif
+    Py_END_ALLOW_THREADS
+
+    return (store_error_t)err;
+}
+
 static store_error_t store_sum_static(
         const store_t *store,
         const uint64_t *irecords,
@@ -754,6 +1295,7 @@ static store_error_t store_sum_static(
                         fe32toh(trace.data[max(0, min(idx, trace.nsamples-1))]) * w1
                         + fe32toh(trace.data[max(0, min(idx-1, trace.nsamples-1))]) * w2) * weight;
                 }
+                store_release(&trace);
             }
         }
     #if defined(_OPENMP)
@@ -764,7 +1306,8 @@ static store_error_t store_sum_static(
     return SUCCESS;
 }
 
-static store_error_t store_init(int f_index, int f_data, store_t *store) {
+static store_error_t store_init(
+        int f_index, int f_data, int mmap_traces, store_t *store) {
     void *p;
     struct stat st;
     size_t mmap_index_size;
@@ -817,7 +1360,7 @@ static store_error_t store_init(int f_index, int f_data, store_t *store) {
     /* on 32-bit systems, use mmap only if traces file is considerably smaller
      * than address space */
 
-    use_mmap = store->data_size < SIZE_MAX / 8;
+    use_mmap = mmap_traces && store->data_size < SIZE_MAX / 8;
 
     if (use_mmap) {
         if (store->data_size >= SIZE_MAX) {
@@ -829,14 +1372,12 @@ static store_error_t store_init(int f_index, int f_data, store_t *store) {
         }
 
         store->data = (gf_dtype*)p;
-    } else {
-        if (store->nrecords > SIZE_MAX) {
-            return ALLOC_FAILED;
-        }
-        store->memdata = (gf_dtype**)calloc(store->nrecords, sizeof(gf_dtype*));
-        if (NULL == store->memdata) {
-            return ALLOC_FAILED;
-        }
+    }
+
+    /* holds records read with pread and decoded compressed records */
+    store->cache = store_cache_new(store->nrecords);
+    if (NULL == store->cache) {
+        return ALLOC_FAILED;
     }
 
     return SUCCESS;
@@ -880,7 +1421,6 @@ static void store_mapping_deinit(mapping_t *mapping) {
 
 void store_deinit(store_t *store) {
     size_t mmap_index_size;
-    uint64_t irecord;
 
     mmap_index_size = sizeof(record_t) * store->nrecords + GF_STORE_HEADER_SIZE;
     if (store->records != NULL) {
@@ -891,14 +1431,8 @@ void store_deinit(store_t *store) {
         munmap(store->data, store->data_size);
     }
 
-    if (store->memdata != NULL) {
-        for (irecord=0; irecord<store->nrecords; irecord++) {
-            if (NULL != store->memdata[irecord]) {
-                free(store->memdata[irecord]);
-                store->memdata[irecord] = NULL;
-            }
-        }
-        free(store->memdata);
+    if (store->cache != NULL) {
+        store_cache_delete(store->cache);
     }
 
     if (store->mapping != NULL) {
@@ -926,14 +1460,15 @@ static void w_store_delete(void *store) {
 #endif
 
 static PyObject* w_store_init(PyObject *m, PyObject *args) {
-    int f_index, f_data;
+    int f_index, f_data, mmap_traces;
     store_t *store;
     store_error_t err;
 
     struct module_state *st = GETSTATE(m);
 
-    if (!PyArg_ParseTuple(args, "ii", &f_index, &f_data)) {
-        PyErr_SetString(st->error, "usage store_init(f_index, f_data)" );
+    mmap_traces = 1;
+    if (!PyArg_ParseTuple(args, "ii|i", &f_index, &f_data, &mmap_traces)) {
+        PyErr_SetString(st->error, "usage store_init(f_index, f_data[, mmap_traces])" );
         return NULL;
     }
 
@@ -943,7 +1478,7 @@ static PyObject* w_store_init(PyObject *m, PyObject *args) {
         return NULL;
     }
 
-    err = store_init(f_index, f_data, store);
+    err = store_init(f_index, f_data, mmap_traces, store);
     if (SUCCESS != err) {
         PyErr_SetString(st->error, store_error_names[err]);
         store_deinit(store);
@@ -1114,6 +1649,8 @@ static PyObject* w_store_get(PyObject *m, PyObject *args) {
         adata[i] = fe32toh(trace.data[i]);
     }
 
+    store_release(&trace);
+
     return Py_BuildValue("Nififf", array, trace.itmin, store->deltat,
                          trace.is_zero, trace.begin_value, trace.end_value);
 }
@@ -1737,6 +2274,141 @@ static PyObject* w_store_sum(PyObject *m, PyObject *args) {
                          result.is_zero, result.begin_value, result.end_value);
 }
 
+static PyObject* w_store_sum_multi(PyObject *m, PyObject *args) {
+    PyObject *capsule, *irecords_arr, *delays_arr, *weights_arr, *offsets_arr;
+    PyObject *out_list, *out_tuple;
+    PyArrayObject **arrays;
+    store_t *store;
+    trace_t *results;
+    npy_intp array_dims[1] = {0};
+    uint64_t *irecords;
+    float32_t *delays, *weights;
+    int64_t *offsets;
+    npy_intp n_, ntargets_;
+    int itmin_, nsamples_, nthreads_;
+    int32_t itarget, ntargets, itmin, nsamples;
+    store_error_t err;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "OOOOOiii", &capsule, &irecords_arr,
+                          &delays_arr, &weights_arr, &offsets_arr, &itmin_,
+                          &nsamples_, &nthreads_)) {
+        PyErr_SetString(st->error,
+            "usage: store_sum_multi(cstore, irecords, delays, weights, offsets, itmin, nsamples, nthreads)");
+
+        return NULL;
+    }
+
+    store = get_store_from_capsule(capsule);
+    if (store == NULL) return NULL;
+
+    if (!good_array(irecords_arr, NPY_UINT64, -1, 1, NULL)) return NULL;
+    n_ = PyArray_SIZE((PyArrayObject*)irecords_arr);
+
+    if (!good_array(delays_arr, NPY_FLOAT32, n_, 1, NULL)) return NULL;
+    if (!good_array(weights_arr, NPY_FLOAT32, n_, 1, NULL)) return NULL;
+    if (!good_array(offsets_arr, NPY_INT64, -1, 1, NULL)) return NULL;
+
+    ntargets_ = PyArray_SIZE((PyArrayObject*)offsets_arr) - 1;
+    if (!inposlimits(ntargets_) || 0 == ntargets_) {
+        PyErr_SetString(st->error,
+            "store_sum_multi: invalid number of entries in offsets array");
+        return NULL;
+    }
+    ntargets = ntargets_;
+
+    offsets = PyArray_DATA((PyArrayObject*)offsets_arr);
+    for (itarget=0; itarget<ntargets; itarget++) {
+        if (offsets[itarget] < 0 || offsets[itarget] > offsets[itarget+1] ||
+                !inposlimits(offsets[itarget+1] - offsets[itarget])) {
+            PyErr_SetString(st->error,
+                "store_sum_multi: invalid offsets array");
+            return NULL;
+        }
+    }
+
+    if (offsets[ntargets] != n_) {
+        PyErr_SetString(st->error,
+            "store_sum_multi: offsets array does not match size of arrays");
+        return NULL;
+    }
+
+    if (!inlimits(itmin_)) {
+        PyErr_SetString(st->error, "store_sum_multi: invalid itmin argument");
+        return NULL;
+    }
+
+    if (!(inposlimits(nsamples_) || -1 == nsamples_)) {
+        PyErr_SetString(st->error, "store_sum_multi: invalid nsamples argument");
+        return NULL;
+    }
+
+    irecords = PyArray_DATA((PyArrayObject*)irecords_arr);
+    delays = PyArray_DATA((PyArrayObject*)delays_arr);
+    weights = PyArray_DATA((PyArrayObject*)weights_arr);
+
+    results = (trace_t*)calloc(ntargets, sizeof(trace_t));
+    arrays = (PyArrayObject**)calloc(ntargets, sizeof(PyArrayObject*));
+    if (NULL == results || NULL == arrays) {
+        free(results);
+        free(arrays);
+        PyErr_SetString(st->error, store_error_names[ALLOC_FAILED]);
+        return NULL;
+    }
+
+    err = SUCCESS;
+    for (itarget=0; itarget<ntargets; itarget++) {
+        itmin = itmin_;
+        nsamples = nsamples_;
+        if (nsamples == -1) {
+            err = store_sum_extent(
+                store, &irecords[offsets[itarget]], &delays[offsets[itarget]],
+                offsets[itarget+1] - offsets[itarget], &nsamples, &itmin);
+
+            if (SUCCESS != err) break;
+        }
+
+        array_dims[0] = nsamples;
+        arrays[itarget] = (PyArrayObject*)PyArray_ZEROS(
+            1, array_dims, NPY_GFDTYPE, 0);
+
+        results[itarget].nsamples = nsamples;
+        results[itarget].itmin = itmin;
+        results[itarget].data = (gf_dtype*)PyArray_DATA(arrays[itarget]);
+    }
+
+    if (SUCCESS == err) {
+        err = store_sum_multi(store, irecords, delays, weights, offsets,
+                              ntargets, nthreads_, results);
+    }
+
+    if (SUCCESS != err) {
+        for (itarget=0; itarget<ntargets; itarget++) {
+            Py_XDECREF(arrays[itarget]);
+        }
+        free(results);
+        free(arrays);
+        PyErr_SetString(st->error, store_error_names[err]);
+        return NULL;
+    }
+
+    out_list = PyList_New(ntargets);
+    for (itarget=0; itarget<ntargets; itarget++) {
+        out_tuple = Py_BuildValue(
+            "Nififf", arrays[itarget], results[itarget].itmin, store->deltat,
+            results[itarget].is_zero, results[itarget].begin_value,
+            results[itarget].end_value);
+
+        PyList_SET_ITEM(out_list, itarget, out_tuple);
+    }
+
+    free(results);
+    free(arrays);
+
+    return out_list;
+}
+
 static PyObject* w_store_sum_static(PyObject *m, PyObject *args) {
     PyObject *capsule;
     PyArrayObject *irecords_arr, *delays_arr, *weights_arr, *result_arr;
@@ -1920,6 +2592,53 @@ static PyObject* w_make_sum_params(PyObject *m, PyObject *args) {
     return out_list;
 }
 
+static PyObject* w_store_cache_configure(PyObject *m, PyObject *args) {
+    unsigned long long int nbytes_max, readahead;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "KK", &nbytes_max, &readahead)) {
+        PyErr_SetString(
+            st->error, "usage: store_cache_configure(nbytes_max, readahead)");
+        return NULL;
+    }
+
+    cache_configure(nbytes_max, readahead);
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject* w_store_cache_stats(PyObject *m, PyObject *args) {
+    PyObject *capsule;
+    store_t *store;
+    store_cache_t cache;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        PyErr_SetString(st->error, "usage: store_cache_stats(cstore)");
+        return NULL;
+    }
+
+    store = get_store_from_capsule(capsule);
+    if (store == NULL)
+        return NULL;
+
+    pthread_mutex_lock(&record_cache_mutex);
+    cache = *store->cache;
+    pthread_mutex_unlock(&record_cache_mutex);
+
+    return Py_BuildValue(
+        "{s:K,s:K,s:K,s:K,s:K,s:K}",
+        "size", (unsigned long long int)cache.nbytes,
+        "nrecords", (unsigned long long int)cache.nentries,
+        "hits", (unsigned long long int)cache.nhits,
+        "misses", (unsigned long long int)cache.nmisses,
+        "evictions", (unsigned long long int)cache.nevictions,
+        "readahead", (unsigned long long int)cache.nreadahead);
+}
+
 static PyMethodDef store_ext_methods[] = {
     {"store_init",  w_store_init, METH_VARARGS,
         "Initialize store struct." },
@@ -1933,12 +2652,21 @@ static PyMethodDef store_ext_methods[] = {
     {"store_sum", w_store_sum, METH_VARARGS,
         "Get weight-and-delay-sum of GF traces." },
 
+    {"store_sum_multi", w_store_sum_multi, METH_VARARGS,
+        "Get weight-and-delay-sums of GF traces for multiple targets." },
+
     {"store_sum_static", w_store_sum_static, METH_VARARGS,
         "Get weight-and-delay-sum of GF samples for static displacement." },
 
     {"make_sum_params", w_make_sum_params, METH_VARARGS,
         "Prepare parameters for weight-and-delay-sum." },
 
+    {"store_cache_configure", w_store_cache_configure, METH_VARARGS,
+        "Set byte budget and readahead size of the record cache." },
+
+    {"store_cache_stats", w_store_cache_stats, METH_VARARGS,
+        "Get record cache statistics of a store." },
+
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
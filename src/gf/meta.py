@@ -495,6 +495,49 @@ class Timing(SObject):
         except spit.OutOfBounds:
             raise OutOfBounds(args)
 
+    def evaluate_many(self, get_phase, points):
+        '''
+        Evaluate timing for many geometries at once.
+
+        :param get_phase: function returning, for a phase definition, a
+            function which takes an array of coordinates of shape
+            ``(npoints, ndim)`` and returns an array of arrival times, NaN
+            where the phase is undefined
+        :param points: coordinates, array of shape ``(npoints, ndim)``
+        :returns: array of times, NaN where no arrival is defined
+        '''
+
+        npoints = points.shape[0]
+        try:
+            if self.offset_is_slowness and self.offset != 0.0:
+                phase_offset = get_phase(
+                    'vel_surface:%g' % (1.0/self.offset))
+                offset = phase_offset(points)
+            else:
+                offset = self.offset
+
+            if self.phase_defs:
+                times = num.array([
+                    get_phase(phase_def)(points)
+                    for phase_def in self.phase_defs], dtype=num.float)
+
+                times += offset
+                defined = num.isfinite(times)
+                if self.select == 'first':
+                    return num.ma.masked_array(
+                        times, mask=~defined).min(axis=0).filled(num.nan)
+                elif self.select == 'last':
+                    return num.ma.masked_array(
+                        times, mask=~defined).max(axis=0).filled(num.nan)
+                else:
+                    return times[
+                        num.argmax(defined, axis=0), num.arange(npoints)]
+            else:
+                return num.zeros(npoints) + offset
+
+        except spit.OutOfBounds:
+            raise OutOfBounds(points)
+
     phase_defs = List.T(String.T())
     offset = Float.T(default=0.0)
     offset_is_slowness = Bool.T(default=False)
@@ -1615,7 +1658,7 @@ class ConfigTypeA(Config):
         return args[1]
 
     def get_distance(self, args):
-        return math.sqrt(args[0]**2 + args[1]**2)
+        return num.sqrt(args[0]**2 + args[1]**2)
 
     def get_source_depth(self, args):
         return args[0]
@@ -1787,7 +1830,7 @@ class ConfigTypeB(Config):
         'elastic2', 'elastic5', 'elastic8', 'elastic10', 'poroelastic10']
 
     def get_distance(self, args):
-        return math.sqrt((args[1] - args[0])**2 + args[2]**2)
+        return num.sqrt((args[1] - args[0])**2 + args[2]**2)
 
     def get_surface_distance(self, args):
         return args[2]
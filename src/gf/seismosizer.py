@@ -6,7 +6,7 @@ from __future__ import absolute_import, division
 from builtins import range, map, zip
 from past.builtins import cmp
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from functools import cmp_to_key
 import time
 import math
@@ -14,6 +14,7 @@ import os
 import re
 import logging
 import resource
+import multiprocessing
 
 import numpy as num
 
@@ -24,6 +25,7 @@ from pyrocko.guts_array import Array
 
 from pyrocko import moment_tensor as mt
 from pyrocko import trace, util, config, model
+from pyrocko.parimap import parimap
 from pyrocko.orthodrome import ne_to_latlon
 from pyrocko.model import Location
 
@@ -2249,6 +2251,107 @@ class Request(Object):
         return m
 
 
+def source_param_key(obj):
+    '''
+    Get hashable key representing all parameters of a source model.
+
+    Unlike the object identity, the key changes when a source object is
+    modified in place, so it can be used to cache results across requests.
+    '''
+
+    if isinstance(obj, Object):
+        return (obj.__class__,) + tuple(
+            source_param_key(getattr(obj, k)) for k in obj.T.propnames)
+
+    elif isinstance(obj, num.ndarray):
+        return (obj.dtype.str, obj.shape, obj.tobytes())
+
+    elif isinstance(obj, (list, tuple)):
+        return tuple(source_param_key(x) for x in obj)
+
+    elif isinstance(obj, dict):
+        return tuple(sorted(
+            (k, source_param_key(v)) for (k, v) in obj.items()))
+
+    else:
+        return obj
+
+
+def _nbytes(obj):
+    nbytes = 0
+    for v in obj.__dict__.values():
+        if isinstance(v, num.ndarray):
+            nbytes += v.nbytes
+        elif isinstance(v, tuple):
+            nbytes += sum(x.nbytes for x in v if isinstance(x, num.ndarray))
+
+    return nbytes
+
+
+class DiscretizedSourceCache(object):
+    '''
+    Memory-bounded LRU cache for discretized sources.
+
+    :param nbytes_max: approximate limit for the memory used by the cached
+        discretized sources [bytes]
+
+    Used by :py:class:`LocalEngine` to reuse source discretizations across
+    calls to :py:meth:`LocalEngine.process`.
+    '''
+
+    def __init__(self, nbytes_max=256*1024**2):
+        self.nbytes_max = nbytes_max
+        self.clear()
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, make):
+        '''
+        Get cached entry or create it with ``make()``.
+        '''
+
+        if key in self._entries:
+            dsource, nbytes = self._entries.pop(key)
+            self._entries[key] = dsource, nbytes
+            self.n_hits += 1
+            return dsource
+
+        self.n_misses += 1
+        dsource = make()
+        self.put(key, dsource)
+        return dsource
+
+    def put(self, key, dsource):
+        '''
+        Insert entry, evicting the least recently used entries if needed.
+        '''
+
+        if key in self._entries:
+            return
+
+        nbytes = _nbytes(dsource)
+        if nbytes <= self.nbytes_max:
+            self._entries[key] = dsource, nbytes
+            self.nbytes += nbytes
+            while self.nbytes > self.nbytes_max:
+                _, (_, nbytes_evict) = self._entries.popitem(last=False)
+                self.nbytes -= nbytes_evict
+
+    def items(self):
+        '''
+        Get list of ``(key, dsource)`` pairs, least recently used first.
+        '''
+
+        return [(k, dsource) for (k, (dsource, _)) in self._entries.items()]
+
+
 class ProcessingStats(Object):
     t_perc_get_store_and_receiver = Float.T(default=0.)
     t_perc_discretize_source = Float.T(default=0.)
@@ -2268,6 +2371,8 @@ class ProcessingStats(Object):
     n_subrequests = Int.T(default=0)
     n_stores = Int.T(default=0)
     n_records_stacked = Int.T(default=0)
+    n_dsource_cache_hits = Int.T(default=0)
+    n_dsource_cache_misses = Int.T(default=0)
 
 
 class Response(Object):
@@ -2470,68 +2575,88 @@ class OutOfBoundsContext(Object):
 
 
 def process_subrequest_dynamic(work, pshared=None):
+    '''
+    Process a chunk of dynamic sub-requests in a :py:func:`parimap` worker.
+
+    Sources, targets and the engine are shared with the worker processes
+    through ``pshared``, so that the GF stores which have been opened (and
+    memory-mapped) before the fork are reused by all workers.
+
+    The worker's copy of the engine-level cache of discretized sources is
+    lost when the worker exits, so newly discretized sources are returned
+    together with the results, to be inserted into the parent's cache.
+    '''
+
     engine = pshared['engine']
-    _, _, isources, itargets = work
-
-    sources = [pshared['sources'][isource] for isource in isources]
-    targets = [pshared['targets'][itarget] for itarget in itargets]
-
-    components = set()
-    for target in targets:
-        rule = engine.get_rule(sources[0], target)
-        components.update(rule.required_components(target))
-
-    try:
-        base_seismogram, tcounters = engine.base_seismogram(
-            sources[0],
-            targets[0],
-            components,
-            pshared['dsource_cache'])
-
-    except meta.OutOfBounds as e:
-        e.context = OutOfBoundsContext(
-            source=sources[0],
-            target=targets[0],
-            distance=sources[0].distance_to(targets[0]),
-            components=components)
-        raise
-
-    n_records_stacked = 0
-    t_optimize = 0.0
-    t_stack = 0.0
-    for _, tr in base_seismogram.items():
-        n_records_stacked += tr.n_records_stacked
-        t_optimize += tr.t_optimize
-        t_stack += tr.t_stack
-
-    results = []
-    for isource, source in zip(isources, sources):
-        for itarget, target in zip(itargets, targets):
-            try:
-                result = engine._post_process_dynamic(
-                    base_seismogram, source, target)
-                result.n_records_stacked = n_records_stacked
-                result.n_shared_stacking = len(sources) * len(targets)
-                result.t_optimize = t_optimize
-                result.t_stack = t_stack
 
-            except SeismosizerError as e:
-                result = e
+    cache = engine._dsource_cache
+    n_hits, n_misses = cache.n_hits, cache.n_misses
+    keys_before = set(k for (k, _) in cache.items())
 
-            results.append((isource, itarget, result))
+    results = list(process_dynamic(
+        work, pshared['sources'], pshared['targets'], engine,
+        nthreads=pshared['nthreads'],
+        dsource_cache=pshared['dsource_cache']))
 
-    tcounters.append(xtime())
+    new_entries = [
+        (k, dsource) for (k, dsource) in cache.items()
+        if k not in keys_before]
 
-    return results, tcounters
+    return results, new_entries, \
+        cache.n_hits - n_hits, cache.n_misses - n_misses
 
 
-def process_dynamic(work, psources, ptargets, engine, nthreads=0):
-    dsource_cache = {}
+def _batch_key(isources, target):
+    return (tuple(isources), target.store_id, target.sample_rate,
+            target.interpolation, target.optimization, target.tmin,
+            target.tmax)
+
+
+def batch_work_dynamic(work, ptargets):
+    '''
+    Group consecutive dynamic sub-requests which can be stacked together.
+
+    Sub-requests sharing their sources and differing only in the receiver
+    location of their targets are combined, so that
+    :py:meth:`LocalEngine.base_seismograms` can handle them in one go.
+    '''
 
+    batch = []
+    key_batch = None
     for w in work:
         _, _, isources, itargets = w
+        if not itargets:
+            continue
+
+        key = _batch_key(isources, ptargets[itargets[0]])
+        if batch and key != key_batch:
+            yield batch
+            batch = []
 
+        batch.append(w)
+        key_batch = key
+
+    if batch:
+        yield batch
+
+
+def process_dynamic(work, psources, ptargets, engine, nthreads=0,
+                    dsource_cache=None):
+
+    if dsource_cache is None:
+        dsource_cache = {}
+
+    for batch in batch_work_dynamic(work, ptargets):
+        isources = batch[0][2]
         sources = [psources[isource] for isource in isources]
+
+        itargets = []
+        nshared = []
+        for _, _, isources_w, itargets_w in batch:
+            itargets.extend(itargets_w)
+            nshared.extend(
+                [len(isources_w) * len(itargets_w)] * len(itargets_w))
+
         targets = [ptargets[itarget] for itarget in itargets]
 
         components = set()
@@ -2540,18 +2665,40 @@ def process_dynamic(work, psources, ptargets, engine, nthreads=0):
             components.update(rule.required_components(target))
 
         for isource, source in zip(isources, sources):
-            for itarget, target in zip(itargets, targets):
+            try:
+                base_seismograms, tcounters = engine.base_seismograms(
+                    source, targets, components, dsource_cache, nthreads)
 
-                try:
-                    base_seismogram, tcounters = engine.base_seismogram(
-                        source, target, components, dsource_cache, nthreads)
-                except meta.OutOfBounds as e:
-                    e.context = OutOfBoundsContext(
-                        source=sources[0],
-                        target=targets[0],
-                        distance=sources[0].distance_to(targets[0]),
-                        components=components)
-                    raise
+            except meta.OutOfBounds as e:
+                # find the offending target to report it
+                for target in targets:
+                    try:
+                        engine.base_seismogram(
+                            source, target, components, dsource_cache,
+                            nthreads)
+
+                    except meta.OutOfBounds as e_target:
+                        e = e_target
+                        break
+
+                else:
+                    target = targets[0]
+
+                e.context = OutOfBoundsContext(
+                    source=source,
+                    target=target,
+                    distance=source.distance_to(target),
+                    components=components)
+                raise e
+
+            # attribute the time spent for the batch evenly to its targets
+            tcounters = num.array(tcounters)
+            tcounters = list((tcounters - tcounters[0]) / len(targets))
+
+            for itarget, target, base_seismogram, nshared_ in zip(
+                    itargets, targets, base_seismograms, nshared):
+
+                t0 = xtime()
 
                 n_records_stacked = 0
                 t_optimize = 0.0
@@ -2566,18 +2713,19 @@ def process_dynamic(work, psources, ptargets, engine, nthreads=0):
                     result = engine._post_process_dynamic(
                         base_seismogram, source, target)
                     result.n_records_stacked = n_records_stacked
-                    result.n_shared_stacking = len(sources) *\
-                        len(targets)
+                    result.n_shared_stacking = nshared_
                     result.t_optimize = t_optimize
                     result.t_stack = t_stack
                 except SeismosizerError as e:
                     result = e
 
-                tcounters.append(xtime())
-                yield (isource, itarget, result), tcounters
+                yield (isource, itarget, result), \
+                    tcounters + [tcounters[-1] + xtime() - t0]
 
 
 def process_static(work, psources, ptargets, engine, nthreads=0):
+    dsource_cache = {}
+
     for w in work:
         _, _, isources, itargets = w
 
@@ -2591,7 +2739,8 @@ def process_static(work, psources, ptargets, engine, nthreads=0):
 
                 try:
                     base_statics, tcounters = engine.base_statics(
-                        source, target, components, nthreads)
+                        source, target, components, nthreads,
+                        dsource_cache=dsource_cache)
                 except meta.OutOfBounds as e:
                     e.context = OutOfBoundsContext(
                         source=sources[0],
@@ -2615,6 +2764,9 @@ class LocalEngine(Engine):
         GF_STORE_SUPERDIRS AND GF_STORE_DIRS
     :param use_config: if ``True``, fill :py:attr:`store_superdirs` and
         :py:attr:`store_dirs` with paths set in the user's config file.
+    :param dsource_cache_size: memory limit [bytes] for the cache of
+        discretized sources, which is kept between calls to :py:meth:`process`
+        (default: 256 MB, ``0`` disables the cache)
     '''
 
     store_superdirs = List.T(
@@ -2633,6 +2785,7 @@ class LocalEngine(Engine):
     def __init__(self, **kwargs):
         use_env = kwargs.pop('use_env', False)
         use_config = kwargs.pop('use_config', False)
+        dsource_cache_size = kwargs.pop('dsource_cache_size', 256*1024**2)
         Engine.__init__(self, **kwargs)
         if use_env:
             env_store_superdirs = os.environ.get('GF_STORE_SUPERDIRS', '')
@@ -2652,6 +2805,7 @@ class LocalEngine(Engine):
         self._id_to_store_dir = {}
         self._open_stores = {}
         self._effective_default_store_id = None
+        self._dsource_cache = DiscretizedSourceCache(dsource_cache_size)
 
     def _check_store_dirs_type(self):
         for sdir in ['store_dirs', 'store_superdirs']:
@@ -2800,10 +2954,23 @@ class LocalEngine(Engine):
                 source.__class__.__name__))
 
     def _cached_discretize_basesource(self, source, store, cache, target):
-        if (source, store) not in cache:
-            cache[source, store] = source.discretize_basesource(store, target)
+        # First level: per-request cache by identity, second level: cache by
+        # source parameters, which is kept across requests.
+        k = (source, store, target.interpolation)
+        if k not in cache:
+            cache[k] = self._dsource_cache.get(
+                (source_param_key(source), store.config.id,
+                 target.interpolation),
+                lambda: source.discretize_basesource(store, target))
+
+        return cache[k]
+
+    def clear_dsource_cache(self):
+        '''
+        Clear cache of discretized sources.
+        '''
 
-        return cache[source, store]
+        self._dsource_cache.clear()
 
     def base_seismogram(self, source, target, components, dsource_cache,
                         nthreads):
@@ -2848,7 +3015,62 @@ class LocalEngine(Engine):
 
         return base_seismogram, tcounters
 
-    def base_statics(self, source, target, components, nthreads):
+    def base_seismograms(self, source, targets, components, dsource_cache,
+                         nthreads):
+        '''
+        Like :py:meth:`base_seismogram`, but for multiple targets at once.
+
+        The targets must only differ in their location (and codes), i.e. they
+        must share store, sampling rate, interpolation, optimization and time
+        span settings.
+        '''
+
+        target = targets[0]
+
+        tcounters = [xtime()]
+
+        store_ = self.get_store(target.store_id)
+        receivers = [t.receiver(store_) for t in targets]
+
+        if target.tmin and target.tmax is not None:
+            n_f = store_.config.sample_rate
+            itmin = int(num.floor(target.tmin * n_f))
+            nsamples = int(num.ceil((target.tmax - target.tmin) * n_f))
+        else:
+            itmin = None
+            nsamples = None
+
+        tcounters.append(xtime())
+        base_source = self._cached_discretize_basesource(
+            source, store_, dsource_cache, target)
+
+        tcounters.append(xtime())
+
+        if target.sample_rate is not None:
+            deltat = 1./target.sample_rate
+        else:
+            deltat = None
+
+        base_seismograms = store_.seismograms(
+            base_source, receivers, components,
+            deltat=deltat,
+            itmin=itmin, nsamples=nsamples,
+            interpolation=target.interpolation,
+            optimization=target.optimization,
+            nthreads=nthreads)
+
+        tcounters.append(xtime())
+
+        base_seismograms = [
+            store.make_same_span(base_seismogram)
+            for base_seismogram in base_seismograms]
+
+        tcounters.append(xtime())
+
+        return base_seismograms, tcounters
+
+    def base_statics(self, source, target, components, nthreads,
+                     dsource_cache=None):
 
         class OkadaSource(object):
             pass
@@ -2867,7 +3089,11 @@ class LocalEngine(Engine):
                 itsnapshot = 1
             tcounters.append(xtime())
 
-            base_source = source.discretize_basesource(store_, target=target)
+            if dsource_cache is None:
+                dsource_cache = {}
+
+            base_source = self._cached_discretize_basesource(
+                source, store_, dsource_cache, target)
 
             tcounters.append(xtime())
 
@@ -2927,6 +3153,38 @@ class LocalEngine(Engine):
 
         return starget.post_process(self, source, base_statics)
 
+    def _process_dynamic_parallel(self, work, psources, ptargets, nprocs):
+        if nprocs is None:
+            nprocs = multiprocessing.cpu_count()
+
+        # Consecutive work items share their source (the sub-request keys are
+        # sorted), so handing out contiguous chunks lets the workers reuse
+        # their discretized sources. A few chunks per process keep the load
+        # balanced.
+        nchunks = min(len(work), nprocs * 4)
+        chunksize = (len(work) - 1) // nchunks + 1
+        chunks = [work[i:i+chunksize] for i in range(0, len(work), chunksize)]
+
+        pshared = dict(
+            engine=self,
+            sources=psources,
+            targets=ptargets,
+            dsource_cache={},
+            nthreads=1)
+
+        for results, new_entries, n_hits, n_misses in parimap(
+                process_subrequest_dynamic, chunks,
+                pshared=pshared, nprocs=nprocs):
+
+            for k, dsource in new_entries:
+                self._dsource_cache.put(k, dsource)
+
+            self._dsource_cache.n_hits += n_hits
+            self._dsource_cache.n_misses += n_misses
+
+            for ii_results_tcounters in results:
+                yield ii_results_tcounters
+
     def process(self, *args, **kwargs):
         '''
         Process a request.
@@ -2940,6 +3198,12 @@ class LocalEngine(Engine):
         The request can be given a a :py:class:`Request` object, or such an
         object is created using ``Request(**kwargs)`` for convenience.
 
+        The number of CPU cores to use can be set with the ``nthreads`` (or
+        equivalently ``nprocs``) keyword argument. ``0`` means all available
+        cores. Static targets are computed with OpenMP threads, dynamic
+        targets are distributed to worker processes sharing the opened GF
+        stores.
+
         :returns: :py:class:`Response` object
         '''
 
@@ -2967,10 +3231,13 @@ class LocalEngine(Engine):
         rc0 = resource.getrusage(resource.RUSAGE_CHILDREN)
         tt0 = xtime()
 
+        n_dsource_cache_hits0 = self._dsource_cache.n_hits
+        n_dsource_cache_misses0 = self._dsource_cache.n_misses
+
         # make sure stores are open before fork()
         store_ids = set(target.store_id for target in request.targets)
         for store_id in store_ids:
-            self.get_store(store_id)
+            self.get_store(store_id).open()
 
         source_index = dict((x, i) for (i, x) in
                             enumerate(request.sources))
@@ -2990,7 +3257,8 @@ class LocalEngine(Engine):
         nsub = len(skeys)
         isub = 0
 
-        # Processing dynamic targets through
+        # Processing dynamic targets through process_dynamic, or, if multiple
+        # processes are requested, through
         # parimap(process_subrequest_dynamic)
         if request.has_dynamic:
             work_dynamic = [
@@ -3000,10 +3268,17 @@ class LocalEngine(Engine):
                   if not isinstance(target, StaticTarget)])
                 for (i, k) in enumerate(skeys)]
 
-            for ii_results, tcounters_dyn in process_dynamic(
-              work_dynamic, request.sources, request.targets, self,
-              nthreads=nthreads):
+            if nthreads == 1 or len(work_dynamic) < 2:
+                results_dynamic = process_dynamic(
+                    work_dynamic, request.sources, request.targets, self,
+                    nthreads=nthreads)
+
+            else:
+                results_dynamic = self._process_dynamic_parallel(
+                    work_dynamic, request.sources, request.targets,
+                    nprocs=nthreads or None)
 
+            for ii_results, tcounters_dyn in results_dynamic:
                 tcounters_dyn_list.append(num.diff(tcounters_dyn))
                 isource, itarget, result = ii_results
                 results_list[isource][itarget] = result
@@ -3072,6 +3347,10 @@ class LocalEngine(Engine):
         s.n_read_blocks = (
             (rs1.ru_inblock + rc1.ru_inblock) -
             (rs0.ru_inblock + rc0.ru_inblock))
+        s.n_dsource_cache_hits = \
+            self._dsource_cache.n_hits - n_dsource_cache_hits0
+        s.n_dsource_cache_misses = \
+            self._dsource_cache.n_misses - n_dsource_cache_misses0
 
         n_records_stacked = 0.
         for results in results_list:
@@ -21,7 +21,7 @@ from scipy import signal
 
 from . import meta
 from . import store_ext
-from pyrocko import util, spit
+from pyrocko import util, spit, config
 
 logger = logging.getLogger('pyrocko.gf.store')
 
@@ -49,6 +49,177 @@ gf_record_dtype = num.dtype([
     ('end_value', E + 'f4'),
 ])
 
+# compressed records are marked by setting the highest bit of data_offset
+gf_compressed_flag = num.uint64(1 << 63)
+
+# each compressed record starts with quantization step and payload size
+gf_compressed_header_fmt = E + 'fI'
+gf_compressed_header_fmt_size = struct.calcsize(gf_compressed_header_fmt)
+
+# number of samples sharing a common bit width in the payload
+gf_compressed_group_size = 64
+
+gf_compressed_accuracy_min = 2.0**-28
+
+# records in builder shard files are prefixed with their record number; a
+# data_offset of gf_shard_data means that nsamples values follow the record
+gf_shard_record_dtype = num.dtype(
+    [('irecord', E + 'u8')] + gf_record_dtype.descr)
+
+gf_shard_data = 3
+
+
+def encode_record(data, accuracy):
+    '''
+    Encode GF trace samples into compressed record format.
+
+    The samples are quantized with a step size of ``accuracy`` times the
+    maximum absolute sample value, so that the absolute error of each decoded
+    sample is at most half the step size. The second differences of the
+    quantized values are zigzag-encoded and bit-packed with a bit width chosen
+    independently for each group of :py:data:`gf_compressed_group_size`
+    samples. Each group is stored as one byte holding the bit width, followed
+    by the packed bits, least significant bit first.
+
+    :param data: samples as 1D array
+    :param accuracy: relative quantization step size
+    :returns: encoded record, including header, padded to a multiple of 4
+        bytes
+    '''
+
+    if not gf_compressed_accuracy_min <= accuracy < 1.0:
+        raise StoreError('invalid accuracy for compressed record: %g'
+                         % accuracy)
+
+    data = num.asarray(data, dtype=num.float64)
+    if not num.all(num.isfinite(data)):
+        raise StoreError('cannot compress trace with nans or infs')
+
+    n = data.size
+    amax = num.max(num.abs(data)) if n != 0 else 0.0
+    if amax == 0.0:
+        scale = num.float32(1.0)
+    else:
+        scale = num.float32(amax * accuracy)
+
+    q = num.round(data / float(scale)).astype(num.int64)
+    d = q.copy()
+    d[1:] -= 2 * q[:-1]
+    d[2:] += q[:-2]
+    z = (d << 1) ^ (d >> 63)
+
+    gs = gf_compressed_group_size
+    isample = num.arange(n)
+    igroup = isample // gs
+    istarts = num.arange(0, n, gs)
+
+    if n != 0:
+        widths = num.frexp(
+            num.maximum.reduceat(z, istarts).astype(num.float64))[1]
+    else:
+        widths = num.zeros(0, dtype=num.int64)
+
+    nbits = num.bincount(igroup, minlength=istarts.size) * widths
+    group_nbytes = 1 + (nbits + 7) // 8
+    group_offsets = num.cumsum(group_nbytes) - group_nbytes
+
+    sample_widths = widths[igroup]
+    sample_bit_offsets = 8 * (group_offsets[igroup] + 1) \
+        + (isample - igroup*gs) * sample_widths
+
+    ibit = num.arange(32)
+    mask = ibit[num.newaxis, :] < sample_widths[:, num.newaxis]
+    bits = num.zeros(8 * num.sum(group_nbytes), dtype=num.uint8)
+    bits[(sample_bit_offsets[:, num.newaxis] + ibit)[mask]] = \
+        ((z[:, num.newaxis] >> ibit) & 1)[mask]
+
+    payload = num.packbits(bits.reshape(-1, 8)[:, ::-1])
+    payload[group_offsets] = widths
+
+    npad = (-payload.size) % 4
+    return struct.pack(gf_compressed_header_fmt, scale, payload.size) \
+        + payload.tobytes() + b'\0' * npad
+
+
+def decode_record(buf, nsamples):
+    '''
+    Decode samples from compressed record format.
+
+    Reference implementation of the decoder, see :py:func:`encode_record`.
+
+    :param buf: encoded record, including header
+    :param nsamples: number of samples in the record
+    :returns: decoded samples as 1D array
+    '''
+
+    nsamples = int(nsamples)
+    if len(buf) < gf_compressed_header_fmt_size:
+        raise ShortRead()
+
+    scale, nbytes = struct.unpack(
+        gf_compressed_header_fmt, buf[:gf_compressed_header_fmt_size])
+
+    payload = num.frombuffer(
+        buf, dtype=num.uint8, offset=gf_compressed_header_fmt_size)
+
+    if payload.size < nbytes:
+        raise ShortRead()
+
+    z = num.zeros(nsamples, dtype=num.int64)
+    ipos = 0
+    for i in range(0, nsamples, gf_compressed_group_size):
+        n = min(gf_compressed_group_size, nsamples - i)
+        if ipos >= nbytes:
+            raise StoreError('corrupt compressed record')
+
+        width = int(payload[ipos])
+        ngroup = (n*width + 7) // 8
+        if width > 32 or ipos + 1 + ngroup > nbytes:
+            raise StoreError('corrupt compressed record')
+
+        bits = num.unpackbits(payload[ipos+1:ipos+1+ngroup]) \
+            .reshape(-1, 8)[:, ::-1].ravel()[:n*width].reshape(n, width)
+
+        z[i:i+n] = num.dot(bits.astype(num.int64), 1 << num.arange(width))
+        ipos += 1 + ngroup
+
+    d = (z >> 1) ^ -(z & 1)
+    q = num.cumsum(num.cumsum(d))
+    return (q * float(scale)).astype(gf_dtype)
+
+
+_record_cache_configured = False
+
+
+def configure_record_cache(nbytes_max=None, readahead=None):
+    '''
+    Configure cache for GF records which are read without memory mapping or
+    which are stored compressed.
+
+    The cache is shared by all open stores. Least recently used records are
+    evicted when its size exceeds *nbytes_max*. On a cache miss, records
+    following in the index which lie within *readahead* bytes of the
+    requested record are read and cached as well. By default, the values of
+    the ``gf_store_cache_size`` and ``gf_store_readahead`` settings of the
+    Pyrocko configuration are used.
+
+    :param nbytes_max: byte budget of the cache
+    :param readahead: size of readahead window [bytes]
+    '''
+
+    global _record_cache_configured
+
+    if None in (nbytes_max, readahead):
+        conf = config.config()
+        if nbytes_max is None:
+            nbytes_max = conf.gf_store_cache_size
+
+        if readahead is None:
+            readahead = conf.gf_store_readahead
+
+    store_ext.store_cache_configure(int(nbytes_max), int(readahead))
+    _record_cache_configured = True
+
 
 def valid_string_id(s):
     return re.match(meta.StringID.pattern, s)
@@ -274,6 +445,62 @@ def get_extra_path(store_dir, key):
     return os.path.join(store_dir, 'extra', key)
 
 
+class StoreShard(object):
+    '''
+    Writer for GF records computed by a single builder worker.
+
+    Records are appended to a file of their own, so that parallel workers do
+    not have to lock the store. The file is written under a temporary name
+    and renamed on :py:meth:`close`, so that only complete shards are ever
+    merged with :py:meth:`BaseStore.merge_shards`.
+    '''
+
+    suffix = '.shard'
+
+    def __init__(self, path):
+        self.path = path
+        self.nrecords = 0
+        self.nbytes = 0
+        self._irecords = set()
+        self._f = open(self._tmp_path(), 'wb')
+
+    def _tmp_path(self):
+        return self.path + '.tmp'
+
+    def put(self, irecord, trace):
+        if irecord in self._irecords:
+            raise DuplicateInsert('record %i already in shard' % irecord)
+
+        record = num.zeros(1, dtype=gf_shard_record_dtype)
+        if trace.is_zero or num.all(trace.data == 0.0):
+            record[0] = (irecord, 1, trace.itmin, 0, 0., 0.)
+            data = None
+        else:
+            ndata = trace.data.size
+            record[0] = (
+                irecord, (2, gf_shard_data)[ndata > 2], trace.itmin, ndata,
+                trace.data[0], trace.data[-1])
+
+            data = trace.data if ndata > 2 else None
+
+        record.tofile(self._f)
+        self.nbytes += gf_shard_record_dtype.itemsize
+        if data is not None:
+            data.astype(gf_dtype_store).tofile(self._f)
+            self.nbytes += data.size * gf_dtype_nbytes_per_sample
+
+        self._irecords.add(irecord)
+        self.nrecords += 1
+
+    def close(self):
+        self._f.close()
+        os.rename(self._tmp_path(), self.path)
+
+    def abort(self):
+        self._f.close()
+        os.unlink(self._tmp_path())
+
+
 class BaseStore(object):
 
     @staticmethod
@@ -316,6 +543,7 @@ class BaseStore(object):
         self._f_index = None
         self._f_data = None
         self._end_values = None
+        self._shard = None
         self.cstore = None
 
     def open(self):
@@ -336,9 +564,13 @@ class BaseStore(object):
             self.mode = ''
             raise CannotOpen('cannot open gf store: %s' % self.store_dir)
 
+        if not _record_cache_configured:
+            configure_record_cache()
+
         try:
             self.cstore = store_ext.store_init(
-                self._f_index.fileno(), self._f_data.fileno())
+                self._f_index.fileno(), self._f_data.fileno(),
+                self._use_memmap)
         except store_ext.StoreExtError as e:
             raise StoreError(str(e))
 
@@ -368,6 +600,9 @@ class BaseStore(object):
         if not self._f_index:
             self.open()
 
+        if self._shard:
+            return
+
         while True:
             try:
                 fcntl.lockf(self._f_index, fcntl.LOCK_EX)
@@ -380,9 +615,124 @@ class BaseStore(object):
                     raise
 
     def unlock(self):
+        if self._shard:
+            return
+
         self._f_data.flush()
         fcntl.lockf(self._f_index, fcntl.LOCK_UN)
 
+    def open_shard(self, path):
+        '''
+        Redirect subsequent inserts into a shard file.
+
+        While a shard is open, :py:meth:`lock` and :py:meth:`unlock` do
+        nothing and :py:meth:`put` writes to the shard instead of the store.
+
+        :param path: path of the shard file
+        :returns: :py:class:`StoreShard` object
+        '''
+
+        assert self._shard is None
+        self._shard = StoreShard(path)
+        return self._shard
+
+    def close_shard(self, abort=False):
+        '''
+        Finish writing to the shard opened with :py:meth:`open_shard`.
+
+        :param abort: if ``True``, discard the shard file
+        '''
+
+        shard = self._shard
+        self._shard = None
+        if abort:
+            shard.abort()
+        else:
+            shard.close()
+
+        return shard
+
+    def merge_shards(self, shard_dir):
+        '''
+        Merge complete shard files into the store.
+
+        The shards are appended in a single streaming pass while the store
+        is locked. Each shard file is removed after its records have been
+        written, so that the merge can be repeated after an interruption.
+        Records already present in the store are skipped.
+
+        :param shard_dir: directory containing the shard files
+        :returns: tuple ``(nshards, nrecords)``, number of shards and records
+            merged
+        '''
+
+        nshards = nrecords = 0
+        self.lock()
+        try:
+            if not os.path.isdir(shard_dir):
+                return nshards, nrecords
+
+            for fn in sorted(os.listdir(shard_dir)):
+                if not fn.endswith(StoreShard.suffix):
+                    continue
+
+                path = os.path.join(shard_dir, fn)
+                try:
+                    nrecords += self._merge_shard(path)
+                except (OSError, IOError) as e:
+                    if e.errno == errno.ENOENT:
+                        continue
+
+                    raise
+
+                self._f_data.flush()
+                if self._use_memmap:
+                    self._records.flush()
+
+                os.unlink(path)
+                nshards += 1
+
+        finally:
+            self.unlock()
+
+        return nshards, nrecords
+
+    def _merge_shard(self, path):
+        assert self.mode == 'w'
+
+        nmerged = 0
+        with open(path, 'rb') as f:
+            self._f_data.seek(0, 2)
+            while True:
+                record = num.fromfile(f, dtype=gf_shard_record_dtype, count=1)
+                if record.size == 0:
+                    break
+
+                irecord, ipos, itmin, nsamples, begin_value, end_value = \
+                    record[0]
+
+                if ipos == gf_shard_data:
+                    buf = f.read(nsamples * gf_dtype_nbytes_per_sample)
+                    if len(buf) != nsamples * gf_dtype_nbytes_per_sample:
+                        raise ShortRead()
+
+                if self._records[irecord][0] != 0:
+                    logger.warning(
+                        'record %i already in store, skipping it when merging '
+                        'shard %s' % (irecord, path))
+                    continue
+
+                if ipos == gf_shard_data:
+                    ipos = self._f_data.tell()
+                    self._f_data.write(buf)
+
+                self._records[irecord] = (
+                    ipos, itmin, nsamples, begin_value, end_value)
+
+                nmerged += 1
+
+        return nmerged
+
     def put(self, irecord, trace):
         self._put(irecord, trace)
 
@@ -490,7 +840,8 @@ class BaseStore(object):
         if decimate == 1:
             ilo = max(itmin, itmin_data) - itmin_data
             ihi = min(itmin+nsamples, itmin_data+nsamples_data) - itmin_data
-            data = self._get_data(ipos, begin_value, end_value, ilo, ihi)
+            data = self._get_data(
+                ipos, nsamples_data, begin_value, end_value, ilo, ihi)
 
             return GFTrace(data, itmin=itmin_data+ilo, deltat=self._deltat,
                            begin_value=begin_value, end_value=end_value)
@@ -519,7 +870,8 @@ class BaseStore(object):
 
             data_ext_pad = num.empty(nsamples_ext_pad, dtype=gf_dtype)
             data_ext_pad[ilo:ihi] = self._get_data(
-                ipos, begin_value, end_value, ilo_data, ihi_data)
+                ipos, nsamples_data, begin_value, end_value,
+                ilo_data, ihi_data)
 
             data_ext_pad[:ilo] = begin_value
             data_ext_pad[ihi:] = end_value
@@ -579,6 +931,10 @@ class BaseStore(object):
         if self._records[irecord][0] != 0:
             raise DuplicateInsert('record %i already in store' % irecord)
 
+        if self._shard:
+            self._shard.put(irecord, trace)
+            return
+
         if trace.is_zero or num.all(trace.data == 0.0):
             self._records[irecord] = (1, trace.itmin, 0, 0., 0.)
             return
@@ -797,6 +1153,61 @@ class BaseStore(object):
 
         return irecords3, delays3, weights3
 
+    def _optimize_multi(self, irecords, delays, weights, ntargets):
+        '''
+        Vectorized version of :py:meth:`_optimize` for many targets.
+
+        Input arrays hold the same number of entries for each target,
+        consecutively. Returns the optimized arrays and the offsets of each
+        target's entries in them.
+        '''
+
+        n = irecords.size // ntargets
+        itargets = num.repeat(num.arange(ntargets, dtype=num.int64), n)
+
+        deltat = self._deltat
+
+        delays = delays / deltat
+        irecords2 = num.repeat(irecords, 2)
+        itargets2 = num.repeat(itargets, 2)
+        delays2 = num.empty(irecords2.size, dtype=num.float)
+        delays2[0::2] = num.floor(delays)
+        delays2[1::2] = num.ceil(delays)
+        weights2 = num.repeat(weights, 2)
+        weights2[0::2] *= 1.0 - (delays - delays2[0::2])
+        weights2[1::2] *= (1.0 - (delays2[1::2] - delays)) * \
+                          (delays2[1::2] - delays2[0::2])
+
+        delays2 *= deltat
+
+        iorder = num.lexsort((delays2, irecords2, itargets2))
+
+        irecords2 = irecords2[iorder]
+        itargets2 = itargets2[iorder]
+        delays2 = delays2[iorder]
+        weights2 = weights2[iorder]
+
+        ui = num.empty(irecords2.size, dtype=num.bool)
+        ui[1:] = num.logical_or(
+            num.logical_or(num.diff(irecords2) != 0,
+                           num.diff(delays2) != 0.),
+            num.diff(itargets2) != 0)
+
+        ui[0] = 0
+        ind2 = num.cumsum(ui)
+        ui[0] = 1
+        ind1 = num.where(ui)[0]
+
+        irecords3 = irecords2[ind1]
+        itargets3 = itargets2[ind1]
+        delays3 = delays2[ind1]
+        weights3 = num.bincount(ind2, weights2)
+
+        offsets = num.searchsorted(
+            itargets3, num.arange(ntargets + 1)).astype(num.int64)
+
+        return irecords3, delays3, weights3, offsets
+
     def _optimize_statics(self, irecords, weights):
         if num.unique(irecords).size == irecords.size:
             return irecords, weights
@@ -939,13 +1350,15 @@ class BaseStore(object):
             self._records.tofile(self._f_index)
             self._f_index.flush()
 
-    def _get_data(self, ipos, begin_value, end_value, ilo, ihi):
+    def _get_data(self, ipos, nsamples, begin_value, end_value, ilo, ihi):
         if ihi - ilo > 0:
             if ipos == 2:
                 data_orig = num.empty(2, dtype=gf_dtype)
                 data_orig[0] = begin_value
                 data_orig[1] = end_value
                 return data_orig[ilo:ihi]
+            elif ipos & gf_compressed_flag:
+                return self._get_data_compressed(ipos, nsamples)[ilo:ihi]
             else:
                 self._f_data.seek(
                     int(ipos + ilo*gf_dtype_nbytes_per_sample))
@@ -958,6 +1371,15 @@ class BaseStore(object):
         else:
             return num.empty((0,), dtype=gf_dtype)
 
+    def _get_data_compressed(self, ipos, nsamples):
+        self._f_data.seek(int(ipos & ~gf_compressed_flag))
+        header = self._f_data.read(gf_compressed_header_fmt_size)
+        if len(header) != gf_compressed_header_fmt_size:
+            raise ShortRead()
+
+        _, nbytes = struct.unpack(gf_compressed_header_fmt, header)
+        return decode_record(header + self._f_data.read(nbytes), nsamples)
+
     def index_fn(self):
         return BaseStore.index_fn_(self.store_dir)
 
@@ -996,13 +1418,139 @@ class BaseStore(object):
             empty=counter[0],
             short=counter[2],
             zero=counter[1],
+            compressed=int(num.sum(
+                (self._records['data_offset'] & gf_compressed_flag) != 0)),
             size_data=self.size_data,
             size_index=self.size_index,
         )
 
+        cache_stats = store_ext.store_cache_stats(self.cstore)
+        for k in self.cache_stats_keys:
+            stats['cache_' + k] = cache_stats[k]
+
         return stats
 
-    stats_keys = 'total inserted empty short zero size_data size_index'.split()
+    cache_stats_keys = 'size hits misses evictions readahead'.split()
+
+    stats_keys = 'total inserted empty short zero compressed size_data ' \
+        'size_index'.split() + ['cache_' + k for k in cache_stats_keys]
+
+    def compress(self, accuracy=1e-5, show_progress=False):
+        '''
+        Rewrite traces file, storing records in compressed format.
+
+        Records which would not get smaller are kept uncompressed.
+
+        :param accuracy: relative quantization step size, see
+            :py:func:`encode_record`
+        :param show_progress: show progress bar
+        '''
+
+        self._recode(accuracy, show_progress)
+
+    def decompress(self, show_progress=False):
+        '''
+        Rewrite traces file, storing all records uncompressed.
+
+        :param show_progress: show progress bar
+        '''
+
+        self._recode(None, show_progress)
+
+    def _recode(self, accuracy, show_progress):
+        if not self._f_index:
+            self.open()
+
+        if self.mode != 'r':
+            raise StoreError('store must be opened in read mode to recode')
+
+        index_fn_tmp = self.index_fn() + '.recode.tmp'
+        data_fn_tmp = self.data_fn() + '.recode.tmp'
+
+        records = num.array(self._records)
+
+        if show_progress:
+            pbar = util.progressbar(
+                ('decompressing', 'compressing')[accuracy is not None],
+                self._nrecords)
+
+        try:
+            with open(data_fn_tmp, 'wb') as f:
+                f.write(b'\0' * 32)
+                ipos_new = 32
+                for irecord in range(self._nrecords):
+                    ipos, _, nsamples, begin_value, end_value = \
+                        records[irecord]
+
+                    if ipos > 2:
+                        data = self._get_data(
+                            ipos, nsamples, begin_value, end_value,
+                            0, nsamples)
+
+                        buf = data.astype(gf_dtype_store).tobytes()
+                        records['data_offset'][irecord] = ipos_new
+                        if accuracy is not None:
+                            buf_compressed = encode_record(data, accuracy)
+                            # keep records which do not benefit uncompressed
+                            if len(buf_compressed) < len(buf):
+                                buf = buf_compressed
+                                data = decode_record(buf, nsamples)
+                                records['data_offset'][irecord] = \
+                                    num.uint64(ipos_new) | gf_compressed_flag
+
+                        records['begin_value'][irecord] = data[0]
+                        records['end_value'][irecord] = data[-1]
+                        f.write(buf)
+                        ipos_new += len(buf)
+
+                    if show_progress:
+                        pbar.update(irecord+1)
+
+            with open(index_fn_tmp, 'wb') as f:
+                f.write(struct.pack(
+                    gf_store_header_fmt, self._nrecords, self._deltat))
+                records.tofile(f)
+
+        except Exception:
+            for fn in (index_fn_tmp, data_fn_tmp):
+                if os.path.exists(fn):
+                    os.unlink(fn)
+            raise
+
+        finally:
+            if show_progress:
+                pbar.finish()
+
+        mode = self.mode
+        self.close()
+        self.mode = mode
+
+        os.rename(data_fn_tmp, self.data_fn())
+        os.rename(index_fn_tmp, self.index_fn())
+
+    def benchmark_get(self, nrecords_max=None):
+        '''
+        Measure speed of trace retrieval through the C extension.
+
+        :param nrecords_max: maximum number of records to read
+        :returns: tuple ``(nrecords, nsamples, duration)``, the number of
+            records and samples read and the time spent
+        '''
+
+        if not self._f_index:
+            self.open()
+
+        irecords = num.where(self._records['data_offset'] > 2)[0]
+        if nrecords_max is not None:
+            irecords = irecords[:nrecords_max]
+
+        nsamples = 0
+        t0 = time.time()
+        for irecord in irecords:
+            nsamples += store_ext.store_get(
+                self.cstore, int(irecord), 0, -1)[0].size
+
+        return irecords.size, nsamples, time.time() - t0
 
 
 def remake_dir(dpath, force):
@@ -1566,6 +2114,41 @@ class Store(BaseStore):
 
         raise StoreError('unsupported phase provider: %s' % provider)
 
+    def get_phase_many(self, phase_def):
+        '''
+        Get vectorised phase arrival function.
+
+        Like :py:meth:`get_phase`, but the returned function takes an array
+        of coordinates of shape ``(npoints, ndim)`` and returns an array of
+        arrival times, with NaN where the phase is undefined.
+        '''
+
+        phase = self.get_phase(phase_def)
+        toks = phase_def.split(':', 1)
+        provider = toks[0] if len(toks) == 2 else 'stored'
+
+        if provider == 'stored':
+            return phase.interpolate_many
+
+        elif provider in ('vel', 'vel_surface') and isinstance(
+                self.config, (meta.ConfigTypeA, meta.ConfigTypeB)):
+
+            def evaluate(points):
+                return phase(tuple(points.T))
+
+            return evaluate
+
+        else:
+            def evaluate(points):
+                times = num.empty(points.shape[0])
+                for i, args in enumerate(points):
+                    t = phase(tuple(args))
+                    times[i] = t if t is not None else num.nan
+
+                return times
+
+            return evaluate
+
     def t(self, timing, *args):
         '''
         Compute interpolated phase arrivals.
@@ -1587,6 +2170,13 @@ class Store(BaseStore):
                                                          # the given phases is
                                                          # selected
 
+        Many geometries can be evaluated in one call by giving arrays of
+        coordinates in the index tuple. The arrays are broadcast against
+        each other and an array of times is returned, with NaN where no
+        arrival is defined::
+
+            test_store.t('P', (1000., num.linspace(1000., 10000., 100)))
+
         :param timing: Timing string as described above
         :type timing: string or :py:class:`pyrocko.gf.meta.Timing`
         :param \*args: :py:class:`pyrocko.gf.meta.Config` index tuple, e.g.
@@ -1594,7 +2184,8 @@ class Store(BaseStore):
             :py:class:`pyrocko.gf.meta.ConfigTypeA`.
         :type \*args: tuple
         :returns: Phase arrival according to ``timing``
-        :rtype: float or None
+        :rtype: float or None, or :py:class:`numpy.ndarray` if arrays of
+            coordinates are given
         '''
 
         if len(args) == 1:
@@ -1605,6 +2196,14 @@ class Store(BaseStore):
         if not isinstance(timing, meta.Timing):
             timing = meta.Timing(timing)
 
+        if any(num.ndim(arg) != 0 for arg in args):
+            coords = num.broadcast_arrays(
+                *[num.asarray(arg, dtype=num.float) for arg in args])
+
+            points = num.column_stack([x.ravel() for x in coords])
+            return timing.evaluate_many(self.get_phase_many, points) \
+                .reshape(coords[0].shape)
+
         return timing.evaluate(self.get_phase, args)
 
     def make_timing_params(self, begin, end, snap_vred=True):
@@ -1885,6 +2484,136 @@ class Store(BaseStore):
 
         return out
 
+    def seismograms(self, source, receivers, components, deltat=None,
+                    itmin=None, nsamples=None,
+                    interpolation='nearest_neighbor',
+                    optimization='enable', nthreads=1):
+        '''
+        Calculate seismograms for a source at many receivers in one go.
+
+        Interpolation weights and records for all receivers are prepared in a
+        single call to :py:func:`store_ext.make_sum_params` and the stacking
+        is done for all receivers in a single call to
+        :py:func:`store_ext.store_sum_multi`, parallelized over the receivers
+        with ``nthreads`` threads (``0`` means all cores).
+
+        :returns: list with a dict of :py:class:`GFTrace` objects, keyed by
+            component, for each receiver
+        '''
+
+        config = self.config
+
+        if deltat is None:
+            decimate = 1
+        else:
+            decimate = int(round(deltat/config.deltat))
+            if abs(deltat / (decimate * config.deltat) - 1.0) > 0.001:
+                raise StoreError(
+                    'unavailable decimation ratio target.deltat / store.deltat'
+                    ' = %g / %g' % (deltat, config.deltat))
+
+        store, decimate_ = self._decimated_store(decimate)
+
+        if decimate_ != 1:
+            return [
+                self.seismogram(
+                    source, receiver, components, deltat=deltat, itmin=itmin,
+                    nsamples=nsamples, interpolation=interpolation,
+                    optimization=optimization, nthreads=nthreads)
+                for receiver in receivers]
+
+        if not store._f_index:
+            store.open()
+
+        scheme = config.component_scheme
+        scheme_desc = meta.component_scheme_to_description[
+            config.component_scheme]
+
+        source_coords_arr = source.coords5()
+        source_terms = source.get_source_terms(scheme)
+        receiver_coords_arr = num.vstack(
+            [receiver.coords5 for receiver in receivers])
+
+        nreceivers = len(receivers)
+
+        try:
+            params = store_ext.make_sum_params(
+                store.cstore,
+                source_coords_arr,
+                source_terms,
+                receiver_coords_arr,
+                scheme,
+                interpolation, nthreads)
+
+        except store_ext.StoreExtError:
+            raise meta.OutOfBounds()
+
+        provided_components = scheme_desc.provided_components
+
+        if source.times.size != 0:
+            itoffset = int(num.floor(num.min(source.times)/store._deltat))
+        else:
+            itoffset = 0
+
+        if nsamples is None:
+            nsamples = -1
+
+        if itmin is None:
+            itmin = 0
+        else:
+            itmin -= itoffset
+
+        out = [{} for _ in range(nreceivers)]
+        for icomp, comp in enumerate(provided_components):
+            if comp in components:
+                weights, irecords = params[icomp]
+
+                neach = irecords.size // (source.times.size * nreceivers)
+                delays = num.tile(
+                    num.repeat(source.times, neach), nreceivers)
+
+                t0 = time.time()
+                if optimization == 'enable':
+                    irecords, delays, weights, offsets = \
+                        store._optimize_multi(
+                            irecords, delays, weights, nreceivers)
+                else:
+                    assert optimization == 'disable'
+                    offsets = num.arange(nreceivers + 1, dtype=num.int64) \
+                        * (irecords.size // nreceivers)
+
+                t1 = time.time()
+
+                try:
+                    trs = store_ext.store_sum_multi(
+                        store.cstore,
+                        irecords.astype(num.uint64),
+                        (delays - itoffset*store._deltat).astype(num.float32),
+                        weights.astype(num.float32),
+                        offsets,
+                        int(itmin), int(nsamples), nthreads)
+
+                except store_ext.StoreExtError as e:
+                    raise StoreError(str(e) + ' in store %s' % self.store_dir)
+
+                t2 = time.time()
+
+                for ireceiver, args in enumerate(trs):
+                    tr = GFTrace(*args)
+                    tr.itmin += itoffset
+
+                    # to prevent problems with rounding errors (see
+                    # seismogram())
+                    tr.deltat = config.deltat * decimate
+
+                    tr.n_records_stacked = int(
+                        offsets[ireceiver+1] - offsets[ireceiver])
+                    tr.t_optimize = (t1 - t0) / nreceivers
+                    tr.t_stack = (t2 - t1) / nreceivers
+                    out[ireceiver][comp] = tr
+
+        return out
+
 
 __all__ = '''
 gf_dtype
@@ -1898,5 +2627,6 @@ NotAllowedToInterpolate
 NoSuchExtra
 NoSuchPhase
 BaseStore
+StoreShard
 Store
 '''.split()
@@ -15,11 +15,13 @@ import math
 import logging
 import operator
 import copy
+import threading
 from itertools import groupby
 
 import numpy as num
 import pyrocko.model
 import pyrocko.pile
+import pyrocko.pile_overview
 import pyrocko.shadow_pile
 import pyrocko.trace
 import pyrocko.util
@@ -175,6 +177,111 @@ class Timer(object):
         return tuple([a[i] - b[i] for i in range(5)])
 
 
+def vec_covers(vec_old, vec_new):
+    '''Check if traces prepared for state vector ``vec_old`` can be reused.'''
+
+    return vec_old[0] <= vec_new[0] and vec_new[1] <= vec_old[1] \
+        and vec_old[2:] == vec_new[2:]
+
+
+class CutoutRequest(object):
+    '''Request to prepare the traces of a view in the background.'''
+
+    def __init__(self, vec, params):
+        self.vec = vec
+        self.params = params
+        self.traces = []
+        self.done = False
+        self.cancelled = False
+
+
+class CutoutWorker(threading.Thread):
+    '''
+    Worker thread preparing traces for the pile viewer.
+
+    Only the latest request is processed, requests superseded by a newer one
+    are cancelled. Progress is reported to the viewer through its
+    ``cutout_progress`` signal, at most every ``tprogress`` seconds.
+    '''
+
+    def __init__(self, viewer, tprogress=0.2):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.viewer = viewer
+        self.tprogress = tprogress
+        self._condition = threading.Condition()
+        self._request = None
+        self._current = None
+        self._stopped = False
+
+    def submit(self, request):
+        with self._condition:
+            for old in (self._request, self._current):
+                if old is not None:
+                    old.cancelled = True
+
+            self._request = request
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            for old in (self._request, self._current):
+                if old is not None:
+                    old.cancelled = True
+
+            self._stopped = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                request = self._request
+                self._request = None
+                self._current = request
+
+            self.process(request)
+
+            with self._condition:
+                self._current = None
+
+    def process(self, request):
+        tlast = [time.time()]
+
+        def progress(traces):
+            if time.time() - tlast[0] > self.tprogress:
+                request.traces = traces
+                self.viewer.cutout_progress.emit(request)
+                tlast[0] = time.time()
+
+        t0 = time.time()
+        try:
+            traces = self.viewer.process_cutout(
+                request.params,
+                progress=progress,
+                cancelled=lambda: request.cancelled)
+
+        except Exception as e:
+            logger.exception(e)
+            traces = []
+
+        if traces is None:
+            logger.debug('Cancelled background processing')
+            return
+
+        logger.debug(
+            'Time spent processing in background: %.3f' % (time.time() - t0))
+
+        request.traces = traces
+        request.done = True
+        self.viewer.cutout_progress.emit(request)
+
+
 class Integrator(pyrocko.shadow_pile.ShadowPile):
 
     def process(self, iblock, tmin, tmax, traces):
@@ -716,6 +823,7 @@ def MakePileViewerMainClass(base):
         markers_removed = qc.pyqtSignal(int, int)
         changed_marker_selection = qc.pyqtSignal(list)
         active_event_marker_changed = qc.pyqtSignal(int)
+        cutout_progress = qc.pyqtSignal(object)
 
         def __init__(self, pile, ntracks_shown_max, panel_parent, *args):
             if base == qgl.QGLWidget:
@@ -727,6 +835,7 @@ def MakePileViewerMainClass(base):
                 base.__init__(self, *args)
 
             self.pile = pile
+            self.overview_cache = None
             self.ax_height = 80
             self.panel_parent = panel_parent
 
@@ -973,6 +1082,18 @@ def MakePileViewerMainClass(base):
             self.menuitem_allowdownsampling.setChecked(True)
             self.menu.addAction(self.menuitem_allowdownsampling)
 
+            self.menuitem_overviews = qw.QAction(
+                'Use Overviews', self.menu)
+            self.menuitem_overviews.setCheckable(True)
+            self.menuitem_overviews.setChecked(True)
+            self.menu.addAction(self.menuitem_overviews)
+
+            self.menuitem_background = qw.QAction(
+                'Background Processing', self.menu)
+            self.menuitem_background.setCheckable(True)
+            self.menuitem_background.setChecked(True)
+            self.menu.addAction(self.menuitem_background)
+
             self.menuitem_degap = qw.QAction('Allow Degapping', self.menu)
             self.menuitem_degap.setCheckable(True)
             self.menuitem_degap.setChecked(True)
@@ -1082,6 +1203,10 @@ def MakePileViewerMainClass(base):
 
             self.old_vec = None
             self.old_processed_traces = None
+            self.cutout_request = None
+            self.cutout_worker = CutoutWorker(self)
+            self.cutout_progress.connect(self.cutout_progress_received)
+            self.cutout_worker.start()
 
             self.timer = qc.QTimer(self)
             self.timer.timeout.connect(self.periodical)
@@ -1430,7 +1555,7 @@ def MakePileViewerMainClass(base):
             self.toggle_panel_menu.removeAction(item)
 
         def load(self, paths, regex=None, format='from_extension',
-                 cache_dir=None, force_cache=False):
+                 cache_dir=None, force_cache=False, nprocs=1):
 
             if cache_dir is None:
                 cache_dir = pyrocko.config.config().cache_dir
@@ -1444,6 +1569,8 @@ def MakePileViewerMainClass(base):
                 return
 
             cache = pyrocko.pile.get_cache(cache_dir)
+            self.overview_cache = pyrocko.pile_overview.get_cache(
+                os.path.join(cache_dir, 'overview'))
 
             t = [time.time()]
 
@@ -1451,7 +1578,7 @@ def MakePileViewerMainClass(base):
                 pbs = self.parent().get_progressbars()
                 if label.lower() == 'looking at files':
                     label = 'Looking at %i files' % len(fns)
-                else:
+                elif label.lower() != 'building overviews':
                     label = 'Scanning %i files' % len(fns)
 
                 return pbs.set_status(label, value)
@@ -1482,7 +1609,15 @@ def MakePileViewerMainClass(base):
                 cache=cache,
                 fileformat=format,
                 show_progress=False,
-                update_progress=update_progress)
+                update_progress=update_progress,
+                nprocs=nprocs)
+
+            if self.menuitem_overviews.isChecked():
+                abspaths = set(os.path.abspath(fn) for fn in fns)
+                self.overview_cache.update(
+                    [file for file in self.pile.iter_files()
+                     if file.abspath in abspaths],
+                    update_progress=update_progress)
 
             self.automatic_updates = True
             self.update()
@@ -2769,7 +2904,8 @@ def MakePileViewerMainClass(base):
                     self.tmin, self.tmax,
                     trace_selector=self.trace_selector,
                     degap=self.menuitem_degap.isChecked(),
-                    demean=self.menuitem_demean.isChecked())
+                    demean=self.menuitem_demean.isChecked(),
+                    background=not printmode)
 
                 color_lookup = dict(
                     [(k, i) for (i, k) in enumerate(self.color_keys)])
@@ -3067,6 +3203,7 @@ def MakePileViewerMainClass(base):
 
         def clean_update(self):
             self.old_processed_traces = None
+            self.cutout_request = None
             self.update()
 
         def get_adequate_tpad(self):
@@ -3085,7 +3222,7 @@ def MakePileViewerMainClass(base):
 
         def prepare_cutout2(
                 self, tmin, tmax, trace_selector=None, degap=True,
-                demean=True, nmax=6000):
+                demean=True, nmax=6000, background=False):
 
             if self.pile.is_empty():
                 return []
@@ -3123,17 +3260,37 @@ def MakePileViewerMainClass(base):
             tpad = self.get_adequate_tpad()
             tpad = max(tpad, tsee)
 
+            have_hooks = any(
+                snuffling._pre_process_hook_enabled
+                or snuffling._post_process_hook_enabled
+                for snuffling in self.snufflings)
+
+            # min/max overviews of long traces can be shown instead of the
+            # full-rate data, as long as no processing is applied
+            tbin = tsee/nmax
+            use_overviews = (
+                self.menuitem_overviews.isChecked()
+                and self.lowpass is None
+                and self.highpass is None
+                and self.rotate == 0.0
+                and not isinstance(
+                    self.pile, pyrocko.shadow_pile.ShadowPile)
+                and not have_hooks)
+
+            if use_overviews:
+                kbin = int(math.floor(math.log(tbin, 2.)))
+            else:
+                kbin = None
+
             # state vector to decide if cached traces can be used
             vec = (
                 tmin, tmax, tpad, trace_selector, degap, demean, self.lowpass,
                 self.highpass, fft_filtering, lphp,
                 min_deltat_allow, self.rotate, self.shown_tracks_range,
-                ads, self.pile.get_update_count())
+                ads, kbin, self.pile.get_update_count())
 
             if (self.old_vec
-                    and self.old_vec[0] <= vec[0]
-                    and vec[1] <= self.old_vec[1]
-                    and vec[2:] == self.old_vec[2:]
+                    and vec_covers(self.old_vec, vec)
                     and not (self.reloaded or self.menuitem_watch.isChecked())
                     and self.old_processed_traces is not None):
 
@@ -3141,159 +3298,24 @@ def MakePileViewerMainClass(base):
                 processed_traces = self.old_processed_traces
 
             else:
-                self.old_vec = vec
-
-                processed_traces = []
-
-                if self.pile.deltatmax >= min_deltat_allow:
-
-                    def group_selector(gr):
-                        return gr.deltatmax >= min_deltat_allow
-
-                    if trace_selector is not None:
-                        def trace_selectorx(tr):
-                            return tr.deltat >= min_deltat_allow \
-                                and trace_selector(tr)
-                    else:
-                        def trace_selectorx(tr):
-                            return tr.deltat >= min_deltat_allow
-
-                    for traces in self.pile.chopper(
-                            tmin=tmin, tmax=tmax, tpad=tpad,
-                            want_incomplete=True,
-                            degap=degap,
-                            maxgap=gap_lap_tolerance,
-                            maxlap=gap_lap_tolerance,
-                            keep_current_files_open=True,
-                            group_selector=group_selector,
-                            trace_selector=trace_selectorx,
-                            accessor_id=id(self),
-                            snap=(math.floor, math.ceil),
-                            include_last=True):
-
-                        if demean:
-                            for tr in traces:
-                                y = tr.get_ydata()
-                                tr.set_ydata(y - num.mean(y))
-
-                        traces = self.pre_process_hooks(traces)
-
-                        for trace in traces:
-
-                            if not (trace.meta
-                                    and 'tabu' in trace.meta
-                                    and trace.meta['tabu']):
-
-                                if fft_filtering:
-                                    but = pyrocko.trace.ButterworthResponse
-                                    multres = pyrocko.trace.MultiplyResponse
-                                    if self.lowpass is not None \
-                                            or self.highpass is not None:
-
-                                        it = num.arange(
-                                            trace.data_len(), dtype=num.float)
-                                        detr_data, m, b = detrend(
-                                            it, trace.get_ydata())
-
-                                        trace.set_ydata(detr_data)
-
-                                        freqs, fdata = trace.spectrum(
-                                            pad_to_pow2=True, tfade=None)
-
-                                        nfreqs = fdata.size
-
-                                        key = (trace.deltat, nfreqs)
-
-                                        if key not in self.tf_cache:
-                                            resps = []
-                                            if self.lowpass is not None:
-                                                resps.append(but(
-                                                    order=4,
-                                                    corner=self.lowpass,
-                                                    type='low'))
-
-                                            if self.highpass is not None:
-                                                resps.append(but(
-                                                    order=4,
-                                                    corner=self.highpass,
-                                                    type='high'))
-
-                                            resp = multres(resps)
-                                            self.tf_cache[key] = \
-                                                resp.evaluate(freqs)
-
-                                        filtered_data = num.fft.irfft(
-                                            fdata*self.tf_cache[key]
-                                            )[:trace.data_len()]
-
-                                        retrended_data = retrend(
-                                            it, filtered_data, m, b)
-
-                                        trace.set_ydata(retrended_data)
-
-                                else:
-
-                                    if ads and self.lowpass is not None:
-                                        while trace.deltat \
-                                                < min_deltat_wo_decimate:
-
-                                            trace.downsample(2, demean=False)
-
-                                    fmax = 0.5/trace.deltat
-                                    if not lphp and (
-                                            self.lowpass is not None
-                                            and self.highpass is not None
-                                            and self.lowpass < fmax
-                                            and self.highpass < fmax
-                                            and self.highpass < self.lowpass):
-
-                                        trace.bandpass(
-                                            2, self.highpass, self.lowpass)
-                                    else:
-                                        if self.lowpass is not None:
-                                            if self.lowpass < 0.5/trace.deltat:
-                                                trace.lowpass(
-                                                    4, self.lowpass,
-                                                    demean=False)
-
-                                        if self.highpass is not None:
-                                            if self.lowpass is None \
-                                                    or self.highpass \
-                                                    < self.lowpass:
-
-                                                if self.highpass < \
-                                                        0.5/trace.deltat:
-                                                    trace.highpass(
-                                                        4, self.highpass,
-                                                        demean=False)
-
-                            processed_traces.append(trace)
-
-                if self.rotate != 0.0:
-                    phi = self.rotate/180.*math.pi
-                    cphi = math.cos(phi)
-                    sphi = math.sin(phi)
-                    for a in processed_traces:
-                        for b in processed_traces:
-                            if (a.network == b.network
-                                    and a.station == b.station
-                                    and a.location == b.location
-                                    and ((a.channel.lower().endswith('n')
-                                         and b.channel.lower().endswith('e'))
-                                         or (a.channel.endswith('1')
-                                             and b.channel.endswith('2')))
-                                    and abs(a.deltat-b.deltat) < a.deltat*0.001
-                                    and abs(a.tmin-b.tmin) < a.deltat*0.01 and
-                                    len(a.get_ydata()) == len(b.get_ydata())):
-
-                                aydata = a.get_ydata()*cphi+b.get_ydata()*sphi
-                                bydata = -a.get_ydata()*sphi+b.get_ydata()*cphi
-                                a.set_ydata(aydata)
-                                b.set_ydata(bydata)
-
-                processed_traces = self.post_process_hooks(processed_traces)
-
-                self.old_processed_traces = processed_traces
+                params = dict(
+                    tmin=tmin, tmax=tmax, tpad=tpad,
+                    trace_selector=trace_selector, degap=degap,
+                    demean=demean, lowpass=self.lowpass,
+                    highpass=self.highpass, rotate=self.rotate,
+                    fft_filtering=fft_filtering, lphp=lphp, ads=ads,
+                    min_deltat_allow=min_deltat_allow,
+                    min_deltat_wo_decimate=min_deltat_wo_decimate,
+                    use_overviews=use_overviews, tbin=tbin)
+
+                if background and not have_hooks \
+                        and self.menuitem_background.isChecked():
+
+                    processed_traces = self.request_cutout(vec, params)
+                else:
+                    self.old_vec = vec
+                    processed_traces = self.process_cutout(params)
+                    self.old_processed_traces = processed_traces
 
             chopped_traces = []
             for trace in processed_traces:
@@ -3313,6 +3335,247 @@ def MakePileViewerMainClass(base):
             self.timer_cutout.stop()
             return chopped_traces
 
+        def process_cutout(self, params, progress=None, cancelled=None):
+            '''
+            Chop and process traces for display.
+
+            When background processing is enabled, this runs in the worker
+            thread, so all view settings are taken from ``params``.
+
+            :param params: dict with the settings collected by
+                :py:meth:`prepare_cutout2`
+            :param progress: callback, called with the list of traces
+                processed so far after each chopper window
+            :param cancelled: callback returning ``True`` if the processing
+                should be aborted
+            :returns: list of processed traces or ``None`` if cancelled
+            '''
+
+            tmin = params['tmin']
+            tmax = params['tmax']
+            tpad = params['tpad']
+            trace_selector = params['trace_selector']
+            degap = params['degap']
+            demean = params['demean']
+            lowpass = params['lowpass']
+            highpass = params['highpass']
+            rotate = params['rotate']
+            fft_filtering = params['fft_filtering']
+            lphp = params['lphp']
+            ads = params['ads']
+            min_deltat_allow = params['min_deltat_allow']
+            min_deltat_wo_decimate = params['min_deltat_wo_decimate']
+            use_overviews = params['use_overviews']
+            tbin = params['tbin']
+
+            processed_traces = []
+
+            if use_overviews:
+                processed_traces.extend(
+                    pyrocko.pile_overview.overview_traces(
+                        self.pile, tmin, tmax, tbin,
+                        trace_selector=trace_selector,
+                        demean=demean, cache=self.overview_cache))
+
+            if self.pile.deltatmax >= min_deltat_allow:
+
+                def group_selector(gr):
+                    return gr.deltatmax >= min_deltat_allow
+
+                if trace_selector is not None:
+                    def trace_selectorx(tr):
+                        return tr.deltat >= min_deltat_allow \
+                            and trace_selector(tr)
+                else:
+                    def trace_selectorx(tr):
+                        return tr.deltat >= min_deltat_allow
+
+                if use_overviews:
+                    trace_selectorx_ = trace_selectorx
+
+                    def trace_selectorx(tr):
+                        return trace_selectorx_(tr) and not \
+                            pyrocko.pile_overview.use_overview(tr, tbin)
+
+                for traces in self.pile.chopper(
+                        tmin=tmin, tmax=tmax, tpad=tpad,
+                        want_incomplete=True,
+                        degap=degap,
+                        maxgap=gap_lap_tolerance,
+                        maxlap=gap_lap_tolerance,
+                        keep_current_files_open=True,
+                        group_selector=group_selector,
+                        trace_selector=trace_selectorx,
+                        accessor_id=id(self),
+                        snap=(math.floor, math.ceil),
+                        include_last=True):
+
+                    if demean:
+                        for tr in traces:
+                            y = tr.get_ydata()
+                            tr.set_ydata(y - num.mean(y))
+
+                    traces = self.pre_process_hooks(traces)
+
+                    for trace in traces:
+
+                        if not (trace.meta
+                                and 'tabu' in trace.meta
+                                and trace.meta['tabu']):
+
+                            if fft_filtering:
+                                but = pyrocko.trace.ButterworthResponse
+                                multres = pyrocko.trace.MultiplyResponse
+                                if lowpass is not None \
+                                        or highpass is not None:
+
+                                    it = num.arange(
+                                        trace.data_len(), dtype=num.float)
+                                    detr_data, m, b = detrend(
+                                        it, trace.get_ydata())
+
+                                    trace.set_ydata(detr_data)
+
+                                    freqs, fdata = trace.spectrum(
+                                        pad_to_pow2=True, tfade=None)
+
+                                    nfreqs = fdata.size
+
+                                    key = (trace.deltat, nfreqs,
+                                           lowpass, highpass)
+
+                                    # may be shared between the GUI and the
+                                    # worker thread, corners are part of
+                                    # the key
+                                    tf = self.tf_cache.get(key)
+                                    if tf is None:
+                                        resps = []
+                                        if lowpass is not None:
+                                            resps.append(but(
+                                                order=4,
+                                                corner=lowpass,
+                                                type='low'))
+
+                                        if highpass is not None:
+                                            resps.append(but(
+                                                order=4,
+                                                corner=highpass,
+                                                type='high'))
+
+                                        resp = multres(resps)
+                                        tf = resp.evaluate(freqs)
+                                        if len(self.tf_cache) >= 64:
+                                            self.tf_cache.clear()
+
+                                        self.tf_cache[key] = tf
+
+                                    filtered_data = num.fft.irfft(
+                                        fdata*tf)[:trace.data_len()]
+
+                                    retrended_data = retrend(
+                                        it, filtered_data, m, b)
+
+                                    trace.set_ydata(retrended_data)
+
+                            else:
+
+                                if ads and lowpass is not None:
+                                    while trace.deltat \
+                                            < min_deltat_wo_decimate:
+
+                                        trace.downsample(2, demean=False)
+
+                                fmax = 0.5/trace.deltat
+                                if not lphp and (
+                                        lowpass is not None
+                                        and highpass is not None
+                                        and lowpass < fmax
+                                        and highpass < fmax
+                                        and highpass < lowpass):
+
+                                    trace.bandpass(
+                                        2, highpass, lowpass)
+                                else:
+                                    if lowpass is not None:
+                                        if lowpass < 0.5/trace.deltat:
+                                            trace.lowpass(
+                                                4, lowpass,
+                                                demean=False)
+
+                                    if highpass is not None:
+                                        if lowpass is None \
+                                                or highpass \
+                                                < lowpass:
+
+                                            if highpass < \
+                                                    0.5/trace.deltat:
+                                                trace.highpass(
+                                                    4, highpass,
+                                                    demean=False)
+
+                        processed_traces.append(trace)
+
+                    if cancelled is not None and cancelled():
+                        return None
+
+                    if progress is not None and rotate == 0.0:
+                        progress(list(processed_traces))
+
+            if rotate != 0.0:
+                phi = rotate/180.*math.pi
+                cphi = math.cos(phi)
+                sphi = math.sin(phi)
+                for a in processed_traces:
+                    for b in processed_traces:
+                        if (a.network == b.network
+                                and a.station == b.station
+                                and a.location == b.location
+                                and ((a.channel.lower().endswith('n')
+                                     and b.channel.lower().endswith('e'))
+                                     or (a.channel.endswith('1')
+                                         and b.channel.endswith('2')))
+                                and abs(a.deltat-b.deltat) < a.deltat*0.001
+                                and abs(a.tmin-b.tmin) < a.deltat*0.01 and
+                                len(a.get_ydata()) == len(b.get_ydata())):
+
+                            aydata = a.get_ydata()*cphi+b.get_ydata()*sphi
+                            bydata = -a.get_ydata()*sphi+b.get_ydata()*cphi
+                            a.set_ydata(aydata)
+                            b.set_ydata(bydata)
+
+            processed_traces = self.post_process_hooks(processed_traces)
+
+            return processed_traces
+
+        def request_cutout(self, vec, params):
+            '''
+            Get processed traces from the background worker.
+
+            A new request is queued unless the current one covers ``vec``.
+            Until the request is finished, the traces processed so far are
+            returned, or the previous results if there are none yet.
+            '''
+
+            request = self.cutout_request
+            if request is None or not vec_covers(request.vec, vec):
+                request = CutoutRequest(vec, params)
+                self.cutout_request = request
+                self.cutout_worker.submit(request)
+
+            if request.done:
+                self.old_vec = request.vec
+                self.old_processed_traces = request.traces
+                return request.traces
+
+            if request.traces:
+                return request.traces
+
+            return self.old_processed_traces or []
+
+        def cutout_progress_received(self, request):
+            if request is self.cutout_request and not request.cancelled:
+                self.update()
+
         def pre_process_hooks(self, traces):
             for snuffling in self.snufflings:
                 if snuffling._pre_process_hook_enabled:
@@ -3373,13 +3636,11 @@ def MakePileViewerMainClass(base):
         def lowpass_change(self, value, ignore=None):
             self.lowpass = value
             self.passband_check()
-            self.tf_cache = {}
             self.update()
 
         def highpass_change(self, value, ignore=None):
             self.highpass = value
             self.passband_check()
-            self.tf_cache = {}
             self.update()
 
         def passband_check(self):
@@ -3614,6 +3875,7 @@ def MakePileViewerMainClass(base):
 
         def myclose(self, return_tag=''):
             self.timer.stop()
+            self.cutout_worker.stop()
             if self.follow_timer is not None:
                 self.follow_timer.stop()
             self.window().close()
@@ -60,6 +60,8 @@ def snuffle(pile=None, **kwargs):
     :param cache_dir: cache directory with trace meta information
     :param force_cache: bool, whether to use the cache when attribute spoofing
         is active
+    :param nprocs: number of processes to use for scanning trace file headers
+        (``None`` to use all available cores, default: 1)
     :param store_path: filename template, where to store trace data from input
         streams
     :param store_interval: float, time interval (in seconds) between stream
@@ -81,7 +83,8 @@ def snuffle(pile=None, **kwargs):
         app = Snuffler()
 
     kwargs_load = {}
-    for k in ('paths', 'regex', 'format', 'cache_dir', 'force_cache'):
+    for k in ('paths', 'regex', 'format', 'cache_dir', 'force_cache',
+              'nprocs'):
         try:
             kwargs_load[k] = kwargs.pop(k)
         except KeyError:
@@ -232,6 +235,15 @@ def snuffler_from_commandline(args=None):
         help='use the cache even when trace attribute spoofing is active '
              '(may have silly consequences)')
 
+    parser.add_option(
+        '--scan-nprocs',
+        dest='scan_nprocs',
+        type='int',
+        default=1,
+        metavar='N',
+        help='use N processes to scan the headers of files not yet in the '
+             'cache, 0 to use all available cores [default: %default]')
+
     parser.add_option(
         '--store-path',
         dest='store_path',
@@ -303,7 +315,8 @@ def snuffler_from_commandline(args=None):
     for stationxml_fn in extend_paths(options.stationxml_fns):
         stations.extend(
             stationxml.load_xml(
-                filename=stationxml_fn).get_pyrocko_stations())
+                filename=stationxml_fn,
+                skip_responses=True).get_pyrocko_stations())
 
     events = []
     for event_fn in extend_paths(options.event_fns):
@@ -327,5 +340,6 @@ def snuffler_from_commandline(args=None):
         regex=options.regex,
         format=options.format,
         force_cache=options.force_cache,
+        nprocs=options.scan_nprocs or None,
         store_path=options.store_path,
         store_interval=options.store_interval)
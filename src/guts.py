@@ -15,6 +15,7 @@ import re
 import sys
 import types
 import copy
+import gc
 
 from io import BytesIO
 
@@ -369,11 +370,11 @@ class TBase(object):
         if self.optional and val is None:
             return val
 
-        is_derived = isinstance(val, self.cls)
-        is_exact = type(val) == self.cls
-
-        not_ok = not self.strict and not is_derived or \
-            self.strict and not is_exact
+        cls = self.cls
+        if type(val) is cls:
+            not_ok = False
+        else:
+            not_ok = self.strict or not isinstance(val, cls)
 
         if not_ok or self.force_regularize:
             if regularize:
@@ -389,8 +390,8 @@ class TBase(object):
                         self.xname(), val, type(val), self.cls.__name__))
 
         validator = self
-        if type(val) != self.cls \
-                and isinstance(val, self.cls) and \
+        if type(val) is not cls \
+                and isinstance(val, cls) and \
                 hasattr(val, 'T'):
             # derived classes only: validate with derived class validator
             validator = val.T.instance
@@ -409,7 +410,8 @@ class TBase(object):
         pass
 
     def validate_children(self, val, regularize, depth):
-        for prop, propval in self.ipropvals(val):
+        for prop in self.properties:
+            propval = getattr(val, prop.name)
             newpropval = prop.validate(propval, regularize, depth-1)
             if regularize and (newpropval is not propval):
                 setattr(val, prop.name, newpropval)
@@ -1331,16 +1333,27 @@ yaml.add_representer(newstr, newstr_representer, Dumper=SafeDumper)
 
 
 class Constructor(object):
-    def __init__(self, add_namespace_maps=False, strict=False):
+    def __init__(self, add_namespace_maps=False, strict=False, ignore=None):
         self.stack = []
         self.queue = []
         self.namespaces = {}
         self.namespaces_rev = {}
         self.add_namespace_maps = add_namespace_maps
         self.strict = strict
+        self.ignore = frozenset(ignore or ())
+        self.nobjects = 0
+        self.nignore = 0
 
     def start_element(self, name, attrs):
+        if self.nignore:
+            self.nignore += 1
+            return
+
         name = name.split()[-1]
+        if name in self.ignore:
+            self.nignore = 1
+            return
+
         if self.stack and self.stack[-1][1] is not None:
             cls = self.stack[-1][1].T.xmltagname_to_class.get(name, None)
             if cls is not None and (
@@ -1349,32 +1362,39 @@ class Constructor(object):
         else:
             cls = g_xmltagname_to_class.get(name, None)
 
+        if cls is not None:
+            self.nobjects += 1
+
         self.stack.append((name, cls, attrs, [], []))
 
     def end_element(self, name):
-        name = name.split()[-1]
+        if self.nignore:
+            self.nignore -= 1
+            return
+
         name, cls, attrs, content2, content1 = self.stack.pop()
 
         if cls is not None:
-            content2.extend(x for x in attrs.items())
+            self.nobjects -= 1
+            content2.extend(attrs.items())
             content2.append((None, ''.join(content1)))
             o = cls(**cls.T.translate_from_xml(content2, self.strict))
-            o.validate(regularize=True, depth=1)
             if self.add_namespace_maps:
                 o.namespace_map = dict(self.namespaces)
 
-            if self.stack and not all(x[1] is None for x in self.stack):
+            if self.nobjects:
                 self.stack[-1][-2].append((name, o))
             else:
+                # validation of the complete tree is deferred until the
+                # outermost object is finished
+                o.validate(regularize=True)
                 self.queue.append(o)
         else:
-            content = [''.join(content1)]
             if self.stack:
-                for c in content:
-                    self.stack[-1][-2].append((name, c))
+                self.stack[-1][-2].append((name, ''.join(content1)))
 
     def characters(self, char_content):
-        if self.stack:
+        if self.stack and not self.nignore:
             self.stack[-1][-1].append(char_content)
 
     def start_namespace(self, ns, uri):
@@ -1396,13 +1416,15 @@ class Constructor(object):
 
 def _iload_all_xml(
         stream,
-        bufsize=100000, add_namespace_maps=False, strict=False):
+        bufsize=100000, add_namespace_maps=False, strict=False, ignore=None):
 
     from xml.parsers.expat import ParserCreate
 
     parser = ParserCreate('UTF-8', namespace_separator=' ')
+    parser.buffer_text = True
 
-    handler = Constructor(add_namespace_maps=add_namespace_maps, strict=strict)
+    handler = Constructor(
+        add_namespace_maps=add_namespace_maps, strict=strict, ignore=ignore)
 
     parser.StartElementHandler = handler.start_element
     parser.EndElementHandler = handler.end_element
@@ -1412,7 +1434,17 @@ def _iload_all_xml(
 
     while True:
         data = stream.read(bufsize)
-        parser.Parse(data, bool(not data))
+
+        # construction creates many small objects, avoid repeated garbage
+        # collector runs over the growing object tree
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            parser.Parse(data, bool(not data))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
         for element in handler.get_queued_elements():
             yield element
 
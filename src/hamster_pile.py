@@ -7,7 +7,7 @@ from __future__ import absolute_import
 import os
 import logging
 
-from . import pile, io
+from . import pile
 from . import trace as tracemod
 
 logger = logging.getLogger('pyrocko.hamster_pile')
@@ -136,6 +136,7 @@ class HamsterPile(pile.Pile):
         self._fixation_length = fixation_length
         self._format = format
         self._path = path
+        self._writer = None
         self._forget_fixed = forget_fixed
         if processors is None:
             self._processors = [Processor()]
@@ -158,6 +159,7 @@ class HamsterPile(pile.Pile):
                  '%(tmin)s_%(tmax)s.mseed'):
 
         self.fixate_all()
+        self._close_writer()
         self._path = path
 
     def add_processor(self, processor):
@@ -221,12 +223,18 @@ class HamsterPile(pile.Pile):
     def _fixate(self, buf):
         if self._path:
             trbuf = buf.get_traces()[0]
-            fns = io.save([trbuf], self._path, format=self._format)
-
+            self._save([trbuf])
             self.remove_file(buf)
-            if not self._forget_fixed:
-                self.load_files(
-                    fns, show_progress=False, fileformat=self._format)
+
+    def _save(self, traces):
+        self._writer = pile.save_and_add(
+            self, self._writer, traces, self._path, self._format,
+            add=not self._forget_fixed)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
     def drop_older(self, tmax, delete_disk_files=False):
         self.drop(
@@ -248,3 +256,4 @@ class HamsterPile(pile.Pile):
 
     def __del__(self):
         self.fixate_all()
+        self._close_writer()
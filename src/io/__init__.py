@@ -93,6 +93,29 @@ def detect_format(filename):
     raise FileLoadError(UnknownFormat(filename))
 
 
+extension_to_format = {
+    '.yaff': 'yaff',
+    '.sac': 'sac',
+    '.kan': 'kan',
+    '.segy': 'segy',
+    '.sgy': 'segy',
+    '.gse': 'gse2',
+    '.wfdisc': 'css'}
+
+
+def resolve_format(filename, format):
+    '''Get file format to use for ``'from_extension'`` or ``'detect'``.'''
+
+    if format == 'from_extension':
+        extension = os.path.splitext(filename)[1]
+        format = extension_to_format.get(extension.lower(), 'mseed')
+
+    if format == 'detect':
+        format = detect_format(filename)
+
+    return format
+
+
 def iload(filename, format='mseed', getdata=True, substitutions=None):
     '''Load traces from file (iterator version).
 
@@ -117,22 +140,7 @@ def iload(filename, format='mseed', getdata=True, substitutions=None):
         tr.set_mtime(mtime)
         return tr
 
-    extension_to_format = {
-        '.yaff': 'yaff',
-        '.sac': 'sac',
-        '.kan': 'kan',
-        '.segy': 'segy',
-        '.sgy': 'segy',
-        '.gse': 'gse2',
-        '.wfdisc': 'css'}
-
-    if format == 'from_extension':
-        format = 'mseed'
-        extension = os.path.splitext(filename)[1]
-        format = extension_to_format.get(extension.lower(), 'mseed')
-
-    if format == 'detect':
-        format = detect_format(filename)
+    format = resolve_format(filename, format)
 
     format_to_module = {
         'kan': kan,
@@ -258,6 +266,32 @@ def save(traces, filename_template, format='mseed', additional={},
 save.__doc__ %= allowed_formats('save', 'doc')
 
 
+def get_writer(filename_template, format='mseed', additional={},
+               overwrite=True):
+    '''Get incremental writer for formats which support appending.
+
+    :param filename_template: filename template, see :py:func:`save`
+    :param format: file format, currently only ``'mseed'`` is supported
+    :param additional: dict with custom template placeholder fillins.
+    :param overwrite': if ``False``, raise an exception if file exists
+    :returns: writer object with methods ``write(traces)``, ``flush()``
+        and ``close()``, see :py:class:`pyrocko.io.mseed.MSeedWriter`
+
+    Unlike :py:func:`save`, repeated writes to the same output file append
+    to it and output files are kept open between writes.
+    '''
+
+    if format == 'from_extension':
+        format = os.path.splitext(filename_template)[1][1:]
+
+    if format == 'mseed':
+        return mseed.MSeedWriter(
+            filename_template, additional=additional, overwrite=overwrite)
+
+    else:
+        raise UnsupportedFormat(format)
+
+
 class UnknownFormat(Exception):
     def __init__(self, filename):
         Exception.__init__(self, 'Unknown file format: %s' % filename)
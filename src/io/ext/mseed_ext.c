@@ -27,48 +27,18 @@ static struct module_state _state;
 
 
 static PyObject*
-mseed_get_traces (PyObject *m, PyObject *args)
+traces_from_group(struct module_state *st, MSTraceGroup *mstg, int unpackdata)
 {
-    char          *filename;
-    MSTraceGroup  *mstg = NULL;
     MSTrace       *mst = NULL;
-    int           retcode;
     npy_intp      array_dims[1] = {0};
     PyObject      *array = NULL;
     PyObject      *out_traces = NULL;
     PyObject      *out_trace = NULL;
     int           numpytype;
     char          strbuf[BUFSIZE];
-    PyObject      *unpackdata = NULL;
-
-    struct module_state *st = GETSTATE(m);
-
-    if (!PyArg_ParseTuple(args, "sO", &filename, &unpackdata)) {
-        PyErr_SetString(st->error, "usage get_traces(filename, dataflag)" );
-        return NULL;
-    }
-
-    if (!PyBool_Check(unpackdata)) {
-        PyErr_SetString(st->error, "Second argument must be a boolean" );
-        return NULL;
-    }
-  
-    /* get data from mseed file */
-    retcode = ms_readtraces (&mstg, filename, 0, -1.0, -1.0, 0, 1, (unpackdata == Py_True), 0);
-    if ( retcode < 0 ) {
-        snprintf (strbuf, BUFSIZE, "Cannot read file '%s': %s", filename, ms_errorstr(retcode));
-        PyErr_SetString(st->error, strbuf);
-        return NULL;
-    }
-
-    if ( ! mstg ) {
-        snprintf (strbuf, BUFSIZE, "Error reading file");
-        PyErr_SetString(st->error, strbuf);
-        return NULL;
-    }
 
     /* check that there is data in the traces */
-    if (unpackdata == Py_True) {
+    if (unpackdata) {
         mst = mstg->traces;
         while (mst) {
             if (mst->datasamples == NULL) {
@@ -88,7 +58,7 @@ mseed_get_traces (PyObject *m, PyObject *args)
 
     while (mst) {
         
-        if (unpackdata == Py_True) {
+        if (unpackdata) {
             array_dims[0] = mst->numsamples;
             switch (mst->sampletype) {
                 case 'i':
@@ -137,7 +107,455 @@ mseed_get_traces (PyObject *m, PyObject *args)
         mst = mst->next;
     }
 
+    return out_traces;
+}
+
+
+static PyObject*
+mseed_get_traces (PyObject *m, PyObject *args)
+{
+    char          *filename;
+    MSTraceGroup  *mstg = NULL;
+    int           retcode;
+    PyObject      *out_traces = NULL;
+    char          strbuf[BUFSIZE];
+    PyObject      *unpackdata = NULL;
+    flag          dataflag;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "sO", &filename, &unpackdata)) {
+        PyErr_SetString(st->error, "usage get_traces(filename, dataflag)" );
+        return NULL;
+    }
+
+    if (!PyBool_Check(unpackdata)) {
+        PyErr_SetString(st->error, "Second argument must be a boolean" );
+        return NULL;
+    }
+
+    dataflag = (unpackdata == Py_True);
+
+    /* get data from mseed file, decoding does not need the GIL */
+    Py_BEGIN_ALLOW_THREADS
+    retcode = ms_readtraces (&mstg, filename, 0, -1.0, -1.0, 0, 1, dataflag, 0);
+    Py_END_ALLOW_THREADS
+
+    if ( retcode < 0 ) {
+        snprintf (strbuf, BUFSIZE, "Cannot read file '%s': %s", filename, ms_errorstr(retcode));
+        PyErr_SetString(st->error, strbuf);
+        return NULL;
+    }
+
+    if ( ! mstg ) {
+        snprintf (strbuf, BUFSIZE, "Error reading file");
+        PyErr_SetString(st->error, strbuf);
+        return NULL;
+    }
+
+    out_traces = traces_from_group(st, mstg, dataflag);
+
+    mst_freegroup (&mstg);
+
+    return out_traces;
+}
+
+
+static PyObject*
+mseed_get_records (PyObject *m, PyObject *args)
+{
+    char          *filename;
+    MSFileParam   *msfp = NULL;
+    MSRecord      *msr = NULL;
+    off_t         fpos;
+    int           retcode;
+    int64_t       *records = NULL;
+    int64_t       *records_new = NULL;
+    npy_intp      nrecords = 0;
+    npy_intp      nalloc = 0;
+    npy_intp      array_dims[2] = {0, 4};
+    PyObject      *array = NULL;
+    char          strbuf[BUFSIZE];
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "s", &filename)) {
+        PyErr_SetString(st->error, "usage get_records(filename)" );
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    while ((retcode = ms_readmsr_r (&msfp, &msr, filename, 0, &fpos, NULL, 1, 0, 0)) == MS_NOERROR) {
+        if (nrecords == nalloc) {
+            nalloc = nalloc ? nalloc * 2 : 1024;
+            records_new = realloc(records, nalloc * 4 * sizeof(int64_t));
+            if (records_new == NULL) {
+                retcode = MS_GENERROR;
+                break;
+            }
+            records = records_new;
+        }
+        records[nrecords*4 + 0] = fpos;
+        records[nrecords*4 + 1] = msr->reclen;
+        records[nrecords*4 + 2] = msr->starttime;
+        records[nrecords*4 + 3] = msr_endtime (msr);
+        nrecords++;
+    }
+
+    /* cleanup */
+    ms_readmsr_r (&msfp, &msr, NULL, 0, NULL, NULL, 0, 0, 0);
+    Py_END_ALLOW_THREADS
+
+    if (retcode != MS_ENDOFFILE) {
+        free(records);
+        snprintf (strbuf, BUFSIZE, "Cannot read file '%s': %s", filename, ms_errorstr(retcode));
+        PyErr_SetString(st->error, strbuf);
+        return NULL;
+    }
+
+    array_dims[0] = nrecords;
+    array = PyArray_SimpleNew(2, array_dims, NPY_INT64);
+    if (nrecords > 0) {
+        memcpy(PyArray_DATA((PyArrayObject*)array), records, nrecords * 4 * sizeof(int64_t));
+    }
+    free(records);
+
+    return array;
+}
+
+
+static PyObject*
+mseed_get_traces_records (PyObject *m, PyObject *args)
+{
+    char          *filename;
+    PyObject      *offsets_arr = NULL;
+    PyObject      *reclens_arr = NULL;
+    PyObject      *unpackdata = NULL;
+    int64_t       *offsets;
+    int64_t       *reclens;
+    npy_intp      nrecords, i;
+    FILE          *fp;
+    char          *recbuf = NULL;
+    char          *recbuf_new = NULL;
+    int64_t       recbuf_size = 0;
+    MSRecord      *msr = NULL;
+    MSTraceGroup  *mstg = NULL;
+    int           retcode = MS_NOERROR;
+    PyObject      *out_traces = NULL;
+    char          strbuf[BUFSIZE];
+    flag          dataflag;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "sOOO", &filename, &offsets_arr, &reclens_arr, &unpackdata)) {
+        PyErr_SetString(st->error, "usage get_traces_records(filename, offsets, reclens, dataflag)" );
+        return NULL;
+    }
+
+    if (!PyBool_Check(unpackdata)) {
+        PyErr_SetString(st->error, "Fourth argument must be a boolean" );
+        return NULL;
+    }
+
+    if (!PyArray_Check(offsets_arr) || !PyArray_Check(reclens_arr) ||
+            PyArray_TYPE((PyArrayObject*)offsets_arr) != NPY_INT64 ||
+            PyArray_TYPE((PyArrayObject*)reclens_arr) != NPY_INT64 ||
+            !PyArray_ISCARRAY((PyArrayObject*)offsets_arr) ||
+            !PyArray_ISCARRAY((PyArrayObject*)reclens_arr) ||
+            PyArray_SIZE((PyArrayObject*)offsets_arr) != PyArray_SIZE((PyArrayObject*)reclens_arr)) {
+        PyErr_SetString(st->error, "offsets and reclens must be contiguous int64 arrays of the same size" );
+        return NULL;
+    }
+
+    offsets = PyArray_DATA((PyArrayObject*)offsets_arr);
+    reclens = PyArray_DATA((PyArrayObject*)reclens_arr);
+    nrecords = PyArray_SIZE((PyArrayObject*)offsets_arr);
+    dataflag = (unpackdata == Py_True);
+
+    fp = fopen(filename, "rb");
+    if (fp == NULL) {
+        snprintf (strbuf, BUFSIZE, "Cannot open file '%s'", filename);
+        PyErr_SetString(st->error, strbuf);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    mstg = mst_initgroup (NULL);
+
+    for (i=0; i<nrecords; i++) {
+        if (reclens[i] > recbuf_size) {
+            recbuf_new = realloc(recbuf, reclens[i]);
+            if (recbuf_new == NULL) {
+                retcode = MS_GENERROR;
+                break;
+            }
+            recbuf = recbuf_new;
+            recbuf_size = reclens[i];
+        }
+
+        if (fseeko(fp, offsets[i], SEEK_SET) != 0 ||
+                fread(recbuf, reclens[i], 1, fp) != 1) {
+            retcode = MS_GENERROR;
+            break;
+        }
+
+        retcode = msr_unpack (recbuf, reclens[i], &msr, dataflag, 0);
+        if (retcode != MS_NOERROR) {
+            break;
+        }
+
+        mst_addmsrtogroup (mstg, msr, 0, -1.0, -1.0);
+    }
+
+    msr_free (&msr);
+    free(recbuf);
+    fclose(fp);
+    Py_END_ALLOW_THREADS
+
+    if (retcode != MS_NOERROR) {
+        mst_freegroup (&mstg);
+        snprintf (strbuf, BUFSIZE, "Cannot read records from file '%s': %s", filename, ms_errorstr(retcode));
+        PyErr_SetString(st->error, strbuf);
+        return NULL;
+    }
+
+    out_traces = traces_from_group(st, mstg, dataflag);
+
+    mst_freegroup (&mstg);
+
+    return out_traces;
+}
+
+struct raw_trace {
+    int64_t       head;
+    int64_t       tail;
+    char          sampletype;
+    PyObject      *array;
+};
+
+struct raw_record {
+    MSTrace       *mst;
+    int64_t       dataoffset;
+    int64_t       nsamples;
+    int64_t       pos;
+    int           samplesize;
+    int           swapflag;
+};
+
+static int
+raw_sampletype(int8_t encoding, char *sampletype, int *samplesize)
+{
+    switch (encoding) {
+        case DE_INT32:
+            *sampletype = 'i';
+            *samplesize = 4;
+            return 1;
+        case DE_FLOAT32:
+            *sampletype = 'f';
+            *samplesize = 4;
+            return 1;
+        case DE_FLOAT64:
+            *sampletype = 'd';
+            *samplesize = 8;
+            return 1;
+        default:
+            return 0;
+    }
+}
+
+static PyObject*
+mseed_get_traces_buffer (PyObject *m, PyObject *args)
+{
+    Py_buffer         buffer;
+    char              *buf;
+    int64_t           buflen, offset = 0, nbytes;
+    MSRecord          *msr = NULL;
+    MSTraceGroup      *mstg = NULL;
+    MSTrace           *mst = NULL;
+    struct raw_trace  *rt = NULL;
+    struct raw_record *records = NULL;
+    struct raw_record *records_new = NULL;
+    struct raw_record *rec = NULL;
+    npy_intp          nrecords = 0, nalloc = 0, i;
+    int64_t           j;
+    npy_intp          array_dims[1] = {0};
+    int               retcode, numpytype, samplesize, ok = 1;
+    int               hostorder = ms_bigendianhost();
+    char              sampletype;
+    flag              whence;
+    hptime_t          endtime;
+    char              *dst;
+    PyObject          *out_traces = NULL;
+    PyObject          *out_trace = NULL;
+
+    struct module_state *st = GETSTATE(m);
+
+#if PY_MAJOR_VERSION >= 3
+    if (!PyArg_ParseTuple(args, "y*", &buffer)) {
+#else
+    if (!PyArg_ParseTuple(args, "s*", &buffer)) {
+#endif
+        PyErr_SetString(st->error, "usage get_traces_buffer(buffer)" );
+        return NULL;
+    }
+
+    buf = buffer.buf;
+    buflen = buffer.len;
+
+    mstg = mst_initgroup (NULL);
+
+    /* pass 1: parse headers, assemble traces and remember where the samples
+     * of each record will go in the output arrays */
+
+    while (ok && offset < buflen) {
+        nbytes = buflen - offset;
+        if (nbytes > MAXRECLEN) nbytes = MAXRECLEN;
+
+        retcode = msr_parse (buf + offset, (int)nbytes, &msr, 0, 0, 0);
+        if (retcode != MS_NOERROR ||
+                !raw_sampletype(msr->encoding, &sampletype, &samplesize) ||
+                msr->byteorder < 0 ||
+                msr->samplecnt < 0 ||
+                msr->fsdh->data_offset + msr->samplecnt * samplesize > msr->reclen) {
+
+            ok = 0;
+            break;
+        }
+
+        endtime = msr_endtime (msr);
+        mst = mst_findadjacent (mstg, &whence, 0,
+                                msr->network, msr->station, msr->location,
+                                msr->channel, msr->samprate, -1.0,
+                                msr->starttime, endtime, -1.0);
+
+        if (mst) {
+            offset += msr->reclen;
+            if (msr->samplecnt <= 0 || msr->samprate <= 0.0)
+                continue;
+
+            if (mst_addmsr (mst, msr, whence)) {
+                ok = 0;
+                break;
+            }
+        } else {
+            whence = 1;
+            mst = mst_addmsrtogroup (mstg, msr, 0, -1.0, -1.0);
+            if (mst == NULL) {
+                ok = 0;
+                break;
+            }
+            mst->prvtptr = calloc(1, sizeof(struct raw_trace));
+            if (mst->prvtptr == NULL) {
+                ok = 0;
+                break;
+            }
+            ((struct raw_trace*)mst->prvtptr)->sampletype = sampletype;
+            offset += msr->reclen;
+        }
+
+        rt = mst->prvtptr;
+        if (rt->sampletype != sampletype) {
+            ok = 0;
+            break;
+        }
+
+        if (nrecords == nalloc) {
+            nalloc = nalloc ? nalloc * 2 : 1024;
+            records_new = realloc(records, nalloc * sizeof(struct raw_record));
+            if (records_new == NULL) {
+                ok = 0;
+                break;
+            }
+            records = records_new;
+        }
+
+        rec = &records[nrecords++];
+        rec->mst = mst;
+        rec->dataoffset = offset - msr->reclen + msr->fsdh->data_offset;
+        rec->nsamples = msr->samplecnt;
+        rec->samplesize = samplesize;
+        rec->swapflag = (msr->byteorder != hostorder);
+        if (whence == 2) {
+            rt->head -= msr->samplecnt;
+            rec->pos = rt->head;
+        } else {
+            rec->pos = rt->tail;
+            rt->tail += msr->samplecnt;
+        }
+    }
+
+    msr_free (&msr);
+
+    if (!ok) {
+        /* not decodable here, caller should use get_traces instead */
+        free(records);
+        mst_freegroup (&mstg);
+        PyBuffer_Release(&buffer);
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+
+    /* pass 2: allocate output arrays and copy the samples directly from the
+     * buffer */
+
+    out_traces = Py_BuildValue("[]");
+
+    mst = mstg->traces;
+    while (mst) {
+        rt = mst->prvtptr;
+        array_dims[0] = rt->tail - rt->head;
+        switch (rt->sampletype) {
+            case 'i':
+                numpytype = NPY_INT32;
+                break;
+            case 'f':
+                numpytype = NPY_FLOAT32;
+                break;
+            default:
+                numpytype = NPY_FLOAT64;
+                break;
+        }
+        rt->array = PyArray_SimpleNew(1, array_dims, numpytype);
+
+        out_trace = Py_BuildValue( "(c,s,s,s,s,L,L,d,N)",
+                                    mst->dataquality,
+                                    mst->network,
+                                    mst->station,
+                                    mst->location,
+                                    mst->channel,
+                                    mst->starttime,
+                                    mst->endtime,
+                                    mst->samprate,
+                                    rt->array );
+
+        PyList_Append(out_traces, out_trace);
+        Py_DECREF(out_trace);
+        mst = mst->next;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<nrecords; i++) {
+        rec = &records[i];
+        rt = rec->mst->prvtptr;
+        dst = (char*)PyArray_DATA((PyArrayObject*)rt->array) +
+            (rec->pos - rt->head) * rec->samplesize;
+
+        memcpy(dst, buf + rec->dataoffset, rec->nsamples * rec->samplesize);
+        if (rec->swapflag) {
+            if (rec->samplesize == 4) {
+                for (j=0; j<rec->nsamples; j++)
+                    ms_gswap4a(dst + j*4);
+            } else {
+                for (j=0; j<rec->nsamples; j++)
+                    ms_gswap8a(dst + j*8);
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    free(records);
     mst_freegroup (&mstg);
+    PyBuffer_Release(&buffer);
 
     return out_traces;
 }
@@ -148,13 +566,41 @@ static void record_handler (char *record, int reclen, void *outfile) {
     }
 }
 
-static PyObject*
-mseed_store_traces (PyObject *m, PyObject *args)
+typedef struct {
+    char   *data;
+    size_t len;
+    size_t cap;
+    int    failed;
+} record_buffer_t;
+
+static void buffer_record_handler (char *record, int reclen, void *buffer) {
+    record_buffer_t *buf = (record_buffer_t*)buffer;
+    char *data;
+    size_t cap;
+
+    if (buf->failed) return;
+
+    if (buf->len + reclen > buf->cap) {
+        cap = buf->cap > 0 ? buf->cap : 4096;
+        while (buf->len + reclen > cap) cap *= 2;
+        data = realloc(buf->data, cap);
+        if (data == NULL) {
+            buf->failed = 1;
+            return;
+        }
+        buf->data = data;
+        buf->cap = cap;
+    }
+    memcpy(buf->data + buf->len, record, reclen);
+    buf->len += reclen;
+}
+
+static int
+pack_traces (struct module_state *st, PyObject *in_traces, int reclen,
+             void (*handler) (char *, int, void *), void *handlerdata)
 {
-    char          *filename;
     MSTrace       *mst = NULL;
     PyObject      *array = NULL;
-    PyObject      *in_traces = NULL;
     PyObject      *in_trace = NULL;
     PyArrayObject *contiguous_array = NULL;
     int           i;
@@ -164,24 +610,6 @@ mseed_store_traces (PyObject *m, PyObject *args)
     int64_t       psamples;
     int           numpytype;
     int           length;
-    FILE          *outfile;
-
-    struct module_state *st = GETSTATE(m);
-
-    if (!PyArg_ParseTuple(args, "Os", &in_traces, &filename)) {
-        PyErr_SetString(st->error, "usage store_traces(traces, filename)" );
-        return NULL;
-    }
-    if (!PySequence_Check( in_traces )) {
-        PyErr_SetString(st->error, "Traces is not of sequence type." );
-        return NULL;
-    }
-
-    outfile = fopen(filename, "w" );
-    if (outfile == NULL) {
-        PyErr_SetString(st->error, "Error opening file.");
-        return NULL;
-    }
 
     for (i=0; i<PySequence_Length(in_traces); i++) {
         
@@ -189,7 +617,7 @@ mseed_store_traces (PyObject *m, PyObject *args)
         if (!PyTuple_Check(in_trace)) {
             PyErr_SetString(st->error, "Trace record must be a tuple of (network, station, location, channel, starttime, endtime, samprate, data)." );
             Py_DECREF(in_trace);
-            return NULL;
+            return -1;
         }
         mst = mst_init (NULL);
         
@@ -205,7 +633,7 @@ mseed_store_traces (PyObject *m, PyObject *args)
             PyErr_SetString(st->error, "Trace record must be a tuple of (network, station, location, channel, starttime, endtime, samprate, data)." );
             mst_free( &mst );  
             Py_DECREF(in_trace);
-            return NULL;
+            return -1;
         }
 
         strncpy( mst->network, network, 10);
@@ -221,13 +649,13 @@ mseed_store_traces (PyObject *m, PyObject *args)
             PyErr_SetString(st->error, "Data must be given as NumPy array." );
             mst_free( &mst );
             Py_DECREF(in_trace);
-            return NULL;
+            return -1;
         }
         if (PyArray_ISBYTESWAPPED((PyArrayObject*)array)) {
             PyErr_SetString(st->error, "Data must be given in machine byte-order" );
             mst_free( &mst );
             Py_DECREF(in_trace);
-            return NULL;
+            return -1;
         }
 
         numpytype = PyArray_TYPE((PyArrayObject*)array);
@@ -256,7 +684,7 @@ mseed_store_traces (PyObject *m, PyObject *args)
                     PyErr_SetString(st->error, "Data must be of type float64, float32, int32 or int8.");
                     mst_free( &mst );  
                     Py_DECREF(in_trace);
-                    return NULL;
+                    return -1;
             }
         mst->sampletype = mstype;
 
@@ -270,17 +698,90 @@ mseed_store_traces (PyObject *m, PyObject *args)
         memcpy(mst->datasamples, PyArray_DATA(contiguous_array), length*ms_samplesize(mstype));
         Py_DECREF(contiguous_array);
 
-        mst_pack (mst, &record_handler, outfile, 4096, msdetype,
+        mst_pack (mst, handler, handlerdata, reclen, msdetype,
                                      1, &psamples, 1, 0, NULL);
         mst_free( &mst );
         Py_DECREF(in_trace);
     }
+
+    return 0;
+}
+
+static PyObject*
+mseed_store_traces (PyObject *m, PyObject *args)
+{
+    char          *filename;
+    PyObject      *in_traces = NULL;
+    FILE          *outfile;
+    int           status;
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "Os", &in_traces, &filename)) {
+        PyErr_SetString(st->error, "usage store_traces(traces, filename)" );
+        return NULL;
+    }
+    if (!PySequence_Check( in_traces )) {
+        PyErr_SetString(st->error, "Traces is not of sequence type." );
+        return NULL;
+    }
+
+    outfile = fopen(filename, "w" );
+    if (outfile == NULL) {
+        PyErr_SetString(st->error, "Error opening file.");
+        return NULL;
+    }
+
+    status = pack_traces(st, in_traces, 4096, &record_handler, outfile);
     fclose( outfile );
 
+    if (status != 0) {
+        return NULL;
+    }
+
     Py_INCREF(Py_None);
     return Py_None;
 }
 
+static PyObject*
+mseed_pack_traces (PyObject *m, PyObject *args)
+{
+    PyObject        *in_traces = NULL;
+    PyObject        *out_bytes = NULL;
+    int             reclen = 4096;
+    record_buffer_t buf = {NULL, 0, 0, 0};
+
+    struct module_state *st = GETSTATE(m);
+
+    if (!PyArg_ParseTuple(args, "O|i", &in_traces, &reclen)) {
+        PyErr_SetString(st->error, "usage pack_traces(traces, reclen=4096)" );
+        return NULL;
+    }
+    if (!PySequence_Check( in_traces )) {
+        PyErr_SetString(st->error, "Traces is not of sequence type." );
+        return NULL;
+    }
+    if (reclen < MINRECLEN || reclen > MAXRECLEN || (reclen & (reclen - 1)) != 0) {
+        PyErr_SetString(st->error, "Invalid record length." );
+        return NULL;
+    }
+
+    if (pack_traces(st, in_traces, reclen, &buffer_record_handler, &buf) != 0) {
+        free(buf.data);
+        return NULL;
+    }
+
+    if (buf.failed) {
+        free(buf.data);
+        PyErr_SetString(st->error, "Cannot allocate memory for records.");
+        return NULL;
+    }
+
+    out_bytes = PyBytes_FromStringAndSize(buf.data, (Py_ssize_t)buf.len);
+    free(buf.data);
+    return out_bytes;
+}
+
 
 static PyMethodDef mseed_ext_methods[] = {
     {"get_traces",  mseed_get_traces, METH_VARARGS, 
@@ -294,9 +795,36 @@ static PyMethodDef mseed_ext_methods[] = {
     "in libmseed. If dataflag is True, `data` is a numpy array containing the\n"
     "data. If dataflag is False, the data is not unpacked and `data` is None.\n" },
 
+    {"get_traces_buffer",  mseed_get_traces_buffer, METH_VARARGS,
+    "get_traces_buffer(buffer)\n"
+    "Get all traces from mseed records in a buffer, e.g. a memory map.\n\n"
+    "Works like get_traces with dataflag=True, but only for records with\n"
+    "uncompressed INT32, FLOAT32 or FLOAT64 samples. These are copied\n"
+    "directly from the buffer into the output arrays. Returns None if any\n"
+    "record cannot be handled this way.\n" },
+
     {"store_traces",  mseed_store_traces, METH_VARARGS, 
     "store_traces(traces, filename)\n" },
 
+    {"pack_traces",  mseed_pack_traces, METH_VARARGS,
+    "pack_traces(traces, reclen=4096)\n"
+    "Pack traces into mseed records.\n\n"
+    "Takes the same trace tuples as store_traces and returns the packed\n"
+    "records of the given record length as a bytes object.\n" },
+
+    {"get_records",  mseed_get_records, METH_VARARGS,
+    "get_records(filename)\n"
+    "Get index of the data records in an mseed file.\n\n"
+    "Returns an int64 array of shape (nrecords, 4) with the columns\n\n"
+    "  (offset, reclen, starttime, endtime)\n\n"
+    "where offset is the position of the record in the file in bytes.\n" },
+
+    {"get_traces_records",  mseed_get_traces_records, METH_VARARGS,
+    "get_traces_records(filename, offsets, reclens, dataflag)\n"
+    "Get traces from selected records of an mseed file.\n\n"
+    "Like get_traces, but only the records at the given offsets (int64\n"
+    "array) and with the given record lengths (int64 array) are read.\n" },
+
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -8,7 +8,11 @@ from builtins import zip
 from struct import unpack
 import os
 import re
+import mmap
 import logging
+from collections import OrderedDict
+
+import numpy as num
 
 from pyrocko import trace
 from pyrocko.util import reuse, ensuredirs
@@ -21,13 +25,88 @@ class CodeTooLong(FileSaveError):
     pass
 
 
-def iload(filename, load_data=True):
+# placeholders making filenames unique for each written trace
+unique_placeholders = re.compile(r'%\((tmin|tmax)(_ms|_us)?\)s|%b|%e')
+
+
+record_dtype = num.dtype([
+    ('offset', num.int64),
+    ('reclen', num.int64),
+    ('tmin', num.float64),
+    ('tmax', num.float64)])
+
+
+def get_record_index(filename):
+    '''Get index of the data records in a Mini-SEED file.
+
+    :returns: structured NumPy array of type :py:data:`record_dtype`
+        with byte offset, record length, start time and time of last sample
+        of each record.
+    '''
+
+    from pyrocko import mseed_ext
+
+    try:
+        records = mseed_ext.get_records(filename)
+    except (OSError, mseed_ext.MSeedError) as e:
+        raise FileLoadError(str(e)+' (file: %s)' % filename)
+
+    index = num.zeros(records.shape[0], dtype=record_dtype)
+    index['offset'] = records[:, 0]
+    index['reclen'] = records[:, 1]
+    index['tmin'] = records[:, 2] / float(mseed_ext.HPTMODULUS)
+    index['tmax'] = records[:, 3] / float(mseed_ext.HPTMODULUS)
+    return index
+
+
+def _get_traces_mmap(filename):
+    '''Decode uncompressed records straight from a memory map of the file.
+
+    Returns ``None`` if the file contains records which have to go through
+    libmseed's regular decoding path (e.g. STEIM compressed data).
+    '''
+
+    from pyrocko import mseed_ext
+
+    with open(filename, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            return None
+
+        try:
+            return mseed_ext.get_traces_buffer(mm)
+        finally:
+            mm.close()
+
+
+def iload(filename, load_data=True, records=None):
+    '''Load traces from a Mini-SEED file.
+
+    :param records: if given, only the records selected from the output of
+        :py:func:`get_record_index` are read.
+    '''
+
     from pyrocko import mseed_ext
 
     have_zero_rate_traces = False
     try:
+        if records is None:
+            trtups = None
+            if load_data:
+                trtups = _get_traces_mmap(filename)
+
+            if trtups is None:
+                trtups = mseed_ext.get_traces(filename, load_data)
+        else:
+            trtups = mseed_ext.get_traces_records(
+                filename,
+                num.ascontiguousarray(records['offset']),
+                num.ascontiguousarray(records['reclen']),
+                load_data)
+
         traces = []
-        for tr in mseed_ext.get_traces(filename, load_data):
+        for tr in trtups:
             network, station, location, channel = tr[1:5]
             tmin = float(tr[5])/float(mseed_ext.HPTMODULUS)
             tmax = float(tr[6])/float(mseed_ext.HPTMODULUS)
@@ -64,20 +143,24 @@ def as_tuple(tr):
             itmin, itmax, srate, tr.get_ydata())
 
 
+def _check_codes(tr):
+    for code, maxlen, val in zip(
+            ['network', 'station', 'location', 'channel'],
+            [2, 5, 2, 3],
+            tr.nslc_id):
+
+        if len(val) > maxlen:
+            raise CodeTooLong(
+                '%s code too long to be stored in MSeed file: %s' %
+                (code, val))
+
+
 def save(traces, filename_template, additional={}, overwrite=True):
     from pyrocko import mseed_ext
 
     fn_tr = {}
     for tr in traces:
-        for code, maxlen, val in zip(
-                ['network', 'station', 'location', 'channel'],
-                [2, 5, 2, 3],
-                tr.nslc_id):
-
-            if len(val) > maxlen:
-                raise CodeTooLong(
-                    '%s code too long to be stored in MSeed file: %s' %
-                    (code, val))
+        _check_codes(tr)
 
         fn = tr.fill_template(filename_template, **additional)
         if not overwrite and os.path.exists(fn):
@@ -104,6 +187,150 @@ def save(traces, filename_template, additional={}, overwrite=True):
     return list(fn_tr.keys())
 
 
+class MSeedWriter(object):
+    '''Incremental Mini-SEED writer with a pool of open output files.
+
+    Traces passed to :py:meth:`write` are packed into records and appended
+    to the files given by the filename template. Output files are kept open
+    between calls, so that continuous streams can be written chunk by chunk
+    without re-opening a file (or creating a new one) for each chunk. At
+    most *max_open_files* files are open at the same time; the least
+    recently used one is closed when the limit is reached and re-opened for
+    appending if it is written to again.
+
+    A file is truncated when it is first written to by the writer, later
+    writes append to it. If the filename template contains a placeholder
+    for the start or end time of the traces, e.g. ``%(tmin)s``, filenames
+    do not recur and each file is closed right after it has been written.
+    Such files are not remembered, writing to one of them again truncates
+    it, as :py:func:`pyrocko.io.save` would. Call :py:meth:`close` (or use
+    the writer as a context manager) to flush and close all files; files
+    written to after that are truncated again.
+
+    :param filename_template: filename template, see
+        :py:func:`pyrocko.io.save`
+    :param additional: dict with custom template placeholder fillins
+    :param overwrite: if ``False``, raise an exception if a file exists
+        which has not been created by the writer
+    :param record_length: record length in bytes, e.g. 512 or 4096
+    :param max_open_files: maximum number of files kept open
+    '''
+
+    def __init__(self, filename_template, additional={}, overwrite=True,
+                 record_length=4096, max_open_files=64):
+
+        self._filename_template = filename_template
+        self._additional = additional
+        self._overwrite = overwrite
+        self._record_length = record_length
+        self._max_open_files = max_open_files
+        self._files = OrderedDict()
+        self._created = set()
+        self._close_written = bool(
+            unique_placeholders.search(filename_template))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _get_file(self, fn):
+        if fn in self._files:
+            f = self._files.pop(fn)
+            self._files[fn] = f
+            return f
+
+        while len(self._files) >= max(1, self._max_open_files):
+            _, f_old = self._files.popitem(last=False)
+            f_old.close()
+
+        if fn in self._created:
+            mode = 'ab'
+        else:
+            if not self._overwrite and os.path.exists(fn):
+                raise FileSaveError('file exists: %s' % fn)
+
+            ensuredirs(fn)
+            mode = 'wb'
+
+        try:
+            f = open(fn, mode)
+        except (OSError, IOError) as e:
+            raise FileSaveError(str(e))
+
+        self._created.add(fn)
+        self._files[fn] = f
+        return f
+
+    def write(self, traces, additional={}):
+        '''Append traces to their output files.
+
+        :param traces: a trace or an iterable of traces to store
+        :param additional: dict with custom template placeholder fillins,
+            updating the ones given at initialization
+        :returns: list of filenames written to
+        '''
+
+        from pyrocko import mseed_ext
+
+        if isinstance(traces, trace.Trace):
+            traces = [traces]
+
+        fillins = dict(self._additional)
+        fillins.update(additional)
+        close_written = self._close_written and not any(
+            k.startswith(('tmin', 'tmax')) for k in fillins)
+
+        fn_tr = OrderedDict()
+        for tr in traces:
+            _check_codes(tr)
+            fn = tr.fill_template(self._filename_template, **fillins)
+            if fn not in fn_tr:
+                fn_tr[fn] = []
+
+            fn_tr[fn].append(tr)
+
+        for fn, traces_thisfile in fn_tr.items():
+            traces_thisfile.sort(key=lambda a: a.full_id)
+            try:
+                data = mseed_ext.pack_traces(
+                    [as_tuple(tr) for tr in traces_thisfile],
+                    self._record_length)
+
+            except mseed_ext.MSeedError as e:
+                raise FileSaveError(
+                    str(e) + ' (while storing traces to file \'%s\')' % fn)
+
+            f = self._get_file(fn)
+            try:
+                f.write(data)
+                if close_written:
+                    del self._files[fn]
+                    self._created.discard(fn)
+                    f.close()
+
+            except (OSError, IOError) as e:
+                raise FileSaveError(str(e))
+
+        return list(fn_tr.keys())
+
+    def flush(self):
+        '''Flush all open files.'''
+
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        '''Flush and close all open files.'''
+
+        while self._files:
+            _, f = self._files.popitem(last=False)
+            f.close()
+
+        self._created.clear()
+
+
 tcs = {}
 
 
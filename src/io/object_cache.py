@@ -0,0 +1,247 @@
+# http://pyrocko.org - GPLv3
+#
+# The Pyrocko Developers, 21st Century
+# ---|P------/S----------~Lg----------
+'''
+On-disk cache of objects loaded from metadata files.
+
+Parsing large StationXML or QuakeML files is slow. The functions in this
+module store the loaded object trees in a binary (pickle) format in the
+Pyrocko cache directory, so that repeated loads of unchanged files can skip
+the parsing. Cache entries are keyed by the absolute path of the file and the
+options used to load it; they are invalidated when the size or modification
+time of the file changes. The total size of the cache is bounded by the
+``object_cache_size`` setting of the Pyrocko configuration; least recently
+used entries are removed when it is exceeded. If the cache directory cannot
+be created or written to, files are loaded without caching.
+'''
+from __future__ import absolute_import
+
+import os
+import gc
+import hashlib
+import logging
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from pyrocko import util, config
+
+logger = logging.getLogger('pyrocko.io.object_cache')
+
+pjoin = os.path.join
+
+version_salt = 'v1-'
+
+
+def ehash(s):
+    return hashlib.sha1((version_salt + s).encode('utf8')).hexdigest()
+
+
+class ObjectFileCache(object):
+    '''Manages on-disk cache of objects loaded from files.
+
+    For each file (and set of load options) one cache file is maintained,
+    holding the size and modification time of the original file and the
+    pickled object.
+    '''
+
+    caches = {}
+
+    def __init__(self, cachedir, nbytes_max=None):
+        '''Create new cache.
+
+        :param cachedir: directory to hold the cache files.
+        :param nbytes_max: maximum total size of the cache files in bytes. By
+            default, the ``object_cache_size`` setting of the Pyrocko
+            configuration is used.
+        '''
+
+        if nbytes_max is None:
+            nbytes_max = config.config().object_cache_size
+
+        self.cachedir = cachedir
+        self.nbytes_max = nbytes_max
+        try:
+            util.ensuredir(self.cachedir)
+            self.enabled = True
+        except OSError as e:
+            logger.warning(
+                'Cannot create object cache directory %s, caching is '
+                'disabled: %s' % (self.cachedir, e))
+            self.enabled = False
+
+    def _cachepath(self, abspath, key):
+        return pjoin(self.cachedir, ehash(abspath + '\0' + key))
+
+    def get(self, abspath, key=''):
+        '''Try to get an object from the cache.
+
+        :param abspath: absolute path of the file the object was loaded from
+        :param key: string identifying the options used to load the file
+
+        :returns: the cached object or ``None`` if nothing could be found or
+            the file has changed since the object was stored.
+        '''
+
+        if not self.enabled:
+            return None
+
+        cachepath = self._cachepath(abspath, key)
+        try:
+            stat = os.stat(abspath)
+            with open(cachepath, 'rb') as f:
+                size, mtime = pickle.load(f)
+                if (size, mtime) != (stat.st_size, stat.st_mtime):
+                    return None
+
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    obj = pickle.load(f)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+
+            # mark entry as recently used
+            os.utime(cachepath, None)
+            return obj
+
+        except (OSError, IOError):
+            return None
+
+        except Exception as e:
+            logger.warning(
+                'Ignoring unreadable cache file %s: %s' % (cachepath, e))
+            return None
+
+    def put(self, abspath, obj, key='', stat=None):
+        '''Put an object into the cache.
+
+        :param abspath: absolute path of the file the object was loaded from
+        :param obj: object to be stored
+        :param key: string identifying the options used to load the file
+        :param stat: result of :py:func:`os.stat` on the file, taken before
+            it was loaded
+
+        Objects larger than the size limit of the cache are not stored.
+        '''
+
+        if not self.enabled:
+            return
+
+        cachepath = self._cachepath(abspath, key)
+        tmpfn = None
+        try:
+            if stat is None:
+                stat = os.stat(abspath)
+
+            fd, tmpfn = tempfile.mkstemp(suffix='.tmp', dir=self.cachedir)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((stat.st_size, stat.st_mtime), f, protocol=2)
+                pickle.dump(obj, f, protocol=2)
+
+            if os.path.getsize(tmpfn) > self.nbytes_max:
+                logger.debug(
+                    'Not caching object from %s, it exceeds the cache size '
+                    'limit' % abspath)
+                os.remove(tmpfn)
+                return
+
+            os.rename(tmpfn, cachepath)
+            self.prune(keep=cachepath)
+
+        except (OSError, IOError) as e:
+            logger.warning('Cannot write cache file %s: %s' % (cachepath, e))
+            if tmpfn is not None and os.path.exists(tmpfn):
+                os.remove(tmpfn)
+
+    def prune(self, keep=None):
+        '''Remove least recently used cache files exceeding the size limit.
+
+        :param keep: path of a cache file which must not be removed, e.g.
+            the one just written
+        '''
+
+        entries = []
+        for fn in os.listdir(self.cachedir):
+            if fn.endswith('.tmp'):
+                continue
+
+            path = pjoin(self.cachedir, fn)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        nbytes = sum(entry[1] for entry in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if nbytes <= self.nbytes_max:
+                break
+
+            if path == keep:
+                continue
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            nbytes -= size
+
+
+def get_cache(cachedir=None):
+    '''Get global object cache for given directory.
+
+    :param cachedir: cache directory, by default ``'objects'`` in the
+        ``cache_dir`` of the Pyrocko configuration
+    '''
+
+    if cachedir is None:
+        cachedir = pjoin(config.config().cache_dir, 'objects')
+
+    if cachedir not in ObjectFileCache.caches:
+        ObjectFileCache.caches[cachedir] = ObjectFileCache(cachedir)
+
+    return ObjectFileCache.caches[cachedir]
+
+
+def load_cached(load, filename, key='', cache=None):
+    '''Load object from file through the object cache.
+
+    :param load: function called as ``load(filename)`` on cache misses
+    :param filename: path of the file to load
+    :param key: string identifying the options passed to *load*
+    :param cache: ``True`` to use the cache, ``False`` to bypass it, or path
+        of a cache directory to use instead of the default one. By default,
+        the ``object_cache`` setting of the Pyrocko configuration is used.
+    '''
+
+    if cache is None:
+        cache = config.config().object_cache
+
+    if not cache:
+        return load(filename)
+
+    ocache = get_cache(None if cache is True else cache)
+    if not ocache.enabled:
+        return load(filename)
+
+    abspath = os.path.abspath(filename)
+    obj = ocache.get(abspath, key)
+    if obj is None:
+        try:
+            stat = os.stat(abspath)
+        except OSError:
+            return load(filename)
+
+        obj = load(filename)
+        ocache.put(abspath, obj, key, stat=stat)
+
+    return obj
@@ -4,10 +4,12 @@
 # ---|P------/S----------~Lg----------
 from __future__ import absolute_import
 import logging
+from pyrocko import guts
 from pyrocko.guts import StringPattern, StringChoice, String, Float, Int,\
     Timestamp, Object, List, Union, Bool, Unicode
 from pyrocko.model import event
 from pyrocko import moment_tensor
+from pyrocko.io import object_cache
 import numpy as num
 
 logger = logging.getLogger('pyrocko.io.quakeml')
@@ -716,3 +718,36 @@ class QuakeML(Object):
             events.append(e.pyrocko_event())
 
         return events
+
+
+def load_xml(*args, **kwargs):
+    '''Load QuakeML file.
+
+    Takes the same arguments as :py:func:`pyrocko.guts.load_xml` and
+    additionally:
+
+    :param skip_picks: if ``True``, picks, arrivals, amplitudes and station
+        magnitudes are not read, which makes loading of large catalogs much
+        faster when only the event parameters are needed
+    :param cache: if ``True``, a file given by *filename* is loaded through
+        the :py:mod:`pyrocko.io.object_cache`, if ``False``, it is parsed.
+        A path to a cache directory may be given to use instead of the
+        default one. By default, the ``object_cache`` setting of the Pyrocko
+        configuration is used.
+    '''
+
+    cache = kwargs.pop('cache', None)
+    if kwargs.pop('skip_picks', False):
+        kwargs['ignore'] = [
+            'pick', 'arrival', 'amplitude', 'stationMagnitude',
+            'stationMagnitudeContribution']
+
+    filename = kwargs.pop('filename', None)
+    if filename is not None and not args:
+        return object_cache.load_cached(
+            lambda fn: guts.load_xml(filename=fn, **kwargs),
+            filename,
+            key='quakeml:%r' % sorted(kwargs.items()),
+            cache=cache)
+
+    return guts.load_xml(*args, filename=filename, **kwargs)
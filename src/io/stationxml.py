@@ -16,13 +16,14 @@ import copy
 
 import numpy as num
 
+from pyrocko import guts
 from pyrocko.guts import (StringChoice, StringPattern, UnicodePattern, String,
                           Unicode, Int, Float, List, Object, Timestamp,
                           ValidationError, TBase)
-from pyrocko.guts import load_xml  # noqa
 
 import pyrocko.model
 from pyrocko import trace, util
+from pyrocko.io import object_cache
 
 guts_prefix = 'sx'
 
@@ -1299,6 +1300,37 @@ class FDSNStationXML(Object):
         return '\n'.join(lst)
 
 
+def load_xml(*args, **kwargs):
+    '''Load StationXML file.
+
+    Takes the same arguments as :py:func:`pyrocko.guts.load_xml` and
+    additionally:
+
+    :param skip_responses: if ``True``, channel ``Response`` elements are not
+        read, which makes loading of large files much faster when only the
+        station and channel metadata is needed
+    :param cache: if ``True``, a file given by *filename* is loaded through
+        the :py:mod:`pyrocko.io.object_cache`, if ``False``, it is parsed.
+        A path to a cache directory may be given to use instead of the
+        default one. By default, the ``object_cache`` setting of the Pyrocko
+        configuration is used.
+    '''
+
+    cache = kwargs.pop('cache', None)
+    if kwargs.pop('skip_responses', False):
+        kwargs['ignore'] = ['Response']
+
+    filename = kwargs.pop('filename', None)
+    if filename is not None and not args:
+        return object_cache.load_cached(
+            lambda fn: guts.load_xml(filename=fn, **kwargs),
+            filename,
+            key='stationxml:%r' % sorted(kwargs.items()),
+            cache=cache)
+
+    return guts.load_xml(*args, filename=filename, **kwargs)
+
+
 class InconsistentChannelLocations(Exception):
     pass
 
@@ -33,11 +33,13 @@ def worker(q_in, q_out, function, eprintignore, pshared):
 
 def parimap(function, *iterables, **kwargs):
     assert all(
-        k in ('nprocs', 'eprintignore', 'pshared') for k in kwargs.keys())
+        k in ('nprocs', 'eprintignore', 'pshared', 'start_method')
+        for k in kwargs.keys())
 
     nprocs = kwargs.get('nprocs', None)
     eprintignore = kwargs.get('eprintignore', 'all')
     pshared = kwargs.get('pshared', None)
+    start_method = kwargs.get('start_method', None)
 
     if eprintignore == 'all':
         eprintignore = None
@@ -63,8 +65,10 @@ def parimap(function, *iterables, **kwargs):
     if nprocs is None:
         nprocs = multiprocessing.cpu_count()
 
-    q_in = multiprocessing.Queue(1)
-    q_out = multiprocessing.Queue()
+    # e.g. 'spawn' to avoid forking a process with running threads
+    context = multiprocessing.get_context(start_method)
+    q_in = context.Queue(1)
+    q_out = context.Queue()
 
     procs = []
 
@@ -75,74 +79,83 @@ def parimap(function, *iterables, **kwargs):
     all_written = False
     error_ahead = False
     iterables = list(map(iter, iterables))
-    while True:
-        if nrun < nprocs and not all_written and not error_ahead:
-            args = []
-            for it in iterables:
-                try:
-                    args.append(next(it))
-                except StopIteration:
-                    pass
-
-            if len(args) == len(iterables):
-                if len(procs) < nrun + 1:
-                    p = multiprocessing.Process(
-                        target=worker,
-                        args=(q_in, q_out, function, eprintignore, pshared))
-                    p.daemon = True
-                    p.start()
-                    procs.append(p)
-
-                q_in.put((nwritten, args))
-                nwritten += 1
-                nrun += 1
-            else:
-                all_written = True
-                [q_in.put((None, None)) for p in procs]
-                q_in.close()
-
-        try:
-            while nrun > 0:
-                if nrun < nprocs and not all_written and not error_ahead:
-                    results.append(q_out.get_nowait())
+    try:
+        while True:
+            if nrun < nprocs and not all_written and not error_ahead:
+                args = []
+                for it in iterables:
+                    try:
+                        args.append(next(it))
+                    except StopIteration:
+                        pass
+
+                if len(args) == len(iterables):
+                    if len(procs) < nrun + 1:
+                        p = context.Process(
+                            target=worker,
+                            args=(
+                                q_in, q_out, function, eprintignore, pshared))
+                        p.daemon = True
+                        p.start()
+                        procs.append(p)
+
+                    q_in.put((nwritten, args))
+                    nwritten += 1
+                    nrun += 1
                 else:
-                    while True:
-                        try:
-                            results.append(q_out.get())
-                            break
-                        except IOError as e:
-                            if e.errno != errno.EINTR:
-                                raise
-
-                nrun -= 1
-
-        except queue.Empty:
-            pass
-
-        if results:
-            results.sort()
-            # check for error ahead to prevent further enqueuing
-            if any(exc for (_, _, exc) in results):
-                error_ahead = True
-
-            while results:
-                (i, r, exc) = results[0]
-                if i == iout:
-                    results.pop(0)
-                    if exc is not None:
-                        if not all_written:
-                            [q_in.put((None, None)) for p in procs]
-                            q_in.close()
-                        raise exc
+                    all_written = True
+                    [q_in.put((None, None)) for p in procs]
+                    q_in.close()
+
+            try:
+                while nrun > 0:
+                    if nrun < nprocs and not all_written and not error_ahead:
+                        results.append(q_out.get_nowait())
                     else:
-                        yield r
+                        while True:
+                            try:
+                                results.append(q_out.get())
+                                break
+                            except IOError as e:
+                                if e.errno != errno.EINTR:
+                                    raise
+
+                    nrun -= 1
+
+            except queue.Empty:
+                pass
+
+            if results:
+                results.sort()
+                # check for error ahead to prevent further enqueuing
+                if any(exc for (_, _, exc) in results):
+                    error_ahead = True
+
+                while results:
+                    (i, r, exc) = results[0]
+                    if i == iout:
+                        results.pop(0)
+                        if exc is not None:
+                            if not all_written:
+                                [q_in.put((None, None)) for p in procs]
+                                q_in.close()
+                            raise exc
+                        else:
+                            yield r
+
+                        iout += 1
+                    else:
+                        break
 
-                    iout += 1
-                else:
-                    break
+            if all_written and nrun == 0:
+                break
 
-        if all_written and nrun == 0:
-            break
+        [p.join() for p in procs]
 
-    [p.join() for p in procs]
+    finally:
+        # workers are left behind if the caller stops early or on errors
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+                p.join()
     return
@@ -19,6 +19,11 @@ import sys
 import operator
 import math
 import hashlib
+import sqlite3
+import threading
+import queue
+from collections import OrderedDict
+import numpy as num
 try:
     import cPickle as pickle
 except ImportError:
@@ -29,6 +34,7 @@ from . import avl
 from . import trace, io, util
 from . import config
 from .trace import degapper
+from .parimap import parimap
 
 
 show_progress_force_off = False
@@ -222,6 +228,17 @@ class TracesFileCache(object):
 
         self.modified = set()
 
+    def unload(self):
+        '''Save any modifications and release the entries held in memory.'''
+
+        self.dump_modified()
+        for dircache in self.dircaches.values():
+            for tfile in dircache.values():
+                if tfile.get_parent() is None:
+                    tfile.release_trees()
+
+        self.dircaches = {}
+
     def clean(self):
         '''Weed out missing files from the disk caches.'''
 
@@ -284,6 +301,7 @@ class TracesFileCache(object):
             trf.by_tmax = None
             trf.by_tlen = None
             trf.by_mtime = None
+            trf.by_tlenclass = None
             trf.data_use_count = 0
             trf.data_loaded = False
             traces = []
@@ -305,17 +323,283 @@ class TracesFileCache(object):
         os.rename(tmpfn, cachefilename)
 
 
-def get_cache(cachedir):
-    '''Get global TracesFileCache object for given directory.'''
-    if cachedir not in TracesFileCache.caches:
-        TracesFileCache.caches[cachedir] = TracesFileCache(cachedir)
+class SQLiteTracesFileCache(object):
+    '''Manages trace metainformation cache in a single SQLite database.
+
+    Alternative to :py:class:`TracesFileCache` for large archives. The
+    metainformation of each file and each trace is stored in a row of an
+    indexed table, so that entries are loaded and updated individually,
+    without loading all entries into memory.
+    '''
+
+    caches = {}
+
+    def __init__(self, cachedir):
+        '''Create new cache.
+
+        :param cachedir: directory to hold the cache database.
+
+        '''
+
+        self.cachedir = cachedir
+        util.ensuredir(self.cachedir)
+        self.database_path = pjoin(self.cachedir, 'traces-v1.sqlite')
+        self._conn = sqlite3.connect(self.database_path)
+        self._conn.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+
+            CREATE TABLE IF NOT EXISTS files (
+                file_id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                format TEXT,
+                mtime REAL);
+
+            CREATE TABLE IF NOT EXISTS traces (
+                file_id INTEGER NOT NULL,
+                network TEXT,
+                station TEXT,
+                location TEXT,
+                channel TEXT,
+                tmin REAL,
+                tmin_offset REAL,
+                tmax REAL,
+                deltat REAL,
+                mtime REAL);
+
+            CREATE INDEX IF NOT EXISTS traces_file_id
+                ON traces (file_id);
+        ''')
+        self._conn.commit()
+
+    def get(self, abspath):
+        '''Try to get an item from the cache.
+
+        :param abspath: absolute path of the object to retrieve
+
+        :returns: a stored object is returned or None if nothing could be
+            found.
+
+        '''
+
+        row = self._conn.execute(
+            'SELECT file_id, format, mtime FROM files WHERE path = ?',
+            (abspath,)).fetchone()
+
+        if row is None:
+            return None
+
+        file_id, format, mtime = row
+
+        traces = []
+        for (net, sta, loc, cha, tmin, tmin_offset, tmax, deltat,
+                tr_mtime) in self._conn.execute(
+                    '''
+                        SELECT network, station, location, channel, tmin,
+                            tmin_offset, tmax, deltat, mtime
+                        FROM traces WHERE file_id = ?
+                    ''', (file_id,)):
+
+            if tmin_offset:
+                tmin = util.hpfloat(tmin) + util.hpfloat(tmin_offset)
+
+            traces.append(trace.Trace(
+                net, sta, loc, cha,
+                tmin=tmin, tmax=tmax, deltat=deltat, mtime=tr_mtime))
+
+        return TracesFile(None, abspath, format, mtime=mtime, traces=traces)
+
+    def put(self, abspath, tfile):
+        '''Put an item into the cache.
+
+        :param abspath: absolute path of the object to be stored
+        :param tfile: object to be stored
+        '''
+
+        self._delete(abspath)
+
+        c = self._conn.execute(
+            'INSERT INTO files (path, format, mtime) VALUES (?, ?, ?)',
+            (abspath, tfile.format, tfile.mtime))
+
+        file_id = c.lastrowid
+
+        rows = []
+        for tr in tfile.traces:
+            tmin = float(tr.tmin)
+            rows.append(
+                (file_id, tr.network, tr.station, tr.location, tr.channel,
+                 tmin, float(tr.tmin - tmin), float(tr.tmax), tr.deltat,
+                 tr.mtime))
+
+        self._conn.executemany(
+            '''
+                INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+    def dump_modified(self):
+        '''Save any modifications to disk.'''
+
+        self._conn.commit()
+
+    def unload(self):
+        '''Save any modifications. No entries are held in memory.'''
+
+        self.dump_modified()
+
+    def clean(self):
+        '''Weed out missing files from the database.'''
+
+        self.dump_modified()
+
+        paths = [path for (path,) in self._conn.execute(
+            'SELECT path FROM files')]
+
+        for path in paths:
+            if not os.path.isfile(path):
+                self._delete(path)
+
+        self.dump_modified()
+
+    def _delete(self, abspath):
+        row = self._conn.execute(
+            'SELECT file_id FROM files WHERE path = ?',
+            (abspath,)).fetchone()
+
+        if row is not None:
+            self._conn.execute(
+                'DELETE FROM traces WHERE file_id = ?', row)
+            self._conn.execute(
+                'DELETE FROM files WHERE file_id = ?', row)
+
+
+cache_backends = {
+    'pickle': TracesFileCache,
+    'sqlite': SQLiteTracesFileCache,
+}
+
+
+def get_cache(cachedir, backend=None):
+    '''Get global cache object for given directory.
+
+    :param cachedir: cache directory
+    :param backend: ``'pickle'`` to use a :py:class:`TracesFileCache`,
+        ``'sqlite'`` to use a :py:class:`SQLiteTracesFileCache`. By default,
+        the ``pile_cache_backend`` setting of the Pyrocko configuration is
+        used.
+    '''
+
+    if backend is None:
+        backend = config.config().pile_cache_backend
+
+    cls = cache_backends[backend]
+    if cachedir not in cls.caches:
+        cls.caches[cachedir] = cls(cachedir)
+
+    return cls.caches[cachedir]
+
+
+def load_headers(abspath, format, substitutions=None):
+    '''Load trace headers from a file, ignoring duplicates.'''
+
+    return _load_unique(abspath, format, substitutions, getdata=False)
+
+
+def _unique(traces):
+
+    def kgen(tr):
+        return (tr.mtime, tr.tmin, tr.tmax) + tr.nslc_id
+
+    ks = set()
+    traces_unique = []
+    for tr in traces:
+        k = kgen(tr)
+        if k not in ks:
+            ks.add(k)
+            traces_unique.append(tr)
+
+    return traces_unique
+
+
+def _load_unique(abspath, format, substitutions, getdata):
+    return _unique(io.load(
+        abspath,
+        format=format,
+        getdata=getdata,
+        substitutions=substitutions))
+
+
+def load_record_index(abspath, format):
+    '''Get record index of a Mini-SEED file, ``None`` for other formats.
+
+    See :py:func:`pyrocko.io.mseed.get_record_index`.
+    '''
+
+    if io.resolve_format(abspath, format.split('.')[0]) != 'mseed':
+        return None
+
+    return io.mseed.get_record_index(abspath)
 
-    return TracesFileCache.caches[cachedir]
+
+g_record_indices = OrderedDict()
+g_record_indices_lock = threading.Lock()
+g_record_indices_max = 64
+
+
+def get_record_index(file):
+    '''Get record index of a :py:class:`TracesFile`, building it if needed.
+
+    The index is not stored in the trace metainformation caches. It is kept
+    in memory only for the ``g_record_indices_max`` files which have been
+    read partially most recently. It is rebuilt when the size or the
+    modification time (with full resolution) of the file has changed.
+    '''
+
+    k = file.abspath
+    try:
+        # stat before reading, a later change invalidates the index
+        st = os.stat(k)
+        stamp = st.st_size, st.st_mtime_ns
+    except OSError as e:
+        logger.debug(str(e))
+        return None
+
+    with g_record_indices_lock:
+        if k in g_record_indices:
+            stamp_index, index = g_record_indices.pop(k)
+            if stamp_index == stamp:
+                g_record_indices[k] = stamp_index, index
+                return index
+
+    try:
+        index = load_record_index(file.abspath, file.format)
+    except (io.FileLoadError, OSError) as e:
+        logger.debug(str(e))
+        index = None
+
+    with g_record_indices_lock:
+        g_record_indices[k] = stamp, index
+        while len(g_record_indices) > g_record_indices_max:
+            g_record_indices.popitem(last=False)
+
+    return index
+
+
+def forget_record_index(abspath):
+    with g_record_indices_lock:
+        g_record_indices.pop(abspath, None)
+
+
+def _scan_headers(abspath, format, substitutions):
+    try:
+        return load_headers(abspath, format, substitutions), None
+    except (io.FileLoadError, OSError) as xerror:
+        return None, xerror
 
 
 def loader(
         filenames, fileformat, cache, filename_attributes,
-        show_progress=True, update_progress=None):
+        show_progress=True, update_progress=None, nprocs=1):
 
     if show_progress_force_off:
         show_progress = False
@@ -411,31 +695,66 @@ def loader(
     if to_load:
         progress = Progress('Scanning files', nload)
 
-        for (mustload, mtime, abspath, substitutions, tfile) in to_load:
-            try:
-                if mustload:
-                    tfile = TracesFile(
-                        None, abspath, fileformat,
-                        substitutions=substitutions, mtime=mtime)
-
-                    if cache and not substitutions:
-                        cache.put(abspath, tfile)
+        scanned = None
+        if nprocs != 1 and nload > 1:
+            logger.debug('scanning file headers in parallel')
+            args = [
+                (abspath, fileformat, substitutions)
+                for (mustload, _, abspath, substitutions, _) in to_load
+                if mustload]
+
+            if args:
+                # forking a process with running threads (e.g. Snuffler) is
+                # unsafe, the workers are started from scratch then
+                start_method = None
+                if threading.active_count() > 1:
+                    start_method = 'spawn'
+
+                scanned = parimap(
+                    _scan_headers, *zip(*args), nprocs=nprocs,
+                    start_method=start_method)
 
-                    if not count_all:
+        try:
+            for (mustload, mtime, abspath, substitutions, tfile) in to_load:
+                try:
+                    if mustload:
+                        if scanned is not None:
+                            traces, xerror = next(scanned)
+                            if xerror is not None:
+                                raise xerror
+
+                            tfile = TracesFile(
+                                None, abspath, fileformat,
+                                substitutions=substitutions, mtime=mtime,
+                                traces=traces)
+                        else:
+                            tfile = TracesFile(
+                                None, abspath, fileformat,
+                                substitutions=substitutions, mtime=mtime)
+
+                        if cache and not substitutions:
+                            cache.put(abspath, tfile)
+
+                        if not count_all:
+                            iload += 1
+
+                    if count_all:
                         iload += 1
 
-                if count_all:
-                    iload += 1
+                except (io.FileLoadError, OSError) as xerror:
+                    failures.append(abspath)
+                    logger.warning(xerror)
+                else:
+                    yield tfile
 
-            except (io.FileLoadError, OSError) as xerror:
-                failures.append(abspath)
-                logger.warning(xerror)
-            else:
-                yield tfile
+                abort = progress.update(iload+1)
+                if abort:
+                    break
 
-            abort = progress.update(iload+1)
-            if abort:
-                break
+        finally:
+            if scanned is not None:
+                # terminates the workers if stopped early
+                scanned.close()
 
         progress.update(nload)
 
@@ -452,6 +771,11 @@ def tlen(x):
     return x.tmax-x.tmin
 
 
+def tlen_class(x):
+    '''Get duration class ``e`` of trace, such that ``tlen(x) < 2**e``.'''
+    return math.frexp(float(x.tmax-x.tmin))[1]
+
+
 class TracesGroup(object):
 
     '''Trace container base class.
@@ -481,6 +805,7 @@ class TracesGroup(object):
         self.by_tmax = Sorted([], 'tmax')
         self.by_tlen = Sorted([], tlen)
         self.by_mtime = Sorted([], 'mtime')
+        self.by_tlenclass = {}
         self.tmin, self.tmax = None, None
         self.deltatmin, self.deltatmax = None, None
 
@@ -489,8 +814,24 @@ class TracesGroup(object):
         self.by_tmax = Sorted(content, 'tmax')
         self.by_tlen = Sorted(content, tlen)
         self.by_mtime = Sorted(content, 'mtime')
+        self.by_tlenclass = {}
+        for tr in content:
+            self._get_tlenclass_tree(tlen_class(tr)).insert(tr)
+
         self.adjust_minmax()
 
+    def _get_tlenclass_tree(self, e):
+        if e not in self.by_tlenclass:
+            self.by_tlenclass[e] = Sorted([], 'tmin')
+
+        return self.by_tlenclass[e]
+
+    def _remove_from_tlenclass_tree(self, e, values):
+        tree = self.by_tlenclass[e]
+        tree.remove_many(values)
+        if not tree:
+            del self.by_tlenclass[e]
+
     def add(self, content):
         '''
         Add content to traces group and update indices.
@@ -516,6 +857,8 @@ class TracesGroup(object):
                 self.by_tmax.insert_many(c.by_tmax)
                 self.by_tlen.insert_many(c.by_tlen)
                 self.by_mtime.insert_many(c.by_mtime)
+                for e, tree in c.by_tlenclass.items():
+                    self._get_tlenclass_tree(e).insert_many(tree)
 
             elif isinstance(c, trace.Trace):
                 self.networks[c.network] += 1
@@ -529,6 +872,7 @@ class TracesGroup(object):
                 self.by_tmax.insert(c)
                 self.by_tlen.insert(c)
                 self.by_mtime.insert(c)
+                self._get_tlenclass_tree(tlen_class(c)).insert(c)
 
         self.adjust_minmax()
 
@@ -559,6 +903,8 @@ class TracesGroup(object):
                 self.by_tmax.remove_many(c.by_tmax)
                 self.by_tlen.remove_many(c.by_tlen)
                 self.by_mtime.remove_many(c.by_mtime)
+                for e, tree in c.by_tlenclass.items():
+                    self._remove_from_tlenclass_tree(e, tree)
 
             elif isinstance(c, trace.Trace):
                 self.networks.subtract1(c.network)
@@ -572,6 +918,7 @@ class TracesGroup(object):
                 self.by_tmax.remove(c)
                 self.by_tlen.remove(c)
                 self.by_mtime.remove(c)
+                self._remove_from_tlenclass_tree(tlen_class(c), [c])
 
         self.adjust_minmax()
 
@@ -600,8 +947,18 @@ class TracesGroup(object):
 
             return []
 
-        return [tr for tr in self.by_tmin.with_key_in(tmin-self.tlenmax, tmax)
-                if tr.is_relevant(tmin, tmax, trace_selector)]
+        # Traces are indexed by duration class, so that a few long traces
+        # do not widen the search window for all the short ones.
+        traces = []
+        for e, tree in self.by_tlenclass.items():
+            traces.extend(
+                tr for tr in tree.with_key_in(tmin-math.ldexp(1.0, e), tmax)
+                if tr.is_relevant(tmin, tmax, trace_selector))
+
+        if len(self.by_tlenclass) > 1:
+            traces.sort(key=operator.attrgetter('tmin'))
+
+        return traces
 
     def adjust_minmax(self):
         if self.by_tmin:
@@ -657,12 +1014,20 @@ class MemTracesFile(TracesGroup):
 
         TracesGroup.add(self, traces)
 
+    data_loaded = True
+
     def load_headers(self, mtime=None):
         pass
 
-    def load_data(self):
+    def read_data(self):
+        return None
+
+    def load_data(self, force=False, traces=None):
         pass
 
+    def load_window(self, tmin, tmax):
+        return None
+
     def use_data(self):
         pass
 
@@ -705,7 +1070,7 @@ class MemTracesFile(TracesGroup):
 class TracesFile(TracesGroup):
     def __init__(
             self, parent, abspath, format,
-            substitutions=None, mtime=None):
+            substitutions=None, mtime=None, traces=None):
 
         TracesGroup.__init__(self, parent)
         self.abspath = abspath
@@ -714,7 +1079,16 @@ class TracesFile(TracesGroup):
         self.data_loaded = False
         self.data_use_count = 0
         self.substitutions = substitutions
-        self.load_headers(mtime=mtime)
+        if traces is None:
+            self.load_headers(mtime=mtime)
+        else:
+            # header information from a cache
+            for tr in traces:
+                tr.file = self
+
+            self.traces = traces
+            self.add(self.traces)
+
         self.mtime = mtime
 
     def load_headers(self, mtime=None):
@@ -722,28 +1096,56 @@ class TracesFile(TracesGroup):
         if mtime is None:
             self.mtime = os.stat(self.abspath)[8]
 
-        def kgen(tr):
-            return (tr.mtime, tr.tmin, tr.tmax) + tr.nslc_id
-
         self.remove(self.traces)
-        ks = set()
-        for tr in io.load(self.abspath,
-                          format=self.format,
-                          getdata=False,
-                          substitutions=self.substitutions):
-
-            k = kgen(tr)
-            if k not in ks:
-                ks.add(k)
-                self.traces.append(tr)
-                tr.file = self
+        self.traces = load_headers(
+            self.abspath, self.format, self.substitutions)
+
+        for tr in self.traces:
+            tr.file = self
 
         self.add(self.traces)
 
         self.data_loaded = False
         self.data_use_count = 0
 
-    def load_data(self, force=False):
+    def read_data(self):
+        '''Read traces with data from the file, without attaching them.
+
+        Does not modify this object, so that it can be called without
+        holding a lock, e.g. to prepare the traces passed to
+        :py:meth:`load_data` from a background thread.
+        '''
+
+        logger.debug('reading data from file: %s' % self.abspath)
+        return _load_unique(
+            self.abspath, self.format, self.substitutions, getdata=True)
+
+    def add_appended(self, traces, mtime):
+        '''Add traces which have been appended to the file on disk.
+
+        Avoids a rescan of the whole file. Must not be called while the file
+        is part of a pile.
+
+        :param traces: list of :py:class:`pyrocko.trace.Trace` objects, as
+            written to the file
+        :param mtime: modification time of the file after appending
+        '''
+
+        htraces = []
+        for tr in traces:
+            htr = tr.copy(data=False)
+            if not self.data_loaded:
+                htr.ydata = None
+
+            htr.set_mtime(mtime)
+            htr.file = self
+            htraces.append(htr)
+
+        self.traces.extend(htraces)
+        self.add(htraces)
+        self.mtime = mtime
+
+    def load_data(self, force=False, traces=None):
         file_changed = False
         if not self.data_loaded or force:
             logger.debug('loading data from file: %s' % self.abspath)
@@ -751,17 +1153,10 @@ class TracesFile(TracesGroup):
             def kgen(tr):
                 return (tr.mtime, tr.tmin, tr.tmax) + tr.nslc_id
 
-            traces_ = io.load(self.abspath, format=self.format, getdata=True,
-                              substitutions=self.substitutions)
+            if traces is None:
+                traces = self.read_data()
 
-            # prevent adding duplicate snippets from corrupt mseed files
-            k_loaded = set()
-            traces = []
-            for tr in traces_:
-                k = kgen(tr)
-                if k not in k_loaded:
-                    k_loaded.add(k)
-                    traces.append(tr)
+            k_loaded = set(kgen(tr) for tr in traces)
 
             k_current_d = dict((kgen(tr), tr) for tr in self.traces)
             k_current = set(k_current_d)
@@ -792,14 +1187,76 @@ class TracesFile(TracesGroup):
 
         if file_changed:
             logger.debug('reloaded (file may have changed): %s' % self.abspath)
+            forget_record_index(self.abspath)
 
         return file_changed
 
+    def load_window(self, tmin, tmax):
+        '''Load only the data records overlapping with a time span.
+
+        Requires a record index (available for Mini-SEED files), which is
+        built on first use, see :py:func:`get_record_index`. The traces
+        returned are not kept by this object.
+
+        :returns: list of :py:class:`pyrocko.trace.Trace` objects or ``None``
+            if the data cannot or should not be read partially, e.g. when
+            the data is loaded already or when most of the file would have
+            to be read anyway.
+        '''
+
+        if self.data_loaded:
+            return None
+
+        index = get_record_index(self)
+        if index is None or index.size == 0:
+            return None
+
+        # margin for snapping to samples
+        margin = self.deltatmax or 0.0
+        mask = num.logical_and(
+            index['tmin'] <= tmax + margin,
+            index['tmax'] >= tmin - margin)
+
+        nselected = num.sum(mask)
+        if nselected * 2 > index.size:
+            return None
+
+        logger.debug(
+            'loading %i of %i records from file: %s' % (
+                nselected, index.size, self.abspath))
+
+        try:
+            traces = list(io.mseed.iload(
+                self.abspath, load_data=True, records=index[mask]))
+
+        except io.FileLoadError as e:
+            # record index may be outdated, fall back to loading all
+            logger.debug(str(e))
+            forget_record_index(self.abspath)
+            return None
+
+        for tr in traces:
+            io.make_substitutions(tr, self.substitutions)
+            tr.set_mtime(self.mtime)
+
+        # skip duplicate records, as when loading the whole file
+        return _unique(traces)
+
     def use_data(self):
         if not self.data_loaded:
             raise Exception('Data not loaded')
         self.data_use_count += 1
 
+    def release_trees(self):
+        '''Empty the lookup trees of a file which is not part of a pile.
+
+        The trees are invisible to the garbage collector, so the reference
+        cycles between the file and its traces cannot be collected while
+        they exist.
+        '''
+
+        self.empty()
+
     def drop_data(self):
         if self.data_loaded:
             if self.data_use_count == 1:
@@ -943,8 +1400,134 @@ class SubPile(TracesGroup):
         return s
 
 
+def _load_data_outside_lock(file, lock, use_data=False):
+    '''Load data of a file, decoding it without holding the lock.
+
+    Only attaching the traces to the file (and marking the file as being in
+    use) is done while holding ``lock``. Returns ``True`` if the traces of
+    the file have changed.
+    '''
+
+    mtime = file.mtime
+    traces = None
+    if not file.data_loaded:
+        traces = file.read_data()
+
+    with lock:
+        if file.mtime != mtime:
+            # file has been reloaded meanwhile
+            traces = None
+
+        # no-op if the data has been loaded meanwhile, reads here only if
+        # it has been dropped or reloaded meanwhile
+        file_changed = file.load_data(traces=traces)
+        if use_data:
+            file.use_data()
+
+    return file_changed
+
+
+class ChopperPrefetcher(threading.Thread):
+    '''Loads the trace data for upcoming chopper windows in the background.
+
+    For each window, the data of all relevant files is loaded and the files
+    are marked as being in use. The sets of files are queued in window order.
+    At most ``nwindows`` windows are held ready, which bounds the memory
+    used. The consumer must :py:meth:`release` each set of files obtained
+    from :py:meth:`get` when it is done with the window.
+    '''
+
+    def __init__(
+            self, pile, windows, nwindows, tpad=0.,
+            group_selector=None, trace_selector=None, lock=None):
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.lock = lock or pile.lock
+        self._pile = pile
+        self._windows = windows
+        self._tpad = tpad
+        self._group_selector = group_selector
+        self._trace_selector = trace_selector
+        self._queue = queue.Queue(nwindows)
+        self._stopping = threading.Event()
+
+    def run(self):
+        for wmin, wmax in self._windows:
+            files = set()
+            used = set()
+            exception = None
+            try:
+                for tr in self._pile.relevant(
+                        wmin-self._tpad, wmax+self._tpad,
+                        self._group_selector, self._trace_selector):
+
+                    if tr.file is not None:
+                        files.add(tr.file)
+
+                used = set()
+                for file in files:
+                    _load_data_outside_lock(file, self.lock, use_data=True)
+                    used.add(file)
+
+            except Exception as e:
+                self.release(used)
+                exception = e
+
+            files = used
+
+            while not self._stopping.is_set():
+                try:
+                    self._queue.put((files, exception), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            else:
+                self.release(files)
+                return
+
+            if exception is not None:
+                return
+
+    def get(self):
+        '''Wait for the files of the next window to be loaded.'''
+
+        files, exception = self._queue.get()
+        if exception is not None:
+            raise exception
+
+        return files
+
+    def release(self, files):
+        '''Give up the prefetcher's claim on the data of some files.'''
+
+        with self.lock:
+            for file in files:
+                file.drop_data()
+
+    def stop(self):
+        '''Stop the background thread and release all pending files.'''
+
+        self._stopping.set()
+        while self.is_alive() or not self._queue.empty():
+            try:
+                files, _ = self._queue.get(timeout=0.1)
+                self.release(files)
+            except queue.Empty:
+                pass
+
+        self.join()
+
+
 class Pile(TracesGroup):
-    '''Waveform archive lookup, data loading and caching infrastructure.'''
+    '''Waveform archive lookup, data loading and caching infrastructure.
+
+    Adding, removing and reloading files, queries with :py:meth:`relevant`
+    and attaching loaded data to files in :py:meth:`chop` and
+    :py:meth:`chopper` are serialized with the reentrant lock
+    :py:attr:`lock`, so that a pile can be chopped in a background thread
+    while it is modified in another one.
+    '''
 
     def __init__(self):
         TracesGroup.__init__(self, None)
@@ -952,6 +1535,8 @@ class Pile(TracesGroup):
         self.open_files = {}
         self.listeners = []
         self.abspaths = set()
+        self._files_by_abspath = {}
+        self.lock = threading.RLock()
 
     def add_listener(self, obj):
         self.listeners.append(weakref.ref(obj))
@@ -968,12 +1553,14 @@ class Pile(TracesGroup):
             fileformat='mseed',
             cache=None,
             show_progress=True,
-            update_progress=None):
+            update_progress=None,
+            nprocs=1):
 
         load = loader(
             filenames, fileformat, cache, filename_attributes,
             show_progress=show_progress,
-            update_progress=update_progress)
+            update_progress=update_progress,
+            nprocs=nprocs)
 
         self.add_files(load)
 
@@ -982,40 +1569,72 @@ class Pile(TracesGroup):
             self.add_file(file)
 
     def add_file(self, file):
-        if file.abspath is not None and file.abspath in self.abspaths:
-            logger.warning('File already in pile: %s' % file.abspath)
-            return
+        with self.lock:
+            if file.abspath is not None and file.abspath in self.abspaths:
+                logger.warning('File already in pile: %s' % file.abspath)
+                return
 
-        if file.deltatmin is None:
-            logger.warning('Sampling rate of all traces are zero in file: %s' %
-                           file.abspath)
-            return
+            if file.deltatmin is None:
+                logger.warning(
+                    'Sampling rate of all traces are zero in file: %s' %
+                    file.abspath)
+                return
 
-        subpile = self.dispatch(file)
-        subpile.add_file(file)
-        if file.abspath is not None:
-            self.abspaths.add(file.abspath)
+            subpile = self.dispatch(file)
+            subpile.add_file(file)
+            if file.abspath is not None:
+                self.abspaths.add(file.abspath)
+                self._files_by_abspath[file.abspath] = file
 
     def remove_file(self, file):
-        subpile = file.get_parent()
-        subpile.remove_file(file)
-        if file.abspath is not None:
-            self.abspaths.remove(file.abspath)
+        with self.lock:
+            subpile = file.get_parent()
+            subpile.remove_file(file)
+            if file.abspath is not None:
+                self.abspaths.remove(file.abspath)
+                del self._files_by_abspath[file.abspath]
 
     def remove_files(self, files):
-        subpile_files = {}
-        for file in files:
-            subpile = file.get_parent()
-            if subpile not in subpile_files:
-                subpile_files[subpile] = []
+        with self.lock:
+            subpile_files = {}
+            for file in files:
+                subpile = file.get_parent()
+                if subpile not in subpile_files:
+                    subpile_files[subpile] = []
 
-            subpile_files[subpile].append(file)
+                subpile_files[subpile].append(file)
 
-        for subpile, files in subpile_files.items():
-            subpile.remove_files(files)
-            for file in files:
-                if file.abspath is not None:
-                    self.abspaths.remove(file.abspath)
+            for subpile, files in subpile_files.items():
+                subpile.remove_files(files)
+                for file in files:
+                    if file.abspath is not None:
+                        self.abspaths.remove(file.abspath)
+                        del self._files_by_abspath[file.abspath]
+
+    def add_appended_traces(self, filename, traces, fileformat='detect'):
+        '''Update the pile after traces have been appended to a file.
+
+        Only the given traces are added to the file's entry, the file is not
+        rescanned. A new entry is created if the file is not yet in the pile.
+
+        :param filename: path of the file appended to
+        :param traces: list of :py:class:`pyrocko.trace.Trace` objects, as
+            written to the file
+        :param fileformat: format of the file
+        '''
+
+        abspath = os.path.abspath(filename)
+        mtime = os.stat(abspath)[8]
+        with self.lock:
+            file = self._files_by_abspath.get(abspath)
+            if file is None:
+                file = TracesFile(
+                    None, abspath, fileformat, mtime=mtime, traces=[])
+            else:
+                self.remove_file(file)
+
+            file.add_appended(traces, mtime)
+            self.add_file(file)
 
     def dispatch_key(self, file):
         dt = int(math.floor(math.log(file.deltatmin)))
@@ -1031,6 +1650,11 @@ class Pile(TracesGroup):
     def get_deltats(self):
         return list(self.deltats.keys())
 
+    def relevant(self, tmin, tmax, group_selector=None, trace_selector=None):
+        with self.lock:
+            return TracesGroup.relevant(
+                self, tmin, tmax, group_selector, trace_selector)
+
     def chop(
             self, tmin, tmax,
             group_selector=None,
@@ -1041,39 +1665,61 @@ class Pile(TracesGroup):
 
         chopped = []
         used_files = set()
+        window_traces = {}
 
         traces = self.relevant(tmin, tmax, group_selector, trace_selector)
         if load_data:
             files_changed = False
             for tr in traces:
-                if tr.file and tr.file not in used_files:
-                    if tr.file.load_data():
+                file = tr.file
+                if file and file not in used_files \
+                        and file not in window_traces:
+
+                    # read only the needed part of the file if possible
+                    wtraces = file.load_window(tmin, tmax)
+                    if wtraces is not None:
+                        window_traces[file] = wtraces
+                        continue
+
+                    if _load_data_outside_lock(file, self.lock):
                         files_changed = True
 
-                    if tr.file is not None:
-                        used_files.add(tr.file)
+                    used_files.add(file)
 
             if files_changed:
                 traces = self.relevant(
                     tmin, tmax, group_selector, trace_selector)
 
-        for tr in traces:
-            if not load_data and tr.ydata is not None:
-                tr = tr.copy(data=False)
-                tr.ydata = None
+        if window_traces:
+            traces = [tr for tr in traces if tr.file not in window_traces]
+            for wtraces in window_traces.values():
+                traces.extend(
+                    tr for tr in wtraces
+                    if tr.is_relevant(tmin, tmax, trace_selector))
 
-            try:
-                chopped.append(tr.chop(
-                    tmin, tmax,
-                    inplace=False,
-                    snap=snap,
-                    include_last=include_last))
+        # in-memory traces may be appended to by other threads
+        with self.lock:
+            for tr in traces:
+                if not load_data and tr.ydata is not None:
+                    tr = tr.copy(data=False)
+                    tr.ydata = None
 
-            except trace.NoData:
-                pass
+                try:
+                    chopped.append(tr.chop(
+                        tmin, tmax,
+                        inplace=False,
+                        snap=snap,
+                        include_last=include_last))
+
+                except trace.NoData:
+                    pass
 
         return chopped, used_files
 
+    def _chop_window(self, *args):
+        # used by chopper, which keeps track of the files in use
+        return self.chop(*args)
+
     def _process_chopped(
             self, chopped, degap, maxgap, maxlap, want_incomplete, wmax, wmin,
             tpad):
@@ -1115,7 +1761,8 @@ class Pile(TracesGroup):
             group_selector=None, trace_selector=None,
             want_incomplete=True, degap=True, maxgap=5, maxlap=None,
             keep_current_files_open=False, accessor_id=None,
-            snap=(round, round), include_last=False, load_data=True):
+            snap=(round, round), include_last=False, load_data=True,
+            prefetch=0):
 
         '''
         Get iterator for shifting window wise data extraction from waveform
@@ -1151,6 +1798,9 @@ class Pile(TracesGroup):
         :param load_data: whether to load the waveform data. If set to
             ``False``, traces with no data samples, but with correct
             meta-information are returned
+        :param prefetch: number of windows for which the data is loaded ahead
+            in a background thread, while the current window is processed by
+            the caller (default: 0, no prefetching)
         :returns: itererator yielding a list of :py:class:`pyrocko.trace.Trace`
             objects for every extracted time window
         '''
@@ -1172,48 +1822,123 @@ class Pile(TracesGroup):
         if not self.is_relevant(tmin-tpad, tmax+tpad, group_selector):
             return
 
-        if accessor_id not in self.open_files:
-            self.open_files[accessor_id] = set()
+        lock = self.lock
+        with lock:
+            if accessor_id not in self.open_files:
+                self.open_files[accessor_id] = set()
 
-        open_files = self.open_files[accessor_id]
+            open_files = self.open_files[accessor_id]
 
-        iwin = 0
-        while True:
-            chopped = []
-            wmin, wmax = tmin+iwin*tinc, min(tmin+(iwin+1)*tinc, tmax)
-            eps = tinc*1e-6
-            if wmin >= tmax-eps:
-                break
+        prefetcher = None
+        if prefetch and load_data:
+            prefetcher = ChopperPrefetcher(
+                self, chopper_windows(tmin, tmax, tinc), prefetch, tpad,
+                group_selector, trace_selector, lock)
 
-            chopped, used_files = self.chop(
-                wmin-tpad, wmax+tpad, group_selector, trace_selector, snap,
-                include_last, load_data)
+            prefetcher.start()
 
-            for file in used_files - open_files:
-                # increment datause counter on newly opened files
-                file.use_data()
+        prefetched_files = set()
+        try:
+            for wmin, wmax in chopper_windows(tmin, tmax, tinc):
+                if prefetcher:
+                    prefetched_files = prefetcher.get()
 
-            open_files.update(used_files)
+                chopped, used_files = self._chop_window(
+                    wmin-tpad, wmax+tpad, group_selector, trace_selector,
+                    snap, include_last, load_data)
 
-            processed = self._process_chopped(
-                chopped, degap, maxgap, maxlap, want_incomplete, wmax, wmin,
-                tpad)
+                with lock:
+                    for file in used_files - open_files:
+                        # increment datause counter on newly opened files
+                        file.use_data()
 
-            yield processed
+                    open_files.update(used_files)
 
-            unused_files = open_files - used_files
+                processed = self._process_chopped(
+                    chopped, degap, maxgap, maxlap, want_incomplete, wmax,
+                    wmin, tpad)
 
-            while unused_files:
-                file = unused_files.pop()
-                file.drop_data()
-                open_files.remove(file)
+                yield processed
+
+                with lock:
+                    unused_files = open_files - used_files
+                    while unused_files:
+                        file = unused_files.pop()
+                        file.drop_data()
+                        open_files.remove(file)
 
-            iwin += 1
+                if prefetcher:
+                    prefetcher.release(prefetched_files)
+                    prefetched_files = set()
+
+        finally:
+            if prefetcher:
+                prefetcher.release(prefetched_files)
+                prefetcher.stop()
 
         if not keep_current_files_open:
-            while open_files:
-                file = open_files.pop()
-                file.drop_data()
+            with lock:
+                while open_files:
+                    file = open_files.pop()
+                    file.drop_data()
+
+    def chopper_stream(self, pipe, tmin=None, tmax=None, tinc=None,
+                       **kwargs):
+
+        '''
+        Get iterator for window wise stream processing of waveform archive.
+
+        Windows are extracted with :py:meth:`chopper` without padding and the
+        traces of each window are sent through a pipeline of coroutines,
+        e.g. :py:func:`pyrocko.trace.co_lowpass`,
+        :py:func:`pyrocko.trace.co_downsample` or
+        :py:func:`pyrocko.trace.co_sta_lta`. These keep their state (e.g.
+        filter initial conditions) per channel across consecutive windows, so
+        that long continuous time series can be processed without overlaps
+        and without artifacts at window boundaries. Use it like this::
+
+            from pyrocko import trace
+
+            def pipe(target):
+                return trace.co_lowpass(
+                    trace.co_downsample(target, 10), 4, 0.5)
+
+            for traces in p.chopper_stream(pipe, tinc=3600.):
+                ...
+
+        Further keyword arguments are passed to :py:meth:`chopper`, except
+        for ``tpad`` and ``include_last``.
+
+        :param pipe: callback taking a target coroutine and returning the
+            coroutine pipeline to feed the traces into
+        :param tmin: start time (default uses start time of available data)
+        :param tmax: end time (default uses end time of available data)
+        :param tinc: time increment (window shift time) (default uses
+            ``tmax-tmin``)
+        :returns: iterator yielding a list of the processed
+            :py:class:`pyrocko.trace.Trace` objects output by the pipeline
+            for every extracted time window
+        '''
+
+        if 'tpad' in kwargs or 'include_last' in kwargs:
+            raise ValueError(
+                'chopper_stream() does not support the arguments tpad and '
+                'include_last')
+
+        processed = []
+        sink = pipe(trace.co_list_append(processed))
+        try:
+            for traces in self.chopper(
+                    tmin=tmin, tmax=tmax, tinc=tinc, **kwargs):
+
+                for tr in sorted(traces, key=lambda tr: tr.tmin):
+                    sink.send(tr)
+
+                yield processed[:]
+                del processed[:]
+
+        finally:
+            sink.close()
 
     def all(self, *args, **kwargs):
         '''
@@ -1322,8 +2047,9 @@ class Pile(TracesGroup):
 
     def reload_modified(self):
         modified = False
-        for subpile in self.subpiles.values():
-            modified |= subpile.reload_modified()
+        with self.lock:
+            for subpile in self.subpiles.values():
+                modified |= subpile.reload_modified()
 
         return modified
 
@@ -1379,10 +2105,507 @@ class Pile(TracesGroup):
         snuffle(self, **kwargs)
 
 
+class CompactTracesFile(object):
+    '''Handle to a trace file contained in a :py:class:`CompactPile`.
+
+    Unlike :py:class:`TracesFile`, this object holds no trace objects while
+    the data of the file is not in use. The trace metainformation is kept in
+    the index of the pile, rows ``irow_begin`` to ``irow_end``.
+    '''
+
+    def __init__(self, abspath, format, substitutions=None, mtime=None):
+        self.abspath = abspath
+        self.format = format
+        self.substitutions = substitutions
+        self.mtime = mtime
+        self.traces = None
+        self.data_use_count = 0
+        self.file_id = None
+        self.irow_begin = None
+        self.irow_end = None
+
+    @property
+    def data_loaded(self):
+        return self.traces is not None
+
+    def read_data(self):
+        logger.debug('reading data from file: %s' % self.abspath)
+        return _load_unique(
+            self.abspath, self.format, self.substitutions, getdata=True)
+
+    def load_data(self, force=False, traces=None):
+        if self.traces is None or force:
+            logger.debug('loading data from file: %s' % self.abspath)
+            if traces is None:
+                traces = self.read_data()
+
+            self.traces = traces
+
+            for tr in self.traces:
+                tr.file = self
+
+        return False
+
+    def use_data(self):
+        # the data may have been released by a concurrent chop
+        self.load_data()
+        self.data_use_count += 1
+
+    def drop_data(self):
+        if self.data_loaded:
+            if self.data_use_count == 1:
+                logger.debug('forgetting data of file: %s' % self.abspath)
+                self.traces = None
+
+            self.data_use_count -= 1
+        else:
+            self.data_use_count = 0
+
+    def release_data(self):
+        '''Forget the data unless the file is in use.'''
+
+        if self.data_loaded and self.data_use_count == 0:
+            logger.debug('forgetting data of file: %s' % self.abspath)
+            self.traces = None
+
+    def __str__(self):
+        s = 'CompactTracesFile\n'
+        s += 'abspath: %s\n' % self.abspath
+        s += 'file mtime: %s\n' % util.time_to_str(self.mtime)
+        s += 'number of traces: %i\n' % (self.irow_end - self.irow_begin)
+        return s
+
+
+class CompactPile(Pile):
+    '''Memory efficient variant of :py:class:`Pile` for large archives.
+
+    The trace metainformation is kept in a columnar index of NumPy arrays
+    (file id, interned code id, tmin, tmax, deltat) instead of four AVL trees
+    of :py:class:`pyrocko.trace.Trace` objects. Trace objects are only
+    created for the files needed by :py:meth:`chop` and :py:meth:`chopper`
+    and for the results of :py:meth:`relevant` and :py:meth:`iter_traces`.
+
+    The data of a file is only kept while the file is in use by a
+    :py:meth:`chopper`, :py:meth:`chop` forgets it after cutting. After
+    :py:meth:`load_files`, the :py:class:`TracesFile` objects used while
+    loading and the entries held in memory by the metainformation cache
+    are released, see :py:meth:`TracesFileCache.unload`.
+
+    Only files on disk can be added. Listeners are not notified about
+    changes, so this class cannot be used as the pile of a Snuffler window.
+    '''
+
+    index_dtype = num.dtype([
+        ('file_id', num.int32),
+        ('code_id', num.int32),
+        ('tmin', num.float64),
+        ('tmax', num.float64),
+        ('deltat', num.float64)])
+
+    def __init__(self):
+        Pile.__init__(self)
+        self.tlenmax = None
+        self._files = []
+        self._codes = []
+        self._code_ids = {}
+        self._chunks = []
+        self._nrows = 0
+        self._index = num.zeros(0, dtype=self.index_dtype)
+        self._update_order()
+
+    def load_files(
+            self, filenames,
+            filename_attributes=None,
+            fileformat='mseed',
+            cache=None,
+            show_progress=True,
+            update_progress=None,
+            nprocs=1):
+
+        load = loader(
+            filenames, fileformat, cache, filename_attributes,
+            show_progress=show_progress,
+            update_progress=update_progress,
+            nprocs=nprocs)
+
+        files = []
+        for file in load:
+            self.add_file(file)
+            files.append(file)
+
+        # the index holds all needed metainformation
+        if cache:
+            cache.unload()
+
+        for file in files:
+            if file.get_parent() is None:
+                file.release_trees()
+
+    def _code_id(self, nslc_id):
+        if nslc_id not in self._code_ids:
+            self._code_ids[nslc_id] = len(self._codes)
+            self._codes.append(nslc_id)
+
+        return self._code_ids[nslc_id]
+
+    def _consolidate(self):
+        with self.lock:
+            if self._chunks:
+                self._index = num.concatenate([self._index] + self._chunks)
+                self._chunks = []
+                self._update_order()
+
+    def _update_order(self):
+        # sort rows by duration class and tmin, see TracesGroup.relevant
+        index = self._index
+        _, tlenclass = num.frexp(index['tmax'] - index['tmin'])
+        self._order = num.lexsort((index['tmin'], tlenclass))
+        self._tmins_sorted = index['tmin'][self._order]
+        self._tlenclasses, self._tlenclass_begins = num.unique(
+            tlenclass[self._order], return_index=True)
+
+    def add_file(self, file):
+        with self.lock:
+            if file.abspath is None:
+                logger.warning('Cannot add in-memory traces to CompactPile.')
+                return
+
+            if file.abspath in self.abspaths:
+                logger.warning('File already in pile: %s' % file.abspath)
+                return
+
+            traces = list(file.iter_traces())
+            if not traces:
+                logger.warning(
+                    'Sampling rate of all traces are zero in file: %s' %
+                    file.abspath)
+                return
+
+            cfile = CompactTracesFile(
+                file.abspath, file.format, file.substitutions, file.mtime)
+
+            cfile.file_id = len(self._files)
+            cfile.irow_begin = self._nrows
+            cfile.irow_end = self._nrows + len(traces)
+
+            chunk = num.zeros(len(traces), dtype=self.index_dtype)
+            chunk['file_id'] = cfile.file_id
+            chunk['code_id'] = [self._code_id(tr.nslc_id) for tr in traces]
+            chunk['tmin'] = [tr.tmin for tr in traces]
+            chunk['tmax'] = [tr.tmax for tr in traces]
+            chunk['deltat'] = [tr.deltat for tr in traces]
+
+            for tr in traces:
+                self.networks[tr.network] += 1
+                self.stations[tr.station] += 1
+                self.locations[tr.location] += 1
+                self.channels[tr.channel] += 1
+                self.nslc_ids[tr.nslc_id] += 1
+                self.deltats[tr.deltat] += 1
+
+            self._files.append(cfile)
+            self._chunks.append(chunk)
+            self._nrows += len(traces)
+            self.abspaths.add(file.abspath)
+            self._adjust_minmax_add(chunk, cfile)
+            self.nupdates += 1
+
+    def remove_file(self, file):
+        self.remove_files([file])
+
+    def remove_files(self, files):
+        with self.lock:
+            self._consolidate()
+            file_ids = num.array(
+                [file.file_id for file in files], dtype=num.int32)
+            removed = num.isin(self._index['file_id'], file_ids)
+
+            for row in self._index[removed]:
+                nslc_id = self._codes[row['code_id']]
+                net, sta, loc, cha = nslc_id
+                self.networks.subtract1(net)
+                self.stations.subtract1(sta)
+                self.locations.subtract1(loc)
+                self.channels.subtract1(cha)
+                self.nslc_ids.subtract1(nslc_id)
+                self.deltats.subtract1(float(row['deltat']))
+
+            for file in files:
+                self._files[file.file_id] = None
+                self.abspaths.remove(file.abspath)
+
+            self._index = self._index[~removed]
+            self._nrows = self._index.size
+            self._update_order()
+
+            file_ids, ibegins, counts = num.unique(
+                self._index['file_id'], return_index=True, return_counts=True)
+
+            for file_id, ibegin, count in zip(file_ids, ibegins, counts):
+                file = self._files[file_id]
+                file.irow_begin = int(ibegin)
+                file.irow_end = int(ibegin + count)
+
+            self.adjust_minmax()
+            self.nupdates += 1
+
+    def _adjust_minmax_add(self, chunk, cfile):
+        tmin = chunk['tmin'].min()
+        tmax = chunk['tmax'].max()
+        tlenmax = (chunk['tmax'] - chunk['tmin']).max()
+        if self.tmin is None:
+            self.tmin, self.tmax = tmin, tmax
+            self.tlenmax = tlenmax
+            self.mtime = cfile.mtime
+        else:
+            self.tmin = min(self.tmin, tmin)
+            self.tmax = max(self.tmax, tmax)
+            self.tlenmax = max(self.tlenmax, tlenmax)
+            self.mtime = max(self.mtime, cfile.mtime)
+
+        deltats = list(self.deltats.keys())
+        self.deltatmin = min(deltats)
+        self.deltatmax = max(deltats)
+
+    def adjust_minmax(self):
+        self._consolidate()
+        if self._index.size != 0:
+            self.tmin = self._index['tmin'].min()
+            self.tmax = self._index['tmax'].max()
+            self.tlenmax = (self._index['tmax'] - self._index['tmin']).max()
+            self.mtime = max(file.mtime for file in self.iter_files())
+            deltats = list(self.deltats.keys())
+            self.deltatmin = min(deltats)
+            self.deltatmax = max(deltats)
+        else:
+            self.tmin = None
+            self.tmax = None
+            self.tlenmax = None
+            self.mtime = None
+            self.deltatmin = None
+            self.deltatmax = None
+
+    def _relevant_rows(self, tmin, tmax):
+        self._consolidate()
+        if self._index.size == 0:
+            return self._order
+
+        ends = list(self._tlenclass_begins[1:]) + [self._index.size]
+        irows = []
+        for e, ibegin, iend in zip(
+                self._tlenclasses, self._tlenclass_begins, ends):
+
+            tmins = self._tmins_sorted[ibegin:iend]
+            ilo = num.searchsorted(tmins, float(tmin) - 2.0**e, 'left')
+            ihi = num.searchsorted(tmins, float(tmax), 'left')
+            irows.append(self._order[ibegin+ilo:ibegin+ihi])
+
+        irows = num.concatenate(irows)
+        irows = irows[self._index['tmax'][irows] >= float(tmin)]
+        return irows[num.argsort(self._index['tmin'][irows], kind='mergesort')]
+
+    def _header_trace(self, irow):
+        row = self._index[irow]
+        file = self._files[row['file_id']]
+        net, sta, loc, cha = self._codes[row['code_id']]
+        tr = trace.Trace(
+            net, sta, loc, cha,
+            tmin=float(row['tmin']),
+            tmax=float(row['tmax']),
+            deltat=float(row['deltat']),
+            mtime=file.mtime)
+
+        tr.file = file
+        return tr
+
+    def relevant(self, tmin, tmax, group_selector=None, trace_selector=None):
+        with self.lock:
+            if not self.is_relevant(tmin, tmax, group_selector):
+                return []
+
+            traces = []
+            for irow in self._relevant_rows(tmin, tmax):
+                tr = self._header_trace(irow)
+                if trace_selector is None or trace_selector(tr):
+                    traces.append(tr)
+
+            return traces
+
+    def chop(
+            self, tmin, tmax,
+            group_selector=None,
+            trace_selector=None,
+            snap=(round, round),
+            include_last=False,
+            load_data=True):
+
+        chopped, used_files = self._chop_window(
+            tmin, tmax, group_selector, trace_selector, snap, include_last,
+            load_data)
+
+        with self.lock:
+            for file in used_files:
+                file.release_data()
+
+        return chopped, used_files
+
+    def _chop_window(
+            self, tmin, tmax, group_selector, trace_selector, snap,
+            include_last, load_data):
+
+        if not load_data:
+            return Pile.chop(
+                self, tmin, tmax, group_selector, trace_selector, snap,
+                include_last, load_data)
+
+        chopped = []
+        used_files = set()
+
+        with self.lock:
+            if not self.is_relevant(tmin, tmax, group_selector):
+                return chopped, used_files
+
+            irows = self._relevant_rows(tmin, tmax)
+            files = [
+                self._files[file_id]
+                for file_id in num.unique(self._index['file_id'][irows])]
+
+        for file in files:
+            _load_data_outside_lock(file, self.lock)
+            used_files.add(file)
+
+        with self.lock:
+            for file in files:
+                # reads only if released by a concurrent chop meanwhile
+                file.load_data()
+                for tr in file.traces:
+                    if not tr.is_relevant(tmin, tmax, trace_selector):
+                        continue
+
+                    try:
+                        chopped.append(tr.chop(
+                            tmin, tmax,
+                            inplace=False,
+                            snap=snap,
+                            include_last=include_last))
+
+                    except trace.NoData:
+                        pass
+
+        return chopped, used_files
+
+    def gather_keys(self, gather, selector=None):
+        keys = set()
+        with self.lock:
+            self._consolidate()
+            for irow in range(self._nrows):
+                tr = self._header_trace(irow)
+                if selector is None or selector(tr):
+                    keys.add(gather(tr))
+
+        return sorted(keys)
+
+    def iter_traces(
+            self,
+            load_data=False,
+            return_abspath=False,
+            group_selector=None,
+            trace_selector=None):
+
+        self._consolidate()
+        for file in self.iter_files():
+            if group_selector and not group_selector(file):
+                continue
+
+            must_drop = False
+            if load_data:
+                file.load_data()
+                file.use_data()
+                must_drop = True
+                traces = file.traces
+            else:
+                traces = [
+                    self._header_trace(irow)
+                    for irow in range(file.irow_begin, file.irow_end)]
+
+            for tr in traces:
+                if trace_selector and not trace_selector(tr):
+                    continue
+
+                if return_abspath:
+                    yield file.abspath, tr
+                else:
+                    yield tr
+
+            if must_drop:
+                file.drop_data()
+
+    def iter_files(self):
+        for file in self._files:
+            if file is not None:
+                yield file
+
+    def reload_modified(self):
+        modified = []
+        with self.lock:
+            for file in self.iter_files():
+                mtime = os.stat(file.abspath)[8]
+                if mtime != file.mtime:
+                    logger.debug(
+                        'mtime=%i, reloading file: %s' % (
+                            mtime, file.abspath))
+                    modified.append((file, mtime))
+
+            if modified:
+                self.remove_files([file for (file, _) in modified])
+                for file, mtime in modified:
+                    self.add_file(TracesFile(
+                        None, file.abspath, file.format,
+                        substitutions=file.substitutions, mtime=mtime))
+
+        return bool(modified)
+
+    def __str__(self):
+        if self.tmin is not None and self.tmax is not None:
+            tmin = util.time_to_str(self.tmin)
+            tmax = util.time_to_str(self.tmax)
+            s = 'CompactPile\n'
+            s += 'number of files: %i\n' % len(self.abspaths)
+            s += 'number of traces: %i\n' % self._nrows
+            s += 'timerange: %s - %s\n' % (tmin, tmax)
+            s += 'networks: %s\n' % ', '.join(sl(self.networks.keys()))
+            s += 'stations: %s\n' % ', '.join(sl(self.stations.keys()))
+            s += 'locations: %s\n' % ', '.join(sl(self.locations.keys()))
+            s += 'channels: %s\n' % ', '.join(sl(self.channels.keys()))
+            s += 'deltats: %s\n' % ', '.join(sl(self.deltats.keys()))
+
+        else:
+            s = 'empty CompactPile'
+
+        return s
+
+    def snuffle(self, **kwargs):
+        raise Exception('CompactPile cannot be shown in Snuffler.')
+
+
+def chopper_windows(tmin, tmax, tinc):
+    '''Iterate over the time windows visited by :py:meth:`Pile.chopper`.'''
+
+    iwin = 0
+    while True:
+        wmin, wmax = tmin+iwin*tinc, min(tmin+(iwin+1)*tinc, tmax)
+        eps = tinc*1e-6
+        if wmin >= tmax-eps:
+            break
+
+        yield wmin, wmax
+        iwin += 1
+
+
 def make_pile(
         paths=None, selector=None, regex=None,
         fileformat='mseed',
-        cachedirname=None, show_progress=True):
+        cachedirname=None, show_progress=True, nprocs=1):
 
     '''Create pile from given file and directory names.
 
@@ -1397,6 +2620,8 @@ def make_pile(
     :param cachedirname: loader cache is stored under this directory. It is
         created as neccessary.
     :param show_progress: show progress bar and other progress information
+    :param nprocs: number of processes to use for scanning the file headers
+        of files not found in the cache. ``None`` uses all available cores.
     '''
 
     if show_progress_force_off:
@@ -1420,11 +2645,54 @@ def make_pile(
         sorted(fns),
         cache=cache,
         fileformat=fileformat,
-        show_progress=show_progress)
+        show_progress=show_progress,
+        nprocs=nprocs)
 
     return p
 
 
+def save_and_add(pile, writer, traces, path, format, add=True):
+    '''Save traces, appending to their files, and add them to a pile.
+
+    :param pile: :py:class:`Pile` to be updated
+    :param writer: incremental writer from a previous call or ``None``
+    :param traces: list of :py:class:`pyrocko.trace.Trace` objects
+    :param path: filename template, see :py:func:`pyrocko.io.save`
+    :param format: file format
+    :param add: whether to add the saved traces to the pile
+    :returns: the writer to be passed to the next call, ``None`` if the
+        format does not support appending
+
+    If the format supports it, traces are written with an incremental
+    writer (see :py:func:`pyrocko.io.get_writer`) and only the appended
+    traces are added to the pile's entries of the files, which are not
+    rescanned. Otherwise, the traces are saved with :py:func:`pyrocko.io.save`
+    and the files are loaded into the pile.
+    '''
+
+    if writer is None:
+        try:
+            writer = io.get_writer(path, format=format)
+        except io.UnsupportedFormat:
+            fns = io.save(traces, path, format=format)
+            if add:
+                pile.load_files(fns, show_progress=False, fileformat=format)
+
+            return None
+
+    fn_traces = OrderedDict()
+    for tr in traces:
+        fn, = writer.write(tr)
+        fn_traces.setdefault(fn, []).append(tr)
+
+    if add:
+        writer.flush()
+        for fn, traces_fn in fn_traces.items():
+            pile.add_appended_traces(fn, traces_fn, fileformat=format)
+
+    return writer
+
+
 class Injector(trace.States):
 
     def __init__(
@@ -1439,6 +2707,7 @@ class Injector(trace.States):
         self._fixation_length = fixation_length
         self._format = format
         self._path = path
+        self._writer = None
         self._forget_fixed = forget_fixed
 
     def set_fixation_length(self, l):
@@ -1455,9 +2724,14 @@ class Injector(trace.States):
                  '%(tmin)s_%(tmax)s.mseed'):
 
         self.fixate_all()
+        self._close_writer()
         self._path = path
 
     def inject(self, trace):
+        with self._pile.lock:
+            self._inject(trace)
+
+    def _inject(self, trace):
         logger.debug('Received a trace: %s' % trace)
 
         buf = self.get(trace)
@@ -1482,13 +2756,15 @@ class Injector(trace.States):
                 self._fixate(buf, complete=False)
 
     def fixate_all(self):
-        for state in list(self._states.values()):
-            self._fixate(state[-1])
+        with self._pile.lock:
+            for state in list(self._states.values()):
+                self._fixate(state[-1])
 
-        self._states = {}
+            self._states = {}
 
     def free(self, buf):
-        self._fixate(buf)
+        with self._pile.lock:
+            self._fixate(buf)
 
     def _fixate(self, buf, complete=True):
         trbuf = buf.get_traces()[0]
@@ -1531,14 +2807,21 @@ class Injector(trace.States):
                 traces = [trbuf]
                 self._pile.remove_file(buf)
 
-            fns = io.save(traces, self._path, format=self._format)
-
-            if not self._forget_fixed:
-                self._pile.load_files(
-                    fns, show_progress=False, fileformat=self._format)
+            self._save(traces)
 
         if del_state:
             del self._states[trbuf.nslc_id]
 
+    def _save(self, traces):
+        self._writer = save_and_add(
+            self._pile, self._writer, traces, self._path, self._format,
+            add=not self._forget_fixed)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
     def __del__(self):
         self.fixate_all()
+        self._close_writer()
@@ -0,0 +1,406 @@
+# http://pyrocko.org - GPLv3
+#
+# The Pyrocko Developers, 21st Century
+# ---|P------/S----------~Lg----------
+'''
+Min/max/RMS overview pyramids for quick display of long time spans.
+
+For each trace in a pile, a pyramid of binned sample statistics is computed
+once from the full-rate data. Level ``i`` of the pyramid holds the minimum,
+maximum, mean and RMS of consecutive bins of ``2**(overview_kmin+i)``
+samples. The pyramids are kept on disk, next to the pile's trace
+metainformation cache, so that they have to be computed only once per file.
+'''
+from __future__ import absolute_import, division
+
+import os
+import math
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as num
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from . import trace, util, config
+from .pile import ehash
+
+logger = logging.getLogger('pyrocko.pile_overview')
+
+pjoin = os.path.join
+
+version_salt = 'overview-v1-'
+
+overview_kmin = 6
+
+overview_dtype = num.dtype([
+    ('min', num.float32),
+    ('max', num.float32),
+    ('mean', num.float32),
+    ('rms', num.float32)])
+
+
+def has_overview(deltat, tbin, kmin=overview_kmin):
+    '''Check if overviews are coarse enough for a given display resolution.
+
+    :param deltat: sampling interval of the trace [s]
+    :param tbin: time span covered by a single display pixel [s]
+    '''
+
+    return deltat * 2**kmin <= tbin
+
+
+def use_overview(tr, tbin):
+    '''Check if a trace in a pile should be displayed from its overview.
+
+    Overviews are used for traces stored in files, when they are coarse
+    enough for the given display resolution.
+
+    :param tr: header trace as returned by
+        :py:meth:`pyrocko.pile.Pile.relevant`.
+    :param tbin: time span covered by a single display pixel [s]
+    '''
+
+    return has_overview(tr.deltat, tbin) \
+        and getattr(tr.file, 'abspath', None) is not None
+
+
+class TraceOverview(object):
+    '''Min/max/mean/RMS pyramid of the samples of a trace.'''
+
+    def __init__(self, nslc_id, tmin, deltat, nsamples, levels,
+                 kmin=overview_kmin):
+
+        self.nslc_id = nslc_id
+        self.tmin = tmin
+        self.deltat = deltat
+        self.nsamples = nsamples
+        self.levels = levels
+        self.kmin = kmin
+
+    @classmethod
+    def from_trace(cls, tr, kmin=overview_kmin):
+        '''Compute overview pyramid from the data of a trace.'''
+
+        y = tr.get_ydata()
+        n = y.size
+        nbin = 2**kmin
+        nbins = (n + nbin - 1) // nbin
+
+        ypad = num.empty(nbins * nbin, dtype=num.float64)
+        ypad[:n] = y
+        ypad[n:] = y[-1]
+        ypad = ypad.reshape((nbins, nbin))
+
+        nlast = n - (nbins - 1) * nbin
+        counts = num.empty(nbins, dtype=num.float64)
+        counts[:] = nbin
+        counts[-1] = nlast
+
+        ymin = ypad.min(axis=1)
+        ymax = ypad.max(axis=1)
+        ypad[-1, nlast:] = 0.0
+        ysum = ypad.sum(axis=1)
+        ysumsq = (ypad**2).sum(axis=1)
+        del ypad
+
+        levels = []
+        while True:
+            level = num.empty(ymin.size, dtype=overview_dtype)
+            level['min'] = ymin
+            level['max'] = ymax
+            level['mean'] = ysum / counts
+            level['rms'] = num.sqrt(ysumsq / counts)
+            levels.append(level)
+
+            if ymin.size == 1:
+                break
+
+            if ymin.size % 2 == 1:
+                ymin = num.append(ymin, ymin[-1])
+                ymax = num.append(ymax, ymax[-1])
+                ysum = num.append(ysum, 0.0)
+                ysumsq = num.append(ysumsq, 0.0)
+                counts = num.append(counts, 0.0)
+
+            ymin = num.minimum(ymin[0::2], ymin[1::2])
+            ymax = num.maximum(ymax[0::2], ymax[1::2])
+            ysum = ysum[0::2] + ysum[1::2]
+            ysumsq = ysumsq[0::2] + ysumsq[1::2]
+            counts = counts[0::2] + counts[1::2]
+
+        return cls(tr.nslc_id, tr.tmin, tr.deltat, n, levels, kmin=kmin)
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def get_level(self, tbin):
+        '''Get index of the coarsest level with bins not wider than ``tbin``.
+
+        :returns: level index or ``None`` if even the finest level is too
+            coarse.
+        '''
+
+        if not has_overview(self.deltat, tbin, self.kmin):
+            return None
+
+        ilevel = int(math.floor(math.log(tbin / self.deltat, 2.))) - self.kmin
+        return max(0, min(ilevel, len(self.levels) - 1))
+
+    def get_bins(self, tmin, tmax, ilevel):
+        '''Get the bins of a level overlapping with a time span.
+
+        :returns: ``(tmin_first_bin, bins)`` where ``bins`` is a slice of
+            the level's array with fields ``min``, ``max``, ``mean`` and
+            ``rms``.
+        '''
+
+        tbinlen = self.deltat * 2**(self.kmin + ilevel)
+        level = self.levels[ilevel]
+        ibmin = max(0, int(math.floor((tmin - self.tmin) / tbinlen)))
+        ibmax = min(level.size, int(math.ceil((tmax - self.tmin) / tbinlen)))
+        return self.tmin + ibmin * tbinlen, level[ibmin:ibmax]
+
+    def get_trace(self, tmin, tmax, tbin, demean=False):
+        '''Get an envelope trace for display.
+
+        The minimum and maximum of each bin are interleaved into a trace with
+        a sampling interval of half the bin length, so that drawing it as a
+        line reproduces the envelope of the full-rate data.
+
+        :param tbin: time span covered by a single display pixel [s]
+        :param demean: subtract the mean of the shown data
+        :returns: :py:class:`pyrocko.trace.Trace` or ``None``
+        '''
+
+        ilevel = self.get_level(tbin)
+        if ilevel is None:
+            return None
+
+        tmin_bins, bins = self.get_bins(tmin, tmax, ilevel)
+        if bins.size == 0:
+            return None
+
+        ydata = num.empty(bins.size * 2, dtype=num.float32)
+        ydata[0::2] = bins['min']
+        ydata[1::2] = bins['max']
+        if demean:
+            ydata -= num.mean(bins['mean'])
+
+        tbinlen = self.deltat * 2**(self.kmin + ilevel)
+        network, station, location, channel = self.nslc_id
+        return trace.Trace(
+            network, station, location, channel,
+            tmin=tmin_bins + 0.25 * tbinlen,
+            deltat=0.5 * tbinlen,
+            ydata=ydata)
+
+
+def trace_key(tr):
+    return tr.nslc_id + (tr.tmin, tr.tmax, tr.deltat)
+
+
+class OverviewCache(object):
+    '''Manages overview pyramids of the traces in a pile.
+
+    The pyramids of all traces of a file are computed in advance with
+    :py:meth:`update` or, at the latest, when they are first requested. They
+    are stored in one cache file, which is renewed when the modification
+    time of the data file changes. Recently used pyramids are kept in memory
+    up to a total size of ``maxbytes``.
+    '''
+
+    caches = {}
+
+    def __init__(self, cachedir, maxbytes=256*1024**2):
+        '''Create new cache.
+
+        :param cachedir: directory to hold the cache files.
+        :param maxbytes: size limit for pyramids kept in memory.
+        '''
+
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self._nbytes = 0
+        self._overviews = OrderedDict()
+        self._lock = threading.Lock()
+        util.ensuredir(self.cachedir)
+
+    def get(self, tr):
+        '''Get overview pyramid of a trace in a pile.
+
+        :param tr: header trace of a file-backed trace as returned by
+            :py:meth:`pyrocko.pile.Pile.relevant`.
+        :returns: :py:class:`TraceOverview` or ``None`` if the trace holds
+            no data.
+        '''
+
+        with self._lock:
+            return self._get_file_overviews(tr.file).get(trace_key(tr))
+
+    def update(self, files, update_progress=None):
+        '''Build overview pyramids of files, which are not cached yet.
+
+        Pyramids are computed and written to the cache directory, but not
+        kept in memory. Files without traces long enough to benefit from
+        overviews are skipped.
+
+        :param files: iterable of :py:class:`pyrocko.pile.TracesFile` objects
+        :param update_progress: callback ``f(label, i, n)``, returning
+            ``True`` to abort
+        '''
+
+        nsamples_min = 2**overview_kmin
+        files = [
+            file for file in files
+            if file.abspath is not None and any(
+                (tr.tmax - tr.tmin) / tr.deltat + 1 >= nsamples_min
+                for tr in file.iter_traces())]
+
+        label = 'Building overviews'
+        for i, file in enumerate(files):
+            if update_progress and update_progress(label, i, len(files)):
+                return
+
+            with self._lock:
+                k = file.abspath
+                if k in self._overviews \
+                        and self._overviews[k][0] == file.mtime:
+                    continue
+
+                if self._load(file.abspath, file.mtime) is not None:
+                    continue
+
+                self._dump(file.abspath, file.mtime, self._build(file))
+
+        if update_progress:
+            update_progress(label, len(files), len(files))
+
+    def _cachepath(self, abspath):
+        return pjoin(self.cachedir, ehash(version_salt + abspath))
+
+    def _get_file_overviews(self, file):
+        k = file.abspath
+        if k in self._overviews:
+            mtime, overviews, nbytes = self._overviews.pop(k)
+            if mtime == file.mtime:
+                self._overviews[k] = mtime, overviews, nbytes
+                return overviews
+
+            self._nbytes -= nbytes
+
+        overviews = self._load(file.abspath, file.mtime)
+        if overviews is None:
+            overviews = self._build(file)
+            self._dump(file.abspath, file.mtime, overviews)
+
+        nbytes = sum(ov.nbytes for ov in overviews.values())
+        self._overviews[k] = file.mtime, overviews, nbytes
+        self._nbytes += nbytes
+        while self._nbytes > self.maxbytes and len(self._overviews) > 1:
+            _, (_, _, nbytes_old) = self._overviews.popitem(last=False)
+            self._nbytes -= nbytes_old
+
+        return overviews
+
+    def _build(self, file):
+        logger.debug('building overviews for file: %s' % file.abspath)
+
+        # read without attaching the data to the file, which would modify
+        # the pile
+        overviews = {}
+        for tr in file.read_data():
+            if tr.ydata is not None and tr.ydata.size > 0:
+                overviews[trace_key(tr)] = TraceOverview.from_trace(tr)
+
+        return overviews
+
+    def _load(self, abspath, mtime):
+        cachepath = self._cachepath(abspath)
+        if not os.path.isfile(cachepath):
+            return None
+
+        try:
+            with open(cachepath, 'rb') as f:
+                mtime_cached, overviews = pickle.load(f)
+
+        except Exception as e:
+            logger.warning(
+                'Cannot read overview cache file %s: %s' % (cachepath, e))
+            return None
+
+        if mtime_cached != mtime:
+            return None
+
+        return overviews
+
+    def _dump(self, abspath, mtime, overviews):
+        cachepath = self._cachepath(abspath)
+        tmpfn = cachepath + '.%i.tmp' % os.getpid()
+        with open(tmpfn, 'wb') as f:
+            pickle.dump((mtime, overviews), f, protocol=2)
+
+        os.rename(tmpfn, cachepath)
+
+
+def get_cache(cachedir=None):
+    '''Get global overview cache object for given directory.
+
+    :param cachedir: cache directory, by default the subdirectory
+        ``overview`` of the Pyrocko cache directory is used.
+    '''
+
+    if cachedir is None:
+        cachedir = pjoin(config.config().cache_dir, 'overview')
+
+    if cachedir not in OverviewCache.caches:
+        OverviewCache.caches[cachedir] = OverviewCache(cachedir)
+
+    return OverviewCache.caches[cachedir]
+
+
+def overview_traces(
+        pile, tmin, tmax, tbin, group_selector=None, trace_selector=None,
+        demean=False, cache=None):
+
+    '''Get envelope traces from overviews for all traces in a time span.
+
+    Only traces for which :py:func:`use_overview` is true for the given
+    display resolution are considered, all other traces should be fetched
+    at full rate, e.g. with :py:meth:`pyrocko.pile.Pile.chopper`.
+
+    :param pile: :py:class:`pyrocko.pile.Pile` object
+    :param tbin: time span covered by a single display pixel [s]
+    :param demean: subtract the mean of the shown data of each trace
+    :param cache: :py:class:`OverviewCache` object, by default the one
+        returned by :py:func:`get_cache` is used.
+    :returns: list of :py:class:`pyrocko.trace.Trace` objects
+    '''
+
+    if cache is None:
+        cache = get_cache()
+
+    def trace_selectorx(tr):
+        return use_overview(tr, tbin) and (
+            trace_selector is None or trace_selector(tr))
+
+    traces = []
+    for tr in pile.relevant(
+            tmin, tmax,
+            group_selector=group_selector,
+            trace_selector=trace_selectorx):
+
+        overview = cache.get(tr)
+        if overview is None:
+            continue
+
+        otr = overview.get_trace(tmin, tmax, tbin, demean=demean)
+        if otr is not None:
+            traces.append(otr)
+
+    return traces
@@ -70,19 +70,17 @@ class Cell(object):
                 return None
 
     def interpolate_many(self, x):
-        if self.children:
-            result = num.empty(x.shape[0], dtype=num.float)
-            result[:] = None
-            for cell in self.children:
-                indices = num.where(
-                    self.tree.ndim == num.sum(and_(
-                        cell.xbounds[:, 0] <= x,
-                        x <= cell.xbounds[:, 1]), axis=-1))[0]
+        '''
+        Interpolate at many points at once.
 
-                if indices.size != 0:
-                    result[indices] = cell.interpolate_many(x[indices])
+        :param x: points, array of shape ``(npoints, ndim)``
+        :returns: array of interpolated values, NaN where undefined or
+            outside of the cell
+        '''
 
-            return result
+        x = num.asarray(x, dtype=num.float)
+        if self.children:
+            return self.tree._interpolate_many(x, self)
 
         else:
             if all_(num.isfinite(self.f)):
@@ -239,6 +237,7 @@ class SPTree(object):
 
             self.root = None
             self.ones_int = num.ones(self.ndim, dtype=num.int)
+            self._flat = None
 
             cc = num.ix_(*[num.arange(3)]*self.ndim)
             w = num.zeros([3]*self.ndim + [self.ndim, 2])
@@ -301,6 +300,7 @@ class SPTree(object):
             self.root.dump(file)
 
     def _load(self, filename):
+        self._flat = None
         with open(filename, 'rb') as file:
             marker, version, self.ndim, self.ncells, self.ftol = bread(
                 file, '<8sQQQd')
@@ -347,8 +347,112 @@ class SPTree(object):
         return self.interpolate(x)
 
     def interpolate_many(self, x):
+        '''
+        Interpolate at many points at once.
+
+        :param x: points, array of shape ``(npoints, ndim)``
+        :returns: array of interpolated values, NaN where undefined
+
+        Raises :py:exc:`OutOfBounds` if any point is outside of the bounds
+        of the tree.
+        '''
+
+        x = num.asarray(x, dtype=num.float)
+        assert x.ndim == 2 and x.shape[1] == self.ndim
+        if not all_(and_(self.xbounds[:, 0] <= x, x <= self.xbounds[:, 1])):
+            raise OutOfBounds()
+
         return self.root.interpolate_many(x)
 
+    def _get_flat(self):
+        '''
+        Get tree in flattened form, as arrays indexed by cell number.
+
+        For each cell, a child lookup table maps the position of a point
+        relative to the split coordinates of the cell to the number of the
+        child cell containing it. This allows to find the leaf cells for
+        many points at once, descending the tree level by level.
+        '''
+
+        if self._flat is None:
+            cells = list(self.root)
+            for icell, cell in enumerate(cells):
+                cell.icell = icell
+
+            ncells = len(cells)
+            ndim = self.ndim
+            offsets = num.empty(ncells, dtype=num.int)
+            offsets.fill(-1)
+            splits = num.empty((ncells, ndim), dtype=num.float)
+            splits.fill(num.inf)
+            strides = num.zeros((ncells, ndim), dtype=num.int)
+            a = num.empty((ncells, ndim, 2), dtype=num.float)
+            b = num.empty((ncells, ndim, 2), dtype=num.float)
+            f = num.empty((ncells, 2**ndim), dtype=num.float)
+            lookup = []
+
+            for icell, cell in enumerate(cells):
+                a[icell] = cell.a
+                b[icell] = cell.b
+                f[icell] = cell.f.ravel()
+
+                if cell.children:
+                    deepen = cell.children[0].depths - cell.depths
+                    table = num.zeros(deepen+1, dtype=num.int)
+                    for child in cell.children:
+                        iadd = child.index - (cell.index << deepen)
+                        table[tuple(iadd)] = child.icell
+                        for idim in num.nonzero(iadd)[0]:
+                            splits[icell, idim] = child.xbounds[idim, 0]
+
+                    strides[icell] = num.array(table.strides) \
+                        // table.itemsize
+                    offsets[icell] = len(lookup)
+                    lookup.extend(table.ravel())
+
+            self._flat = dict(
+                offsets=offsets,
+                splits=splits,
+                strides=strides,
+                lookup=num.array(lookup, dtype=num.int),
+                a=a,
+                b=b,
+                f=f,
+                defined=num.all(num.isfinite(f), axis=1))
+
+        return self._flat
+
+    def _interpolate_many(self, x, cell):
+        flat = self._get_flat()
+        npoints = x.shape[0]
+
+        inside = num.all(
+            and_(cell.xbounds[:, 0] <= x, x <= cell.xbounds[:, 1]), axis=1)
+
+        icells = num.empty(npoints, dtype=num.int)
+        icells.fill(cell.icell)
+        ipoints = num.arange(npoints)
+        while ipoints.size != 0:
+            icells_inner = icells[ipoints]
+            offsets = flat['offsets'][icells_inner]
+            inner = offsets >= 0
+            ipoints = ipoints[inner]
+            icells_inner = icells_inner[inner]
+            iadd = x[ipoints] > flat['splits'][icells_inner]
+            icells[ipoints] = flat['lookup'][
+                offsets[inner]
+                + num.sum(iadd * flat['strides'][icells_inner], axis=1)]
+
+        ws = (x[:, :, num.newaxis] - flat['a'][icells]) / flat['b'][icells]
+        wn = num.ones((npoints, 1))
+        for idim in range(self.ndim):
+            wn = (wn[:, :, num.newaxis]
+                  * ws[:, idim, num.newaxis, :]).reshape(npoints, -1)
+
+        result = num.sum(wn * flat['f'][icells], axis=1)
+        result[not_(and_(inside, flat['defined'][icells]))] = None
+        return result
+
     def _continue_fill(self):
         cells_to_continue, self.cells_to_continue = self.cells_to_continue, []
         for cell in cells_to_continue:
@@ -386,7 +490,7 @@ class SPTree(object):
                 for idim in range(self.ndim):
                     dimcorners = [slice(None, None, 2)] * self.ndim
                     dimcorners[idim] = 1
-                    if all_(works_full[dimcorners]):
+                    if all_(works_full[tuple(dimcorners)]):
                         deepen[idim] = 0
 
             if not any_(deepen):
@@ -413,6 +517,7 @@ class SPTree(object):
             self.nbad -= 1
             cell.bad = False
 
+        self._flat = None
         for iadd in num.ndindex(*(cell.deepen+1)):
             index_child = (cell.index << cell.deepen) + iadd
             child = Cell(self, index_child)
@@ -14,6 +14,8 @@ import time
 import math
 import copy
 import logging
+import threading
+from collections import OrderedDict
 
 import numpy as num
 from scipy import signal
@@ -1377,6 +1379,10 @@ class Trace(object):
         :param cut_off_fading: whether to cut off rise/fall interval in output
             trace.
         :param invert: set to True to do a deconvolution
+
+        The transfer function coefficients are kept in the bounded
+        :py:data:`transfer_cache`, so that they are computed only once for
+        traces of equal length and sampling rate sharing the same response.
         '''
 
         if transfer_function is None:
@@ -1397,9 +1403,8 @@ class Trace(object):
         data_pad = num.zeros(ntrans, dtype=num.float)
         data_pad[:ndata] = data - data.mean()
         if tfade != 0.0:
-            data_pad[:ndata] *= costaper(
-                0., tfade, self.deltat*(ndata-1)-tfade, self.deltat*ndata,
-                ndata, self.deltat)
+            data_pad[:ndata] *= _get_cached_fade_taper(
+                tfade, ndata, self.deltat)
 
         fdata = num.fft.rfft(data_pad)
         fdata *= coefs
@@ -1580,27 +1585,8 @@ class Trace(object):
     def _get_tapered_coefs(
             self, ntrans, freqlimits, transfer_function, invert=False):
 
-        deltaf = 1./(self.deltat*ntrans)
-        nfreqs = ntrans//2 + 1
-        transfer = num.ones(nfreqs, dtype=num.complex)
-        hi = snapper(nfreqs, deltaf)
-        if freqlimits is not None:
-            a, b, c, d = freqlimits
-            freqs = num.arange(hi(d)-hi(a), dtype=num.float)*deltaf \
-                + hi(a)*deltaf
-
-            if invert:
-                transfer[hi(a):hi(d)] = 1.0 / transfer_function.evaluate(freqs)
-            else:
-                transfer[hi(a):hi(d)] = transfer_function.evaluate(freqs)
-
-            tapered_transfer = costaper(a, b, c, d, nfreqs, deltaf)*transfer
-        else:
-            freqs = num.arange(nfreqs) * deltaf
-            tapered_transfer = transfer_function.evaluate(freqs)
-
-        tapered_transfer[0] = 0.0  # don't introduce static offsets
-        return tapered_transfer
+        return _get_tapered_coefs(
+            self.deltat, ntrans, freqlimits, transfer_function, invert=invert)
 
     def fill_template(self, template, **additional):
         '''
@@ -1821,6 +1807,38 @@ def minmaxtime(traces, key=None):
     return ranges
 
 
+def _pieces_truncate(pieces, n):
+    '''
+    Remove ``n`` samples from the end of a list of array pieces.
+    '''
+
+    while n > 0 and pieces:
+        if pieces[-1].size <= n:
+            n -= pieces.pop().size
+        else:
+            pieces[-1] = pieces[-1][:-n]
+            n = 0
+
+
+def _pieces_pop_tail(pieces, n):
+    '''
+    Remove ``n`` samples from the end of a list of array pieces and return
+    them as a new array.
+    '''
+
+    tail = []
+    while n > 0 and pieces:
+        if pieces[-1].size <= n:
+            tail.append(pieces.pop())
+            n -= tail[-1].size
+        else:
+            tail.append(pieces[-1][-n:])
+            pieces[-1] = pieces[-1][:-n]
+            n = 0
+
+    return num.concatenate(tail[::-1])
+
+
 def degapper(
         traces,
         maxgap=5,
@@ -1835,6 +1853,10 @@ def degapper(
     station, location and channel attributes. Overlapping parts are handled
     according to the ``deoverlap`` argument.
 
+    All joins of an output trace are planned first, as a list of pieces of the
+    input arrays, before its data is assembled in a single allocation. The
+    runtime is therefore linear in the number of input traces and samples.
+
     :param traces: input traces, must be sorted by their full_id attribute.
     :param maxgap: maximum number of samples to interpolate.
     :param fillmethod: what to put into the gaps: 'interpolate' or 'zeros'.
@@ -1847,28 +1869,38 @@ def degapper(
     :returns:           list of traces
     '''
 
-    in_traces = traces
     out_traces = []
-    if not in_traces:
+    if not traces:
         return out_traces
-    out_traces.append(in_traces.pop(0))
-    while in_traces:
 
-        a = out_traces[-1]
-        b = in_traces.pop(0)
+    def assemble(a, pieces, joined):
+        if joined and a.ydata is not None:
+            a.ydata = num.concatenate(pieces)
+
+        out_traces.append(a)
+
+    a = traces[0]
+    alen = a.data_len()
+    pieces = [a.ydata] if a.ydata is not None and alen >= 1 else []
+    joined = False
 
+    for b in traces[1:]:
         avirt, bvirt = a.ydata is None, b.ydata is None
         assert avirt == bvirt, \
             'traces given to degapper() must either all have data or have ' \
             'no data.'
 
         virtual = avirt and bvirt
+        if virtual:
+            alen = a.data_len()
+
+        blen = b.data_len()
 
         if (a.nslc_id == b.nslc_id and a.deltat == b.deltat
-                and a.data_len() >= 1 and b.data_len() >= 1
+                and alen >= 1 and blen >= 1
                 and (virtual or a.ydata.dtype == b.ydata.dtype)):
 
-            dist = (b.tmin-(a.tmin+(a.data_len()-1)*a.deltat))/a.deltat
+            dist = (b.tmin-(a.tmin+(alen-1)*a.deltat))/a.deltat
             idist = int(round(dist))
             if abs(dist - idist) > 0.05 and idist <= maxgap:
                 # logger.warning('Cannot degap traces with displaced sampling '
@@ -1877,14 +1909,20 @@ def degapper(
             else:
                 if 1 < idist <= maxgap:
                     if not virtual:
+                        dtype = a.ydata.dtype
                         if fillmethod == 'interpolate':
-                            filler = a.ydata[-1] + (
+                            alast = pieces[-1][-1]
+                            filler = alast + (
                                 ((1.0 + num.arange(idist-1, dtype=num.float))
-                                 / idist) * (b.ydata[0]-a.ydata[-1])
-                            ).astype(a.ydata.dtype)
+                                 / idist) * (b.ydata[0]-alast)
+                            ).astype(dtype)
                         elif fillmethod == 'zeros':
-                            filler = num.zeros(idist-1, dtype=a.ydist.dtype)
-                        a.ydata = num.concatenate((a.ydata, filler, b.ydata))
+                            filler = num.zeros(idist-1, dtype=dtype)
+
+                        pieces.extend((filler, b.ydata))
+                        joined = True
+
+                    alen += idist - 1 + blen
                     a.tmax = b.tmax
                     if a.mtime and b.mtime:
                         a.mtime = max(a.mtime, b.mtime)
@@ -1892,7 +1930,10 @@ def degapper(
 
                 elif idist == 1:
                     if not virtual:
-                        a.ydata = num.concatenate((a.ydata, b.ydata))
+                        pieces.append(b.ydata)
+                        joined = True
+
+                    alen += blen
                     a.tmax = b.tmax
                     if a.mtime and b.mtime:
                         a.mtime = max(a.mtime, b.mtime)
@@ -1900,28 +1941,42 @@ def degapper(
 
                 elif idist <= 0 and (maxlap is None or -maxlap < idist):
                     if b.tmax > a.tmax:
+                        n = -idist+1
                         if not virtual:
-                            na = a.ydata.size
-                            n = -idist+1
                             if deoverlap == 'use_second':
-                                a.ydata = num.concatenate(
-                                    (a.ydata[:-n], b.ydata))
-                            elif deoverlap in ('use_first', 'crossfade_cos'):
-                                a.ydata = num.concatenate(
-                                    (a.ydata, b.ydata[n:]))
-                            elif deoverlap == 'add':
-                                a.ydata[-n:] += b.ydata[:n]
-                                a.ydata = num.concatenate(
-                                    (a.ydata, b.ydata[n:]))
+                                _pieces_truncate(pieces, n)
+                                pieces.append(b.ydata)
+
+                            elif deoverlap in (
+                                    'use_first', 'crossfade_cos', 'add'):
+                                if deoverlap in ('add', 'crossfade_cos'):
+                                    m = min(n, alen)
+                                    tail = _pieces_pop_tail(pieces, m)
+                                    bover = b.ydata[n-m:n]
+                                    if deoverlap == 'add':
+                                        tail += bover
+                                    else:
+                                        taper = 0.5-0.5*num.cos(
+                                            (1.+num.arange(n))/(1.+n)
+                                            * num.pi)[n-m:]
+
+                                        tail = (tail * (1.-taper)
+                                                + bover * taper).astype(
+                                                    tail.dtype)
+
+                                    pieces.append(tail)
+
+                                pieces.append(b.ydata[n:])
+
                             else:
                                 assert False, 'unknown deoverlap method'
 
-                            if deoverlap == 'crossfade_cos':
-                                n = -idist+1
-                                taper = 0.5-0.5*num.cos(
-                                    (1.+num.arange(n))/(1.+n)*num.pi)
-                                a.ydata[na-n:na] *= 1.-taper
-                                a.ydata[na-n:na] += b.ydata[:n] * taper
+                            joined = True
+
+                        if deoverlap == 'use_second':
+                            alen = max(alen - n, 0) + blen
+                        else:
+                            alen = alen - n + blen
 
                         a.tmax = b.tmax
                         if a.mtime and b.mtime:
@@ -1931,8 +1986,14 @@ def degapper(
                         # make short second trace vanish
                         continue
 
-        if b.data_len() >= 1:
-            out_traces.append(b)
+        if blen >= 1:
+            assemble(a, pieces, joined)
+            a = b
+            alen = blen
+            pieces = [b.ydata] if not bvirt else []
+            joined = False
+
+    assemble(a, pieces, joined)
 
     for tr in out_traces:
         tr._update_ids()
@@ -2427,6 +2488,507 @@ def merge_codes(a, b, sep='-'):
     return o
 
 
+class TraceArray(object):
+    '''
+    Container for equally sampled traces sharing a common time axis.
+
+    The samples of all traces are held in a single contiguous 2D NumPy array
+    of shape ``(ntraces, nsamples)``. Processing methods act on all traces at
+    once, along axis 1, which is much faster than processing many short
+    traces one by one. Results are identical to those of the corresponding
+    :py:class:`Trace` methods.
+
+    :param codes: list of ``(network, station, location, channel)`` tuples,
+        one for each row of ``data``
+    :param tmin: time of first sample of all traces [s]
+    :param deltat: sampling interval [s]
+    :param data: 2D NumPy array with the samples, one trace per row
+    '''
+
+    def __init__(self, codes, tmin, deltat, data):
+        data = num.asarray(data)
+        if data.ndim != 2 or data.shape[0] != len(codes):
+            raise ValueError(
+                'TraceArray: data must be a 2D array with one row per trace')
+
+        self.codes = [tuple(c) for c in codes]
+        self.tmin = tmin
+        self.deltat = deltat
+        self.data = data
+
+    @classmethod
+    def from_traces(cls, traces, chop=False):
+        '''
+        Create :py:class:`TraceArray` from a list of traces.
+
+        :param traces: list of :py:class:`Trace` objects with equal sampling
+            rate
+        :param chop: if ``True``, cut all traces to their common time span,
+            otherwise, the traces must have identical time spans.
+
+        A :py:exc:`MisalignedTraces` exception is raised if the traces have
+        different sampling rates, if their samples are not aligned, or, when
+        ``chop`` is ``False``, if their time spans differ. :py:exc:`NoData`
+        is raised if no traces are given or if they do not overlap.
+        '''
+
+        if not traces:
+            raise NoData()
+
+        tr0 = traces[0]
+        deltat = tr0.deltat
+        for tr in traces:
+            if not same_sampling_rate(tr0, tr):
+                raise MisalignedTraces(
+                    'TraceArray: sampling rates differ: %g != %g'
+                    % (tr0.deltat, tr.deltat))
+
+        if chop:
+            tmin = max(tr.tmin for tr in traces)
+            tmax = min(tr.tmax for tr in traces)
+            nsamples = int(round((tmax - tmin) / deltat)) + 1
+            if nsamples <= 0:
+                raise NoData()
+        else:
+            tmin = tr0.tmin
+            nsamples = tr0.data_len()
+
+        dtype = num.result_type(*[tr.get_ydata().dtype for tr in traces])
+        data = num.empty((len(traces), nsamples), dtype=dtype)
+        for itr, tr in enumerate(traces):
+            fbeg = (tmin - tr.tmin) / deltat
+            ibeg = int(round(fbeg))
+            if abs(fbeg - ibeg) > 0.01 or ibeg < 0 \
+                    or ibeg + nsamples > tr.data_len():
+
+                raise MisalignedTraces(
+                    'TraceArray: time span of trace %s does not match'
+                    % tr.name())
+
+            data[itr, :] = tr.get_ydata()[ibeg:ibeg+nsamples]
+
+        return cls([tr.nslc_id for tr in traces], tmin, deltat, data)
+
+    def to_traces(self):
+        '''
+        Convert to list of :py:class:`Trace` objects.
+
+        The sample data of the traces are copies of the rows of
+        :py:attr:`data`.
+        '''
+
+        traces = []
+        for codes, ydata in zip(self.codes, self.data):
+            network, station, location, channel = codes
+            traces.append(Trace(
+                network, station, location, channel,
+                tmin=self.tmin, deltat=self.deltat, ydata=ydata.copy()))
+
+        return traces
+
+    @property
+    def ntraces(self):
+        return self.data.shape[0]
+
+    @property
+    def nsamples(self):
+        return self.data.shape[1]
+
+    @property
+    def tmax(self):
+        return self.tmin + (self.nsamples - 1) * self.deltat
+
+    def copy(self):
+        '''
+        Get copy of the trace array.
+        '''
+
+        return TraceArray(
+            list(self.codes), self.tmin, self.deltat, self.data.copy())
+
+    def nyquist_check(self, frequency, intro='Corner frequency', warn=True,
+                      raise_exception=False):
+
+        '''
+        Check if a given frequency is above the Nyquist frequency.
+
+        See :py:meth:`Trace.nyquist_check`.
+        '''
+
+        if frequency >= 0.5/self.deltat:
+            message = '%s (%g Hz) is equal to or higher than nyquist ' \
+                      'frequency (%g Hz). (TraceArray with %i traces)' \
+                % (intro, frequency, 0.5/self.deltat, self.ntraces)
+            if warn:
+                logger.warning(message)
+            if raise_exception:
+                raise AboveNyquist(message)
+
+    def _lfilter(self, b, a, demean):
+        data = self.data.astype(num.float64)
+        if demean:
+            data -= num.mean(data, axis=1)[:, num.newaxis]
+
+        self.data = signal.lfilter(b, a, data, axis=1)
+
+    def lowpass(self, order, corner, nyquist_warn=True,
+                nyquist_exception=False, demean=True):
+
+        '''
+        Apply Butterworth lowpass to all traces.
+
+        See :py:meth:`Trace.lowpass`.
+        '''
+
+        self.nyquist_check(
+            corner, 'Corner frequency of lowpass', nyquist_warn,
+            nyquist_exception)
+
+        (b, a) = _get_cached_filter_coefs(
+            order, [corner*2.0*self.deltat], btype='low')
+
+        self._lfilter(b, a, demean)
+
+    def highpass(self, order, corner, nyquist_warn=True,
+                 nyquist_exception=False, demean=True):
+
+        '''
+        Apply Butterworth highpass to all traces.
+
+        See :py:meth:`Trace.highpass`.
+        '''
+
+        self.nyquist_check(
+            corner, 'Corner frequency of highpass', nyquist_warn,
+            nyquist_exception)
+
+        (b, a) = _get_cached_filter_coefs(
+            order, [corner*2.0*self.deltat], btype='high')
+
+        self._lfilter(b, a, demean)
+
+    def bandpass(self, order, corner_hp, corner_lp, demean=True):
+        '''
+        Apply Butterworth bandpass to all traces.
+
+        See :py:meth:`Trace.bandpass`.
+        '''
+
+        self.nyquist_check(corner_hp, 'Lower corner frequency of bandpass')
+        self.nyquist_check(corner_lp, 'Higher corner frequency of bandpass')
+        (b, a) = _get_cached_filter_coefs(
+            order,
+            [corner*2.0*self.deltat for corner in (corner_hp, corner_lp)],
+            btype='band')
+
+        self._lfilter(b, a, demean)
+
+    def chop(self, tmin, tmax):
+        '''
+        Cut all traces to given time span, in place.
+
+        See :py:meth:`Trace.chop` for the handling of the span limits.
+        '''
+
+        if tmax <= self.tmin-self.deltat or self.tmax+self.deltat < tmin:
+            raise NoData()
+
+        ibeg = max(0, t2ind(tmin-self.tmin, self.deltat))
+        iend = min(self.nsamples, t2ind(tmax-self.tmin, self.deltat))
+        if ibeg >= iend:
+            raise NoData()
+
+        self.data = self.data[:, ibeg:iend].copy()
+        self.tmin = self.tmin + ibeg*self.deltat
+
+    def taper(self, taperer, chop=False):
+        '''
+        Apply a :py:class:`Taper` to all traces, in place.
+
+        :param taperer: instance of :py:class:`Taper` subclass
+        :param chop: if ``True``: exclude tapered parts from the result
+
+        The taper window is evaluated only once and then applied to all
+        traces.
+        '''
+
+        if chop:
+            i, n = taperer.span(self.data[0], self.tmin, self.deltat)
+            self.tmin += i*self.deltat
+            self.data = self.data[:, i:i+n].copy()
+
+        window = num.ones(self.nsamples, dtype=num.float64)
+        taperer(window, self.tmin, self.deltat)
+        if not num.issubdtype(self.data.dtype, num.floating):
+            self.data = self.data.astype(num.float64)
+
+        self.data *= window[num.newaxis, :]
+
+    def downsample(self, ndecimate, snap=False, demean=False):
+        '''
+        Downsample all traces by a given integer factor.
+
+        See :py:meth:`Trace.downsample`.
+        '''
+
+        newdeltat = self.deltat*ndecimate
+        if snap:
+            ilag = int(round(
+                (math.ceil(self.tmin / newdeltat) * newdeltat - self.tmin)
+                / self.deltat))
+        else:
+            ilag = 0
+
+        if snap and ilag > 0 and ilag < self.nsamples:
+            self.tmin += ilag*self.deltat
+
+        data = self.data.astype(num.float64)
+        if demean:
+            data -= num.mean(data, axis=1)[:, num.newaxis]
+
+        b, a, n = util.decimate_coeffs(ndecimate, None, 'fir')
+        data = signal.lfilter(b, a, data, axis=1)
+        self.data = data[:, n//2+ilag::ndecimate].copy()
+        self.deltat = reuse(self.deltat*ndecimate)
+
+    def transfer(self,
+                 tfade=0.,
+                 freqlimits=None,
+                 transfer_function=None,
+                 cut_off_fading=True,
+                 invert=False):
+
+        '''
+        Return new trace array with transfer function applied to all traces.
+
+        The transfer function coefficients are evaluated only once and all
+        traces are transformed together. See :py:meth:`Trace.transfer` for
+        the meaning of the arguments.
+        '''
+
+        if transfer_function is None:
+            transfer_function = FrequencyResponse()
+
+        if self.tmax - self.tmin <= tfade*2.:
+            raise TraceTooShort(
+                'TraceArray too short for fading length setting. '
+                'trace length = %g, fading length = %g'
+                % (self.tmax-self.tmin, tfade))
+
+        ndata = self.nsamples
+        ntrans = nextpow2(ndata*1.2)
+        coefs = _get_tapered_coefs(
+            self.deltat, ntrans, freqlimits, transfer_function, invert=invert)
+
+        data_pad = num.zeros((self.ntraces, ntrans), dtype=num.float)
+        data_pad[:, :ndata] = self.data \
+            - num.mean(self.data, axis=1)[:, num.newaxis]
+
+        if tfade != 0.0:
+            data_pad[:, :ndata] *= _get_cached_fade_taper(
+                tfade, ndata, self.deltat)[num.newaxis, :]
+
+        fdata = num.fft.rfft(data_pad, axis=1)
+        fdata *= coefs[num.newaxis, :]
+        ddata = num.fft.irfft(fdata, n=ntrans, axis=1)
+
+        output = TraceArray(
+            list(self.codes), self.tmin, self.deltat, ddata[:, :ndata])
+
+        if cut_off_fading and tfade != 0.0:
+            try:
+                output.chop(output.tmin+tfade, output.tmax-tfade)
+            except NoData:
+                raise TraceTooShort(
+                    'TraceArray too short for fading length setting. '
+                    'trace length = %g, fading length = %g'
+                    % (self.tmax-self.tmin, tfade))
+        else:
+            output.data = output.data.copy()
+
+        return output
+
+
+class TransferCache(object):
+    '''
+    Bounded cache for the coefficients used by :py:meth:`Trace.transfer`.
+
+    When many traces with the same sampling rate and length are restituted
+    with the same response, the response has to be evaluated only once.
+    Entries are keyed on the contents of the
+    :py:class:`FrequencyResponse` object, so equal responses share their
+    coefficients even if they are distinct objects. Responses which are not
+    :py:class:`FrequencyResponse` objects, or which hold state outside of
+    their guts properties (e.g. plain instance attributes set in a custom
+    subclass), are never cached. Response files
+    read by :py:class:`Evalresp` are assumed not to change while the cache
+    is in use; call :py:meth:`clear` otherwise.
+
+    The least recently used entries are dropped when the total size of the
+    cached arrays exceeds ``maxbytes``. The counters ``hits``, ``misses``
+    and ``evictions`` show the effectiveness of the cache. The cache may be
+    used from several threads.
+    '''
+
+    def __init__(self, maxbytes=64*1024**2):
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        '''
+        Get cached array or compute and store it.
+
+        :param key: hashable key or ``None`` to bypass the cache
+        :param compute: function without arguments computing the array
+        '''
+
+        with self._lock:
+            if key is not None and key in self._entries:
+                self.hits += 1
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                return value
+
+            self.misses += 1
+
+        value = compute()
+        if key is None or value.nbytes > self.maxbytes:
+            return value
+
+        value.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                # computed concurrently by another thread
+                return self._entries[key]
+
+            self._entries[key] = value
+            self._nbytes += value.nbytes
+            while self._nbytes > self.maxbytes:
+                _, value_old = self._entries.popitem(last=False)
+                self._nbytes -= value_old.nbytes
+                self.evictions += 1
+
+        return value
+
+    def clear(self):
+        '''
+        Drop all entries and reset the counters.
+        '''
+
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        '''
+        Get cache statistics as a dict.
+        '''
+
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                entries=len(self._entries),
+                nbytes=self._nbytes)
+
+
+transfer_cache = TransferCache()
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _response_key(obj):
+    if isinstance(obj, Object):
+        names = set(prop.name for prop in obj.T.properties)
+        if not set(vars(obj)).issubset(names):
+            # state not covered by guts properties
+            raise _Uncacheable()
+
+        return (obj.__class__,) + tuple(
+            _response_key(v) for v in obj.T.ivals(obj))
+
+    elif isinstance(obj, (list, tuple)):
+        return tuple(_response_key(v) for v in obj)
+
+    elif isinstance(obj, dict):
+        return ('dict',) + tuple(sorted(
+            ((_response_key(k), _response_key(v)) for (k, v) in obj.items()),
+            key=repr))
+
+    elif isinstance(obj, num.ndarray):
+        return (obj.dtype.str, obj.shape, obj.tobytes())
+
+    else:
+        try:
+            hash(obj)
+        except TypeError:
+            raise _Uncacheable()
+
+        return obj
+
+
+def _get_cached_fade_taper(tfade, ndata, deltat):
+    return transfer_cache.get(
+        ('fade', tfade, ndata, deltat),
+        lambda: costaper(
+            0., tfade, deltat*(ndata-1)-tfade, deltat*ndata, ndata, deltat))
+
+
+def _get_tapered_coefs(
+        deltat, ntrans, freqlimits, transfer_function, invert=False):
+
+    key = None
+    if isinstance(transfer_function, FrequencyResponse):
+        try:
+            key = (
+                'coefs', _response_key(transfer_function), ntrans, deltat,
+                None if freqlimits is None else tuple(freqlimits), invert)
+        except _Uncacheable:
+            pass
+
+    return transfer_cache.get(
+        key,
+        lambda: _compute_tapered_coefs(
+            deltat, ntrans, freqlimits, transfer_function, invert))
+
+
+def _compute_tapered_coefs(
+        deltat, ntrans, freqlimits, transfer_function, invert):
+
+    deltaf = 1./(deltat*ntrans)
+    nfreqs = ntrans//2 + 1
+    transfer = num.ones(nfreqs, dtype=num.complex)
+    hi = snapper(nfreqs, deltaf)
+    if freqlimits is not None:
+        a, b, c, d = freqlimits
+        freqs = num.arange(hi(d)-hi(a), dtype=num.float)*deltaf \
+            + hi(a)*deltaf
+
+        if invert:
+            transfer[hi(a):hi(d)] = 1.0 / transfer_function.evaluate(freqs)
+        else:
+            transfer[hi(a):hi(d)] = transfer_function.evaluate(freqs)
+
+        tapered_transfer = costaper(a, b, c, d, nfreqs, deltaf)*transfer
+    else:
+        freqs = num.arange(nfreqs) * deltaf
+        tapered_transfer = transfer_function.evaluate(freqs)
+
+    tapered_transfer[0] = 0.0  # don't introduce static offsets
+    return tapered_transfer
+
+
 class Taper(Object):
     '''
     Base class for tapers.
@@ -3263,6 +3825,147 @@ def co_lfilter(target, b, a):
         target.close()
 
 
+@coroutine
+def co_butterworth(target, order, corners, btype):
+    '''
+    Successively filter broken continuous trace data with a Butterworth filter
+    (coroutine).
+
+    Like :py:func:`co_lfilter`, but the filter coefficients are derived from
+    the corner frequencies for the sampling rate of each input trace. Unlike
+    :py:meth:`Trace.lowpass` and friends, the mean is not removed, because
+    this would introduce steps at trace boundaries.
+
+    :param order: order of the filter
+    :param corners: list of corner frequencies, one for ``'low'`` and
+        ``'high'`` filters, two for ``'band'`` filters
+    :param btype: filter type, ``'low'``, ``'high'`` or ``'band'``
+    '''
+
+    filters = {}
+    try:
+        while True:
+            tr = (yield)
+            if tr.deltat not in filters:
+                for corner in corners:
+                    tr.nyquist_check(corner, 'Corner frequency of filter')
+
+                b, a = _get_cached_filter_coefs(
+                    order, [corner*2.0*tr.deltat for corner in corners],
+                    btype=btype)
+
+                filters[tr.deltat] = co_lfilter(target, b, a)
+
+            filters[tr.deltat].send(tr)
+
+    except GeneratorExit:
+        for g in filters.values():
+            g.close()
+
+        target.close()
+
+
+def co_lowpass(target, order, corner):
+    '''
+    Successively lowpass filter broken continuous trace data (coroutine).
+
+    See :py:func:`co_butterworth`.
+    '''
+
+    return co_butterworth(target, order, [corner], 'low')
+
+
+def co_highpass(target, order, corner):
+    '''
+    Successively highpass filter broken continuous trace data (coroutine).
+
+    See :py:func:`co_butterworth`.
+    '''
+
+    return co_butterworth(target, order, [corner], 'high')
+
+
+def co_bandpass(target, order, corner_hp, corner_lp):
+    '''
+    Successively bandpass filter broken continuous trace data (coroutine).
+
+    See :py:func:`co_butterworth`.
+    '''
+
+    return co_butterworth(target, order, [corner_hp, corner_lp], 'band')
+
+
+@coroutine
+def co_sta_lta(target, tshort, tlong, quad=True, scalingmethod=1):
+    '''
+    Successively compute STA/LTA of broken continuous trace data (coroutine).
+
+    The short and long time windows both end at the output sample, so the
+    result only depends on past samples. The last samples of each channel are
+    kept, so that the averages continue seamlessly across trace boundaries.
+    After a reset (gaps, start), output starts when enough samples for the
+    long time window have been seen.
+
+    :param tshort: length of short time window in [s]
+    :param tlong: length of long time window in [s]
+    :param quad: whether to square the data prior to applying the STA/LTA
+        filter
+    :param scalingmethod: integer key to select how output values are
+        scaled / normalized (``1``, ``2``, or ``3``), see
+        :py:meth:`Trace.sta_lta_right`
+    '''
+
+    if scalingmethod not in (1, 2, 3):
+        raise Exception('Invalid argument to scalingrange argument.')
+
+    try:
+        states = States()
+        while True:
+            tr = (yield)
+
+            nshort = max(1, int(round(tshort/tr.deltat)))
+            nlong = max(1, int(round(tlong/tr.deltat)))
+            assert nshort < nlong
+
+            ydata = tr.get_ydata().astype(num.float64)
+            if quad:
+                ydata **= 2
+
+            history = states.get(tr)
+            if history is None or history.size > nlong - 1:
+                history = num.zeros(0)
+
+            x = num.concatenate((history, ydata))
+            states.set(tr, x[-(nlong-1):].copy())
+
+            ifirst = max(nlong - 1, history.size)
+            if x.size <= ifirst:
+                continue
+
+            cx = num.zeros(x.size + 1)
+            num.cumsum(x, out=cx[1:])
+            i = num.arange(ifirst, x.size)
+            mavg_short = (cx[i+1] - cx[i+1-nshort]) / nshort
+            mavg_long = (cx[i+1] - cx[i+1-nlong]) / nlong
+
+            if scalingmethod == 1:
+                ydata_out = mavg_short/mavg_long * nshort/nlong
+            elif scalingmethod in (2, 3):
+                ydata_out = (mavg_short/mavg_long - 1.) \
+                    / ((float(nlong)/float(nshort)) - 1)
+
+            if scalingmethod == 3:
+                ydata_out = num.maximum(ydata_out, 0.)
+
+            output = tr.copy(data=False)
+            output.tmin = tr.tmin + (ifirst - history.size) * tr.deltat
+            output.set_ydata(ydata_out)
+            target.send(output)
+
+    except GeneratorExit:
+        target.close()
+
+
 def co_antialias(target, q, n=None, ftype='fir'):
     b, a, n = util.decimate_coeffs(q, n, ftype)
     anti = co_lfilter(target, b, a)
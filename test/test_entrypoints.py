@@ -65,6 +65,68 @@ def test_jackseis():
     _run_main(jackseis, test_arguments)
 
 
+def test_jackseis_parallel():
+    from pyrocko.apps import jackseis
+    from pyrocko import io, trace
+    import tempfile
+    import shutil
+    import os
+    import numpy as num
+
+    tempdir = tempfile.mkdtemp(prefix='pyrocko')
+    try:
+        traces = [
+            trace.Trace(
+                'N', 'STA%i' % ista, '', 'Z',
+                tmin=ista*0.5, deltat=0.01,
+                ydata=num.random.randint(-1000, 1000, size=100000).astype(
+                    num.int32))
+            for ista in range(3)]
+
+        fn_in = os.path.join(tempdir, 'data.mseed')
+        io.save(traces, fn_in)
+
+        outputs = []
+        for nprocs in (1, 3):
+            output_dir = os.path.join(tempdir, 'out%i' % nprocs)
+            _run_main(jackseis, [[
+                fn_in, '--quiet', '--tinc=100', '--downsample=20',
+                '--cache=%s' % os.path.join(tempdir, 'cache'),
+                '--parallel=%i' % nprocs, '--output-dir=%s' % output_dir]])
+
+            outputs.append(dict(
+                (fn, io.load(os.path.join(output_dir, fn)))
+                for fn in os.listdir(output_dir)))
+
+        # output files shared by all time windows
+        for nprocs in (1, 3):
+            output_dir = os.path.join(tempdir, 'out_shared%i' % nprocs)
+            _run_main(jackseis, [[
+                fn_in, '--quiet', '--tinc=100', '--downsample=20',
+                '--cache=%s' % os.path.join(tempdir, 'cache'),
+                '--parallel=%i' % nprocs, '--prefetch=2',
+                '--output-dir=%s' % output_dir,
+                '--output=%(network)s.%(station)s.mseed']])
+
+            outputs.append(dict(
+                (fn, io.load(os.path.join(output_dir, fn)))
+                for fn in os.listdir(output_dir)))
+
+        assert len(outputs[0]) == 3 * 10 + 2
+        assert len(outputs[2]) == 3
+        for output_a, output_b in [outputs[0:2], outputs[2:4]]:
+            assert sorted(output_a.keys()) == sorted(output_b.keys())
+            for fn, trs in output_a.items():
+                assert len(trs) == len(output_b[fn])
+                for tr_a, tr_b in zip(trs, output_b[fn]):
+                    assert tr_a.nslc_id == tr_b.nslc_id
+                    assert tr_a.tmin == tr_b.tmin
+                    num.testing.assert_equal(tr_a.ydata, tr_b.ydata)
+
+    finally:
+        shutil.rmtree(tempdir)
+
+
 def test_snuffler():
     from pyrocko.apps import snuffler
 
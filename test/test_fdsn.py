@@ -49,6 +49,132 @@ class FDSNStationTestCase(unittest.TestCase):
             for s in new.get_pyrocko_stations():
                 assert len(s.get_channels()) == 3
 
+    def make_stationxml(self, nstations):
+        presponse = trace.PoleZeroResponse(
+            zeros=[0j, 0j],
+            poles=[-0.037+0.037j, -0.037-0.037j, -250.+0j],
+            constant=6e8)
+
+        stations = []
+        for ista in range(nstations):
+            channels = []
+            for cha in ('HHZ', 'HHN', 'HHE'):
+                channels.append(stationxml.Channel(
+                    code=cha,
+                    location_code='',
+                    latitude=stationxml.Latitude(10.),
+                    longitude=stationxml.Longitude(20.),
+                    elevation=stationxml.Distance(0.),
+                    depth=stationxml.Distance(0.),
+                    sample_rate=stationxml.SampleRate(100.),
+                    response=stationxml.Response.from_pyrocko_pz_response(
+                        presponse, 'M/S', 'COUNTS')))
+
+            stations.append(stationxml.Station(
+                code='S%03i' % ista,
+                latitude=stationxml.Latitude(10.),
+                longitude=stationxml.Longitude(20.),
+                elevation=stationxml.Distance(0.),
+                channel_list=channels))
+
+        sx = stationxml.FDSNStationXML(
+            source='test',
+            created=stt('2017-01-01 00:00:00'),
+            network_list=[stationxml.Network(
+                code='XX', station_list=stations)])
+
+        sx.validate()
+        return sx.dump_xml()
+
+    def test_load_skip_responses(self):
+        s = self.make_stationxml(10)
+        x = stationxml.load_xml(string=s)
+        x_skip = stationxml.load_xml(string=s, skip_responses=True)
+
+        assert x.dump_xml() == s
+
+        for sx in (x, x_skip):
+            pstations = sx.get_pyrocko_stations()
+            assert len(pstations) == 10
+            for pstation in pstations:
+                assert len(pstation.get_channels()) == 3
+
+        for network in x_skip.network_list:
+            for station in network.station_list:
+                for channel in station.channel_list:
+                    assert channel.response is None
+
+    def test_load_cached(self):
+        import os
+        import shutil
+        from pyrocko.io import object_cache
+        s = self.make_stationxml(2)
+        cachedir = tempfile.mkdtemp(prefix='pyrocko')
+        try:
+            with tempfile.NamedTemporaryFile(suffix='.xml', mode='w') as f:
+                f.write(s)
+                f.flush()
+
+                x1 = stationxml.load_xml(filename=f.name, cache=cachedir)
+                x2 = stationxml.load_xml(filename=f.name, cache=cachedir)
+                assert x1 is not x2
+                assert x1.dump_xml() == x2.dump_xml() == s
+
+                ocache = object_cache.get_cache(cachedir)
+                key = 'stationxml:%r' % ([],)
+                assert ocache.get(f.name, key).dump_xml() == s
+
+                x3 = stationxml.load_xml(
+                    filename=f.name, cache=cachedir, skip_responses=True)
+                assert x3.network_list[0].station_list[0].channel_list[0] \
+                    .response is None
+
+                f.seek(0)
+                f.write(s.replace('S000', 'S0000'))
+                f.flush()
+                assert ocache.get(f.name, key) is None
+
+                x4 = stationxml.load_xml(filename=f.name, cache=cachedir)
+                assert x4.network_list[0].station_list[0].code == 'S0000'
+
+                # objects exceeding the size limit are not stored
+                ocache = object_cache.ObjectFileCache(cachedir, nbytes_max=0)
+                ocache.put(f.name, x4, 'other')
+                assert ocache.get(f.name, 'other') is None
+                assert len(os.listdir(cachedir)) == 2
+
+                # older entries are evicted, the new one is kept
+                nbytes = max(
+                    os.path.getsize(os.path.join(cachedir, fn))
+                    for fn in os.listdir(cachedir))
+
+                ocache = object_cache.ObjectFileCache(
+                    cachedir, nbytes_max=nbytes)
+                ocache.put(f.name, x4, 'other')
+                assert ocache.get(f.name, 'other') is not None
+                assert len(os.listdir(cachedir)) == 1
+
+                # unusable cache directory falls back to uncached loading
+                blocker = os.path.join(cachedir, 'file')
+                with open(blocker, 'w'):
+                    pass
+
+                x5 = stationxml.load_xml(
+                    filename=f.name, cache=os.path.join(blocker, 'sub'))
+                assert x5.network_list[0].station_list[0].code == 'S0000'
+
+        finally:
+            shutil.rmtree(cachedir)
+
+    def benchmark_load(self):
+        import time
+        s = self.make_stationxml(1000)
+        for skip_responses in (False, True):
+            t0 = time.time()
+            stationxml.load_xml(string=s, skip_responses=skip_responses)
+            print('skip_responses=%s: %g s' % (
+                skip_responses, time.time() - t0))
+
     @common.require_internet
     def test_retrieve(self):
         for site in ['geofon', 'iris']:
@@ -1,6 +1,7 @@
 from __future__ import division, print_function, absolute_import
 from builtins import range, next
 
+import os
 import time
 import sys
 import random
@@ -450,6 +451,236 @@ class GFTestCase(unittest.TestCase):
 
         store.close()
 
+    def test_compress(self):
+        nrecords = 20
+        num.random.seed(0)
+
+        d = mkdtemp(prefix='gfstore')
+        self.tempdirs.append(d)
+        gf.BaseStore.create(d, 1.0, nrecords, force=True)
+        store = gf.BaseStore(d, mode='w')
+        datas = []
+        for i in range(nrecords):
+            n = [0, 2, 50, 64, 65, 1000][i % 6]
+            data = num.cumsum(num.random.normal(size=n)) \
+                * 10.0**num.random.uniform(-20, 5)
+            data[n//2:n//2+3] *= 1e4
+            data = data.astype(gf.gf_dtype)
+            datas.append(data)
+            store.put(i, gf.GFTrace(data=data, itmin=i))
+
+        store.close()
+
+        accuracy = 1e-5
+        store = gf.BaseStore(d)
+        size_uncompressed = store.size_data
+        store.compress(accuracy=accuracy)
+
+        store = gf.BaseStore(d)
+        assert store.size_data < size_uncompressed
+        assert store.stats()['compressed'] == sum(
+            data.size > 2 for data in datas)
+
+        datas_compressed = []
+        for i in range(nrecords):
+            tra = store.get(i, implementation='c')
+            trb = store.get(i, implementation='python')
+            self.assertEqual(tra.itmin, i)
+            self.assertEqual(tra.data.size, datas[i].size)
+            num.testing.assert_equal(tra.data, trb.data)
+            if tra.data.size:
+                self.assertEqual(tra.begin_value, tra.data[0])
+                self.assertEqual(tra.end_value, tra.data[-1])
+                amax = num.max(num.abs(datas[i]))
+                assert num.all(
+                    num.abs(tra.data - datas[i]) <= 0.51 * accuracy * amax)
+
+            datas_compressed.append(tra.data)
+
+        indices = num.arange(nrecords)
+        weights = num.random.random(nrecords)
+        shifts = num.random.random(nrecords)*nrecords
+        a = store.sum(indices, shifts, weights)
+        b = store.sum(indices, shifts, weights, implementation='reference')
+        self.assertEqual(a.itmin, b.itmin)
+        num.testing.assert_allclose(a.data, b.data, rtol=1e-5)
+
+        store.decompress()
+        store = gf.BaseStore(d)
+        assert store.stats()['compressed'] == 0
+        for i in range(nrecords):
+            num.testing.assert_equal(
+                store.get(i).data, datas_compressed[i])
+
+    def test_record_cache(self):
+        nrecords = 50
+        nsamples = 100
+        num.random.seed(0)
+
+        d = mkdtemp(prefix='gfstore')
+        self.tempdirs.append(d)
+        gf.BaseStore.create(d, 1.0, nrecords, force=True)
+        store = gf.BaseStore(d, mode='w')
+        for i in range(nrecords):
+            data = num.cumsum(num.random.normal(size=nsamples))
+            store.put(i, gf.GFTrace(data=data, itmin=i))
+
+        store.close()
+
+        nbytes_record = nsamples * 4
+        try:
+            for compressed in (False, True):
+                if compressed:
+                    gf.BaseStore(d).compress()
+
+                gf.store.configure_record_cache(
+                    nbytes_max=10*nbytes_record, readahead=5*nbytes_record)
+
+                store_ref = gf.BaseStore(d)
+                store = gf.BaseStore(d, use_memmap=False)
+
+                store.get(0)
+                stats = store.stats()
+                assert stats['cache_misses'] == 1
+                assert stats['cache_readahead'] >= 3
+
+                store.get(1)
+                assert store.stats()['cache_hits'] == 1
+
+                for i in range(nrecords):
+                    num.testing.assert_equal(
+                        store.get(i).data, store_ref.get(i).data)
+
+                stats = store.stats()
+                assert 0 < stats['cache_size'] <= 10*nbytes_record
+                assert stats['cache_evictions'] > 0
+                assert stats['cache_misses'] < nrecords // 2
+
+                indices = num.random.randint(nrecords, size=200)
+                weights = num.random.random(indices.size)
+                shifts = num.random.random(indices.size) * nrecords
+                a = store.sum(indices, shifts, weights)
+                b = store_ref.sum(indices, shifts, weights)
+                self.assertEqual(a.itmin, b.itmin)
+                num.testing.assert_equal(a.data, b.data)
+
+                assert store.stats()['cache_size'] <= 10*nbytes_record
+
+        finally:
+            gf.store.configure_record_cache()
+
+    def _dummy_build_config(self):
+        return gf.meta.ConfigTypeA(
+            id='dummy_shards',
+            ncomponents=2,
+            component_scheme='elastic2',
+            sample_rate=1.0,
+            source_depth_min=0*km,
+            source_depth_max=8*km,
+            source_depth_delta=4*km,
+            distance_min=4*km,
+            distance_max=200*km,
+            distance_delta=4*km,
+            modelling_code_id='dummy')
+
+    def _check_dummy_build(self, store_dir):
+        assert not os.path.exists(gf.builder.shard_dir(store_dir))
+        store = gf.BaseStore(store_dir)
+        assert store.get(0).is_zero
+        for irecord in range(1, store._nrecords):
+            tr = store.get(irecord)
+            assert tr.data.size == 10000
+            assert num.all(tr.data == float(irecord))
+
+        store.close()
+
+    def test_build_shards(self):
+        from pyrocko.fomosto import dummy
+
+        config = self._dummy_build_config()
+        check = self._check_dummy_build
+
+        store_dir = mkdtemp(prefix='gfstore')
+        self.tempdirs.append(store_dir)
+        gf.Store.create_editables(store_dir, config=config)
+        dummy.build(store_dir, nworkers=2)
+        check(store_dir)
+
+        # emulate an interrupted build, with one finished but unmerged block
+        store_dir = mkdtemp(prefix='gfstore')
+        self.tempdirs.append(store_dir)
+        gf.Store.create_editables(store_dir, config=config)
+        gf.Store.create_dependants(store_dir)
+
+        builder = dummy.DummyGFBuilder(store_dir, 0, {})
+        assert builder.nblocks > 1
+        util.ensuredir(gf.builder.shard_dir(store_dir))
+        shard = builder.store.open_shard(
+            gf.builder.shard_path(store_dir, 0, 1))
+        builder.work_block(1)
+        with self.assertRaises(gf.DuplicateInsert):
+            builder.store.put(
+                (4*km, 4*km, 0), gf.GFTrace(data=num.ones(10), itmin=0))
+
+        builder.store.close_shard()
+        builder.store.close()
+        assert shard.nrecords > 0
+
+        with open(os.path.join(store_dir, '.status'), 'w') as f:
+            f.write('0 1\n')
+
+        dummy.build(store_dir, continue_=True, nworkers=1)
+        check(store_dir)
+
+    def test_build_schedule(self):
+        from pyrocko.fomosto import dummy
+
+        config = self._dummy_build_config()
+        builder = gf.builder.Builder(config, 0, block_size=(1, 10))
+        nblocks = builder.nblocks
+        assert nblocks == 15
+
+        # without timings, blocks at larger distances come first
+        items = gf.builder.schedule_blocks(builder, {})
+        assert len(items) == nblocks
+        assert all(nsub == 1 for (_, _, nsub) in items)
+        assert items[0][0] % 5 == 4
+        assert items[-1][0] % 5 == 0
+
+        # slow blocks at second source depth
+        done = {
+            (0, 0, 0, 1): 1.0,
+            (0, 5, 0, 1): 100.0,
+            (0, 10, 0, 1): None}
+
+        items = gf.builder.schedule_blocks(builder, done)
+        assert len(items) == nblocks - 3
+        assert set(i for (i, _, _) in items[:4]) == set([6, 7, 8, 9])
+
+        # split blocks still cover every node exactly once
+        items = gf.builder.schedule_blocks(builder, {}, nprocs=8, split=True)
+        assert any(nsub > 1 for (_, _, nsub) in items)
+        covered = num.zeros(tuple(config.ns), dtype=int)
+        for (iblock, isub, nsub) in items:
+            builder.set_part(isub, nsub)
+            ibegins, iends = builder.get_block(iblock)
+            assert iends[-1] - ibegins[-1] >= 2
+            covered[ibegins[0]:iends[0], ibegins[1]:iends[1]] += 1
+
+        builder.set_part(0, 1)
+        assert num.all(covered == 1)
+
+        # partitioning of partially finished blocks is kept
+        items = gf.builder.schedule_blocks(
+            builder, {(0, 4, 0, 2): 1.0}, nprocs=8, split=True)
+        assert [item for item in items if item[0] == 4] == [(4, 1, 2)]
+
+        store_dir = mkdtemp(prefix='gfstore')
+        self.tempdirs.append(store_dir)
+        gf.Store.create_editables(store_dir, config=config)
+        dummy.build(store_dir, nworkers=4)
+        self._check_dummy_build(store_dir)
+
     def test_store_dir_type(self):
         with self.assertRaises(TypeError):
             gf.LocalEngine(store_dirs='dummy')
@@ -509,6 +740,90 @@ class GFTestCase(unittest.TestCase):
 
             self.assertTrue(numeq(data, tr.ydata, 0.01))
 
+    def test_process_parallel(self):
+        store_dir = self.get_pulse_store_dir()
+        engine = gf.LocalEngine(store_dirs=[store_dir])
+
+        sources = [
+            gf.ExplosionSource(
+                time=0.0,
+                depth=depth,
+                moment=1.0)
+
+            for depth in [100., 200., 300.]
+        ]
+
+        targets = [
+            gf.Target(
+                codes=('', 'STA%i' % ista, '', component),
+                north_shift=500. + ista * 50.,
+                east_shift=100.)
+
+            for component in 'ZNE' for ista in range(4)
+        ]
+
+        resp_serial = engine.process(sources, targets, nthreads=1)
+        resp_parallel = engine.process(sources, targets, nthreads=2)
+
+        for (s1, t1, tr1), (s2, t2, tr2) in zip(
+                resp_serial.iter_results(), resp_parallel.iter_results()):
+
+            self.assertEqual(t1.codes, t2.codes)
+            self.assertEqual(tr1.tmin, tr2.tmin)
+            self.assertTrue(numeq(tr1.ydata, tr2.ydata, 0.0001))
+
+    def test_dsource_cache(self):
+        store_dir = self.get_pulse_store_dir()
+        engine = gf.LocalEngine(store_dirs=[store_dir])
+
+        source = gf.RectangularExplosionSource(
+            depth=200., moment=1.0, length=100., width=0.)
+
+        targets = [
+            gf.Target(
+                codes=('', 'STA', '', component),
+                north_shift=500.,
+                east_shift=125.)
+
+            for component in 'ZNE']
+
+        resp1 = engine.process(source, targets)
+        self.assertEqual(resp1.stats.n_dsource_cache_hits, 0)
+        self.assertEqual(resp1.stats.n_dsource_cache_misses, 1)
+
+        resp2 = engine.process(source.clone(), targets)
+        self.assertEqual(resp2.stats.n_dsource_cache_hits, 1)
+        self.assertEqual(resp2.stats.n_dsource_cache_misses, 0)
+
+        for tr1, tr2 in zip(resp1.pyrocko_traces(), resp2.pyrocko_traces()):
+            self.assertTrue(numeq(tr1.ydata, tr2.ydata, 0.0001))
+
+        source.depth = 300.
+        resp3 = engine.process(source, targets)
+        self.assertEqual(resp3.stats.n_dsource_cache_misses, 1)
+
+        # sources discretized in worker processes are kept in the parent
+        sources = [
+            gf.RectangularExplosionSource(
+                depth=depth, moment=1.0, length=100., width=0.)
+            for depth in [400., 500.]]
+
+        resp4 = engine.process(sources, targets, nthreads=2)
+        self.assertEqual(resp4.stats.n_dsource_cache_hits, 0)
+        self.assertEqual(resp4.stats.n_dsource_cache_misses, 2)
+
+        resp5 = engine.process(
+            [s.clone() for s in sources], targets, nthreads=2)
+        self.assertEqual(resp5.stats.n_dsource_cache_hits, 2)
+        self.assertEqual(resp5.stats.n_dsource_cache_misses, 0)
+
+        engine_nocache = gf.LocalEngine(
+            store_dirs=[store_dir], dsource_cache_size=0)
+
+        for _ in range(2):
+            resp = engine_nocache.process(source, targets)
+            self.assertEqual(resp.stats.n_dsource_cache_hits, 0)
+
     def test_pulse_decimate(self):
         store_dir = self.get_pulse_store_dir()
 
@@ -709,6 +1024,55 @@ class GFTestCase(unittest.TestCase):
             self.assertEqual(tr1.tmin, tr2.tmin)
             self.assertTrue(numeq(tr1.ydata, tr2.ydata, 0.0001))
 
+    def test_seismograms_multi(self):
+        store_dir = self.get_pulse_store_dir()
+        engine = gf.LocalEngine(store_dirs=[store_dir])
+        store = engine.get_store('pulse')
+
+        source = gf.RectangularExplosionSource(
+            time=0.0025,
+            depth=200.,
+            moment=1.0,
+            length=100.,
+            width=0.,
+            nucleation_x=-1)
+
+        targets = [
+            gf.Target(
+                north_shift=north_shift,
+                east_shift=125.,
+                depth=depth,
+                interpolation='multilinear')
+
+            for north_shift in [300., 500., 700.] for depth in [0., 5., 10.]]
+
+        dsource = source.discretize_basesource(store, targets[0])
+        receivers = [target.receiver(store) for target in targets]
+        components = gf.meta.component_scheme_to_description[
+            store.config.component_scheme].provided_components
+
+        for optimization in ('disable', 'enable'):
+            for nthreads in (1, 2):
+                gtrss = store.seismograms(
+                    dsource, receivers, components,
+                    interpolation='multilinear',
+                    optimization=optimization,
+                    nthreads=nthreads)
+
+                for receiver, gtrs in zip(receivers, gtrss):
+                    gtrs_ref = store.seismogram(
+                        dsource, receiver, components,
+                        interpolation='multilinear',
+                        optimization=optimization)
+
+                    for component in components:
+                        gtr = gtrs[component]
+                        gtr_ref = gtrs_ref[component]
+                        self.assertEqual(gtr.itmin, gtr_ref.itmin)
+                        self.assertEqual(gtr.data.size, gtr_ref.data.size)
+                        self.assertTrue(
+                            numeq(gtr.data, gtr_ref.data, 0.0001))
+
     def test_timing_defs(self):
 
         for s, d in [
@@ -779,6 +1143,37 @@ class GFTestCase(unittest.TestCase):
             store.t('{cake:P}', args) + store.t('{vel_surface:10}', args),
             0.1)
 
+    def test_timing_many(self):
+        store_dir = self.get_regional_ttt_store_dir()
+
+        store = gf.Store(store_dir)
+
+        num.random.seed(23)
+        n = 200
+        depths = num.random.uniform(0., 20*km, n)
+        distances = num.random.uniform(1000*km, 2000*km, n)
+        depths[:2] = 0., 20*km
+        distances[:2] = 1000*km, 2000*km
+
+        for timing in ['P', 'pS', 'first(S|P)', 'last(S|P)', '(pS|P)',
+                       '{stored:P}-10', 'vel_surface:15', '+0.1S',
+                       '{stored:S}+0.1S']:
+
+            times = store.t(timing, (depths, distances))
+            assert times.shape == (n,)
+            times_ref = []
+            for args in zip(depths, distances):
+                t = store.t(timing, args)
+                times_ref.append(t if t is not None else num.nan)
+
+            num.testing.assert_allclose(times, times_ref, rtol=1e-10)
+
+        times = store.t('P', (10*km, distances[:5, num.newaxis]))
+        assert times.shape == (5, 1)
+
+        with self.assertRaises(gf.OutOfBounds):
+            store.t('P', (depths, distances + 1000*km))
+
     def dummy_store(self):
         if self._dummy_store is None:
 
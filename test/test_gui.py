@@ -231,6 +231,65 @@ class GUITest(unittest.TestCase):
         self.viewer.set_time_range(0., None)
         self.viewer.set_time_range(None, 0.)
 
+    def test_background_processing(self):
+        v = self.viewer
+        tmin, tmax = v.get_time_range()
+
+        def key(traces):
+            return sorted(
+                (tr.nslc_id, tr.tmin, tr.data_len()) for tr in traces)
+
+        v.clean_update()
+        traces_sync = v.prepare_cutout2(tmin, tmax)
+
+        v.clean_update()
+        for i in range(100):
+            v.prepare_cutout2(tmin, tmax, background=True)
+            if v.cutout_request.done:
+                break
+
+            QTest.qWait(100)
+
+        assert v.cutout_request.done
+        traces_async = v.prepare_cutout2(tmin, tmax, background=True)
+        assert key(traces_sync) == key(traces_async)
+
+    def test_background_processing_modified_pile(self):
+        import shutil
+        v = self.viewer
+        tmin, tmax = v.get_time_range()
+
+        tempdir = tempfile.mkdtemp()
+        fn = os.path.join(tempdir, 'test2.mseed')
+        shutil.copy(common.test_data_file('test2.mseed'), fn)
+        v.load([fn])
+
+        # worker chops while the pile is reloaded and modified
+        v.clean_update()
+        for i in range(20):
+            v.prepare_cutout2(tmin, tmax, background=True)
+            mtime = os.stat(fn)[8] + 1
+            os.utime(fn, (mtime, mtime))
+            assert v.pile.reload_modified()
+            ticket = v.add_traces([trace.Trace(
+                'XX', 'MEM', '', 'HHZ', tmin=tmin, deltat=1.0,
+                ydata=num.zeros(100))])
+            v.release_data([ticket])
+            QTest.qWait(10)
+
+        for i in range(100):
+            v.prepare_cutout2(tmin, tmax, background=True)
+            if v.cutout_request.done:
+                break
+
+            QTest.qWait(100)
+
+        assert v.cutout_request.done
+
+        v.pile.remove_files(
+            [file for file in v.pile.iter_files() if file.abspath == fn])
+        shutil.rmtree(tempdir)
+
     def test_follow(self):
         self.viewer.follow(10.)
         self.viewer.unfollow()
@@ -96,6 +96,102 @@ class IOTestCase(unittest.TestCase):
 
         os.remove(tempfn)
 
+    def testMSeedRecordIndex(self):
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        ydata = num.random.randint(-2**20, 2**20, 100000).astype(num.int32)
+        tr = trace.Trace('XX', 'STA', '', 'HHZ', tmin=tmin, deltat=0.01,
+                         ydata=ydata)
+
+        fn = pjoin(self.tmpdir, 'test.mseed')
+        io.save([tr], fn)
+
+        index = mseed.get_record_index(fn)
+        assert index.size > 10
+        assert num.all(index['offset'] == num.arange(index.size) * 4096)
+        assert num.all(index['reclen'] == 4096)
+        assert abs(index['tmin'][0] - tr.tmin) < 1e-6
+        assert abs(index['tmax'][-1] - tr.tmax) < 1e-6
+
+        tr2, = mseed.iload(fn, records=index[3:5])
+        i = int(round((index['tmin'][3] - tr.tmin) / tr.deltat))
+        assert abs(tr2.tmin - index['tmin'][3]) < 1e-6
+        assert num.all(tr2.ydata == ydata[i:i+tr2.ydata.size])
+
+    def testMSeedMMap(self):
+        from pyrocko import mseed_ext
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        for dtype in (num.float32, num.float64):
+            ydata = num.random.normal(size=20000).astype(dtype)
+            trs = [
+                trace.Trace('XX', 'STA', '', 'HHZ', tmin=tmin+i*0.01,
+                            deltat=0.01, ydata=ydata[i:i+5000])
+                for i in (15000, 10000, 0)]
+
+            trs.append(trace.Trace('XX', 'STA', '', 'HHN', tmin=tmin,
+                                   deltat=0.01, ydata=ydata))
+
+            fn = pjoin(self.tmpdir, 'test.mseed')
+            io.save(trs, fn)
+
+            trtups = mseed._get_traces_mmap(fn)
+            trtups_ref = mseed_ext.get_traces(fn, True)
+            assert len(trtups) == len(trtups_ref) == 3
+            for a, b in zip(trtups, trtups_ref):
+                assert a[:8] == b[:8]
+                assert a[8].dtype == b[8].dtype == dtype
+                num.testing.assert_equal(a[8], b[8])
+
+            trs_load = sorted(
+                (tr for tr in mseed.iload(fn) if tr.channel == 'HHZ'),
+                key=lambda tr: tr.tmin)
+
+            num.testing.assert_equal(trs_load[0].ydata, ydata[:5000])
+            num.testing.assert_equal(trs_load[1].ydata, ydata[10000:])
+
+        trs[0].set_ydata(num.arange(100, dtype=num.int32))
+        io.save(trs[:1], fn)
+        assert mseed._get_traces_mmap(fn) is None
+
+    def testMSeedWriter(self):
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        ydata = num.random.randint(-2**20, 2**20, 30000).astype(num.int32)
+        template = pjoin(self.tmpdir, 'writer', '%(station)s.mseed')
+
+        for record_length in (512, 4096):
+            writer = mseed.MSeedWriter(
+                template, record_length=record_length, max_open_files=1)
+
+            with writer:
+                for i in range(3):
+                    for sta in ('STA1', 'STA2'):
+                        tr = trace.Trace(
+                            'XX', sta, '', 'HHZ',
+                            tmin=tmin + i*100., deltat=0.01,
+                            ydata=ydata[i*10000:(i+1)*10000])
+
+                        writer.write(tr)
+
+            for sta in ('STA1', 'STA2'):
+                fn = template % dict(station=sta)
+                index = mseed.get_record_index(fn)
+                assert num.all(index['reclen'] == record_length)
+
+                tr, = io.load(fn)
+                num.testing.assert_equal(tr.ydata, ydata)
+
+        with self.assertRaises(io.FileSaveError):
+            mseed.MSeedWriter(template, overwrite=False).write(tr)
+
+        # filenames with start time do not recur, files are not kept open
+        template = pjoin(self.tmpdir, 'writer', '%(station)s_%(tmin)s.mseed')
+        with mseed.MSeedWriter(template) as writer:
+            fns = writer.write(tr)
+            assert not writer._files
+            assert not writer._created
+
+        tr2, = io.load(fns[0])
+        num.testing.assert_equal(tr2.ydata, tr.ydata)
+
     def testReadSac(self):
         fpath = common.test_data_file('test1.sac')
         tr = io.load(fpath, format='sac')[0]
@@ -201,6 +297,49 @@ class IOTestCase(unittest.TestCase):
         assert len(events) == 2
         assert events[0].moment_tensor is not None
 
+    def testQuakeMLSkipPicks(self):
+        s = '''<?xml version="1.0" encoding="UTF-8"?>
+<q:quakeml xmlns="http://quakeml.org/xmlns/bed/1.2"
+           xmlns:q="http://quakeml.org/xmlns/quakeml/1.2">
+  <eventParameters publicID="smi:local/catalog">
+    <event publicID="smi:local/event/1">
+      <preferredOriginID>smi:local/origin/1</preferredOriginID>
+      <origin publicID="smi:local/origin/1">
+        <time><value>2017-01-01T00:00:10.500000Z</value></time>
+        <latitude><value>10.5</value></latitude>
+        <longitude><value>20.5</value></longitude>
+        <depth><value>10000.0</value></depth>
+        <arrival publicID="smi:local/arrival/1">
+          <pickID>smi:local/pick/1</pickID>
+          <phase>P</phase>
+        </arrival>
+      </origin>
+      <pick publicID="smi:local/pick/1">
+        <time><value>2017-01-01T00:00:15.000000Z</value></time>
+        <waveformID networkCode="XX" stationCode="STA"></waveformID>
+      </pick>
+    </event>
+  </eventParameters>
+</q:quakeml>
+'''
+
+        qml = quakeml.load_xml(string=s)
+        qml_skip = quakeml.load_xml(string=s, skip_picks=True)
+
+        assert len(qml.event_parameters.event_list[0].pick_list) == 1
+        assert len(qml.event_parameters.event_list[0].origin_list[0]
+                   .arrival_list) == 1
+
+        assert qml_skip.event_parameters.event_list[0].pick_list == []
+        assert qml_skip.event_parameters.event_list[0].origin_list[0] \
+            .arrival_list == []
+
+        e1, = qml.get_pyrocko_events()
+        e2, = qml_skip.get_pyrocko_events()
+        assert e1.time == e2.time == util.stt('2017-01-01 00:00:10.5')
+        assert e1.lat == e2.lat == 10.5
+        assert e1.depth == e2.depth == 10000.
+
 
 if __name__ == "__main__":
     util.setup_logging('test_io', 'warning')
@@ -8,6 +8,7 @@ import tempfile
 import os
 import fcntl
 import unittest
+import multiprocessing
 import errno
 from pyrocko import util
 from pyrocko.parimap import parimap
@@ -89,6 +90,18 @@ class ParimapTestCase(unittest.TestCase):
                 if end1 or end2:
                     break
 
+    def test_close(self):
+        for start_method in [None, 'spawn']:
+            results = parimap(
+                abs, range(-100, 0), nprocs=2, start_method=start_method)
+
+            assert next(results) == 100
+            assert next(results) == 99
+
+            # stopping early must not leave worker processes behind
+            results.close()
+            assert multiprocessing.active_children() == []
+
     def test_locks(self):
 
         def work(x):
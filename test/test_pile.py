@@ -38,6 +38,25 @@ def makeManyFiles(nfiles, nsamples, networks, stations, channels, tmin):
     return datadir
 
 
+def makeMixedLengthTraces(ntraces):
+    '''Many short traces plus a few long ones, distributed over 1e5 s.'''
+
+    rstate = num.random.RandomState(123)
+    traces = []
+    for i in range(ntraces):
+        if i % 1000 == 0:
+            tlen = 86400.
+        else:
+            tlen = rstate.uniform(10., 100.)
+
+        tmin = rstate.uniform(0., 100000.)
+        traces.append(trace.Trace(
+            'xx', 's%i' % (i % 10), '', 'z',
+            tmin=tmin, tmax=tmin+tlen, deltat=1.0))
+
+    return traces
+
+
 class PileTestCase(unittest.TestCase):
 
     def testPileTraversal(self):
@@ -109,6 +128,578 @@ class PileTestCase(unittest.TestCase):
         pile.get_cache(cachedir).clean()
         shutil.rmtree(datadir)
 
+    def testSQLiteCache(self):
+        import shutil
+        nfiles = 20
+        nsamples = 100
+        tmin = 1234567890
+        datadir = makeManyFiles(
+            nfiles, nsamples, ['xx'], ['aaaa', 'bbbb'], ['z'], tmin)
+
+        filenames = util.select_files([datadir], show_progress=False)
+        cachedir = pjoin(datadir, '_cache_')
+
+        cache = pile.get_cache(cachedir, backend='sqlite')
+        assert isinstance(cache, pile.SQLiteTracesFileCache)
+
+        p1 = pile.Pile()
+        p1.load_files(filenames=filenames, cache=cache, show_progress=False)
+
+        for fn in filenames:
+            tf = cache.get(os.path.abspath(fn))
+            assert tf is not None
+            assert len(tf.traces) == 1
+
+        p2 = pile.Pile()
+        p2.load_files(filenames=filenames, cache=cache, show_progress=False)
+        assert set(p1.nslc_ids) == set(p2.nslc_ids)
+        assert p1.tmin == p2.tmin and p1.tmax == p2.tmax
+
+        trs1 = list(p1.iter_traces())
+        trs2 = list(p2.iter_traces())
+        assert len(trs1) == len(trs2) == nfiles
+        for tr1, tr2 in zip(trs1, trs2):
+            assert tr1.nslc_id == tr2.nslc_id
+            assert tr1.tmin == tr2.tmin
+            assert tr1.tmax == tr2.tmax
+
+        trs, _ = p2.chop(tmin+10, tmin+nsamples*nfiles-10)
+        assert sum(tr.data_len() for tr in trs) == nsamples*nfiles - 20
+
+        os.unlink(filenames[0])
+        cache.clean()
+        assert cache.get(os.path.abspath(filenames[0])) is None
+
+        shutil.rmtree(datadir)
+
+    def testParallelScan(self):
+        import shutil
+        nfiles = 50
+        nsamples = 100
+        tmin = 1234567890
+        datadir = makeManyFiles(
+            nfiles, nsamples, ['xx'], ['aaaa', 'bbbb'], ['y', 'z'], tmin)
+
+        filenames = util.select_files([datadir], show_progress=False)
+        with open(pjoin(datadir, 'garbage.mseed'), 'w') as f:
+            f.write('garbage')
+
+        filenames.append(pjoin(datadir, 'garbage.mseed'))
+
+        cachedir = pjoin(datadir, '_cache_')
+        cache = pile.get_cache(cachedir)
+
+        p1 = pile.Pile()
+        p1.load_files(filenames=filenames, show_progress=False)
+
+        p2 = pile.Pile()
+        p2.load_files(
+            filenames=filenames, cache=cache, show_progress=False, nprocs=2)
+
+        files1 = sorted(p1.iter_files(), key=lambda f: f.abspath)
+        files2 = sorted(p2.iter_files(), key=lambda f: f.abspath)
+        assert len(files1) == len(files2) == nfiles
+        for f1, f2 in zip(files1, files2):
+            assert f1.abspath == f2.abspath
+            assert [tr.nslc_id for tr in f1.traces] == \
+                [tr.nslc_id for tr in f2.traces]
+
+        for fn in filenames[:-1]:
+            assert cache.get(os.path.abspath(fn)) is not None
+
+        # stopped early, with a running thread
+        import multiprocessing
+        import threading
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            load = pile.loader(
+                filenames, 'mseed', None, None, show_progress=False,
+                nprocs=2)
+
+            assert next(load).abspath == os.path.abspath(
+                sorted(filenames[:-1])[0])
+
+            load.close()
+            assert multiprocessing.active_children() == []
+
+        finally:
+            stop.set()
+            thread.join()
+
+        shutil.rmtree(datadir)
+
+    def testCompactPile(self):
+        import shutil
+        nfiles = 100
+        nsamples = 100
+        tmin = 1234567890
+        datadir = makeManyFiles(
+            nfiles, nsamples, ['xx'], ['aaaa', 'bbbb', 'cccc'], ['y', 'z'],
+            tmin)
+
+        filenames = util.select_files([datadir], show_progress=False)
+
+        p1 = pile.Pile()
+        p1.load_files(filenames=filenames, show_progress=False)
+        p2 = pile.CompactPile()
+        p2.load_files(filenames=filenames, show_progress=False)
+
+        assert p1.tmin == p2.tmin
+        assert p1.tmax == p2.tmax
+        assert p1.nslc_ids == p2.nslc_ids
+        assert p1.deltats == p2.deltats
+
+        def key(tr):
+            return tr.full_id
+
+        for t1, t2 in [
+                (tmin+50, tmin+350),
+                (tmin-10, tmin+1),
+                (tmin+99.5, tmin+100.)]:
+
+            trs1 = sorted(p1.relevant(t1, t2), key=key)
+            trs2 = sorted(p2.relevant(t1, t2), key=key)
+            assert [tr.full_id for tr in trs1] == [tr.full_id for tr in trs2]
+
+        def selector(tr):
+            return tr.station != 'cccc'
+
+        for kwargs in [
+                dict(tinc=333.),
+                dict(tinc=1000., tpad=10., trace_selector=selector),
+                dict(tinc=500., load_data=False)]:
+
+            for trs1, trs2 in zip(p1.chopper(**kwargs), p2.chopper(**kwargs)):
+                assert len(trs1) == len(trs2)
+                for tr1, tr2 in zip(trs1, trs2):
+                    assert tr1.full_id == tr2.full_id
+                    assert tr1.tmax == tr2.tmax
+                    if tr1.ydata is not None:
+                        assert numeq(tr1.ydata, tr2.ydata, 0.001)
+
+        for file in list(p2.iter_files()):
+            assert file.traces is None
+
+        trs2, used_files = p2.chop(tmin+50, tmin+350)
+        assert len(trs2) == len(used_files) == 4
+        for file in list(p2.iter_files()):
+            assert file.traces is None
+
+        files = list(p2.iter_files())[:nfiles//2]
+        p2.remove_files(files)
+        assert len(list(p2.iter_traces())) == nfiles - nfiles//2
+        assert sum(p2.nslc_ids.values()) == nfiles - nfiles//2
+        assert p2.tmin == min(tr.tmin for tr in p2.iter_traces())
+
+        for fn in filenames:
+            mtime = os.stat(fn)[8] + 10
+            os.utime(fn, (mtime, mtime))
+
+        assert p2.reload_modified()
+        assert len(list(p2.iter_traces())) == nfiles - nfiles//2
+        s = sum(num.sum(tr.ydata) for tr in p2.iter_all(include_last=True))
+        assert int(round(s)) == (nfiles - nfiles//2) * nsamples
+
+        shutil.rmtree(datadir)
+
+    def testCompactPileMemory(self):
+        import gc
+        import shutil
+        nfiles = 20
+        datadir = makeManyFiles(
+            nfiles, 100, ['xx'], ['aaaa', 'bbbb'], ['y', 'z'], 1234567890)
+
+        cachedir = tempfile.mkdtemp()
+        filenames = util.select_files([datadir], show_progress=False)
+
+        def count(cls):
+            gc.collect()
+            return sum(1 for obj in gc.get_objects() if isinstance(obj, cls))
+
+        nfiles0 = count(pile.TracesFile)
+        ntraces0 = count(trace.Trace)
+        for backend in ['pickle', 'sqlite']:
+            cache = pile.get_cache(pjoin(cachedir, backend), backend)
+            for _ in range(2):  # scan, then from cache
+                p = pile.CompactPile()
+                p.load_files(
+                    filenames=filenames, cache=cache, show_progress=False)
+
+                assert len(list(p.iter_files())) == nfiles
+                assert count(pile.TracesFile) == nfiles0
+                assert count(trace.Trace) == ntraces0
+
+        p = pile.Pile()
+        p.load_files(filenames=filenames, cache=cache, show_progress=False)
+        assert count(pile.TracesFile) == nfiles0 + nfiles
+
+        shutil.rmtree(datadir)
+        shutil.rmtree(cachedir)
+
+    def testRelevantMixedLengths(self):
+        traces = makeMixedLengthTraces(2000)
+
+        p = pile.Pile()
+        for tr in traces:
+            p.add_file(pile.MemTracesFile(None, [tr]))
+
+        rstate = num.random.RandomState(0)
+        for i in range(100):
+            tmin = rstate.uniform(-1000., 101000.)
+            tmax = tmin + rstate.uniform(0., 1000.)
+            expect = [tr for tr in traces if tr.is_relevant(tmin, tmax)]
+            got = p.relevant(tmin, tmax)
+            assert set(id(tr) for tr in got) == set(id(tr) for tr in expect)
+            assert [tr.tmin for tr in got] == sorted(tr.tmin for tr in got)
+
+        for tr in traces[::2]:
+            p.remove_file(tr.file)
+
+        for i in range(100):
+            tmin = rstate.uniform(-1000., 101000.)
+            tmax = tmin + rstate.uniform(0., 1000.)
+            expect = [
+                tr for tr in traces[1::2] if tr.is_relevant(tmin, tmax)]
+            got = p.relevant(tmin, tmax)
+            assert set(id(tr) for tr in got) == set(id(tr) for tr in expect)
+
+    def benchmark_relevant_mixed_lengths(self):
+        import time
+        traces = makeMixedLengthTraces(100000)
+        p = pile.Pile()
+        p.add_file(pile.MemTracesFile(None, traces))
+
+        def relevant_tlenmax(tmin, tmax):
+            return [tr for tr in p.by_tmin.with_key_in(tmin-p.tlenmax, tmax)
+                    if tr.is_relevant(tmin, tmax)]
+
+        rstate = num.random.RandomState(0)
+        windows = []
+        for i in range(1000):
+            tmin = rstate.uniform(0., 100000.)
+            windows.append((tmin, tmin + 60.))
+
+        for name, relevant in [
+                ('tlenmax', relevant_tlenmax),
+                ('tlenclass', p.relevant)]:
+
+            t0 = time.time()
+            for tmin, tmax in windows:
+                relevant(tmin, tmax)
+
+            print('%-10s %g s' % (name, time.time() - t0))
+
+    def testChopperPrefetch(self):
+        import shutil
+        import threading
+        nfiles = 50
+        nsamples = 100
+        tmin = 1234567890
+        datadir = makeManyFiles(
+            nfiles, nsamples, ['xx'], ['aaaa', 'bbbb'], ['y', 'z'], tmin)
+
+        filenames = util.select_files([datadir], show_progress=False)
+
+        for cls in [pile.Pile, pile.CompactPile]:
+            p = cls()
+            p.load_files(filenames=filenames, show_progress=False)
+
+            for kwargs in [dict(tinc=77.), dict(tinc=230., tpad=5.)]:
+                expect = [
+                    [(tr.full_id, tr.tmax) for tr in trs]
+                    for trs in p.chopper(**kwargs)]
+
+                got = []
+                for trs in p.chopper(prefetch=3, **kwargs):
+                    got.append([(tr.full_id, tr.tmax) for tr in trs])
+                    for tr in trs:
+                        assert num.all(tr.ydata == 1.0)
+
+                assert expect == got
+
+            for trs in p.chopper(tinc=77., prefetch=5):
+                break
+
+            del trs
+
+            # files of the current window are kept open by the chopper
+            open_files = p.open_files[None]
+            for file in p.iter_files():
+                assert file.data_loaded == (file in open_files)
+                assert file.data_use_count == int(file in open_files)
+
+            assert not any(
+                isinstance(t, pile.ChopperPrefetcher)
+                for t in threading.enumerate())
+
+        shutil.rmtree(datadir)
+
+    def testPartialLoading(self):
+        import shutil
+        datadir = tempfile.mkdtemp()
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        traces = []
+        for sta in ['A', 'B']:
+            ydata = num.random.randint(-2**20, 2**20, 100000).astype(
+                num.int32)
+
+            traces.append(trace.Trace(
+                'XX', sta, '', 'HHZ', tmin=tmin, deltat=0.01, ydata=ydata))
+
+        io.save(traces, pjoin(datadir, 'test-%(station)s.mseed'))
+        filenames = util.select_files([datadir], show_progress=False)
+
+        cachedir = tempfile.mkdtemp()
+        cache = pile.SQLiteTracesFileCache(cachedir)
+        p = pile.Pile()
+        p.load_files(filenames=filenames, cache=cache, show_progress=False)
+
+        # record index is built on demand, not when scanning
+        for file in p.iter_files():
+            assert file.abspath not in pile.g_record_indices
+            assert not hasattr(cache.get(file.abspath), 'record_index')
+
+        for tmin_win, tmax_win in [
+                (tmin+10., tmin+20.),
+                (tmin+100.003, tmin+100.017),
+                (tmin-10., tmin+0.5),
+                (tmin+999.9, tmin+1010.)]:
+
+            chopped, used_files = p.chop(tmin_win, tmax_win)
+            assert not used_files
+            assert len(chopped) == 2
+            for tr in chopped:
+                orig = [x for x in traces if x.station == tr.station][0]
+                expect = orig.chop(tmin_win, tmax_win, inplace=False)
+                assert abs(tr.tmin - expect.tmin) < 1e-6
+                assert num.all(tr.ydata == expect.ydata)
+
+            for file in p.iter_files():
+                assert not file.data_loaded
+
+        for file in p.iter_files():
+            _, index = pile.g_record_indices[file.abspath]
+            assert index.size > 10
+
+        chopped, used_files = p.chop(tmin, tmin+900.)
+        assert len(used_files) == 2
+        for file in used_files:
+            file.use_data()
+            file.drop_data()
+            assert not file.data_loaded
+
+        # duplicate records are skipped, as when loading the whole file
+        fn = pjoin(datadir, 'test-A.mseed')
+        st = os.stat(fn)
+        with open(fn, 'rb') as f:
+            data = f.read()
+
+        with open(fn, 'ab') as f:
+            f.write(data)
+
+        # modified within the same second
+        os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        assert os.stat(fn)[8] == st[8]
+
+        _, index = pile.g_record_indices[fn]
+        chopped, used_files = p.chop(
+            tmin+10., tmin+20., trace_selector=lambda tr: tr.station == 'A')
+
+        assert not used_files
+        assert len(chopped) == 1
+        _, index_new = pile.g_record_indices[fn]
+        assert index_new.size == 2 * index.size
+
+        assert len(pile._load_unique(fn, 'mseed', None, False)) == 1
+
+        shutil.rmtree(datadir)
+        shutil.rmtree(cachedir)
+
+    def testOverview(self):
+        import shutil
+        from pyrocko import pile_overview
+        datadir = tempfile.mkdtemp()
+        cachedir = tempfile.mkdtemp()
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        ydata = num.random.randint(-2**20, 2**20, 100001).astype(num.int32)
+        tr = trace.Trace(
+            'XX', 'A', '', 'HHZ', tmin=tmin, deltat=0.01, ydata=ydata)
+
+        io.save([tr], pjoin(datadir, 'test.mseed'))
+        filenames = util.select_files([datadir], show_progress=False)
+
+        p = pile.Pile()
+        p.load_files(filenames=filenames, show_progress=False)
+        htr, = p.relevant(tmin, tmin+1000.)
+
+        assert not pile_overview.use_overview(htr, 0.01)
+        assert pile_overview.use_overview(htr, 1.0)
+
+        cache = pile_overview.OverviewCache(cachedir)
+        overview = cache.get(htr)
+        assert len(overview.levels) == 12
+        assert overview.levels[-1].size == 1
+        assert overview.levels[-1]['min'][0] == ydata.min()
+        assert overview.levels[-1]['max'][0] == ydata.max()
+        assert numeq(overview.levels[-1]['mean'], num.mean(ydata), 1.0)
+        assert numeq(
+            overview.levels[-1]['rms'],
+            num.sqrt(num.mean(ydata.astype(num.float)**2)), 1.0)
+
+        level = overview.levels[2]
+        assert level.size == 391
+        for ibin in (0, 100, 390):
+            chunk = ydata[ibin*256:(ibin+1)*256]
+            assert level['min'][ibin] == chunk.min()
+            assert level['max'][ibin] == chunk.max()
+
+        for file in p.iter_files():
+            assert not file.data_loaded
+
+        otr, = pile_overview.overview_traces(
+            p, tmin+100., tmin+200., 2.56, cache=cache)
+
+        assert otr.nslc_id == tr.nslc_id
+        assert otr.deltat == 1.28
+        assert otr.tmin == tmin + 39*2.56 + 0.64
+        assert otr.ydata.size == 2 * 40
+        assert otr.ydata[0] == level['min'][39]
+        assert otr.ydata[1] == level['max'][39]
+
+        # loaded from disk
+        cache2 = pile_overview.OverviewCache(cachedir)
+        overview2 = cache2._load(htr.file.abspath, htr.file.mtime)
+        assert len(overview2) == 1
+        num.testing.assert_equal(
+            list(overview2.values())[0].levels[2], level)
+
+        # built in advance, without keeping data or pyramids in memory
+        cachedir3 = tempfile.mkdtemp()
+        cache3 = pile_overview.get_cache(cachedir3)
+        assert pile_overview.get_cache(cachedir3) is cache3
+        cache3.update(p.iter_files())
+        assert len(cache3._overviews) == 0
+        for file in p.iter_files():
+            assert not file.data_loaded
+
+        overview3 = cache3._load(htr.file.abspath, htr.file.mtime)
+        num.testing.assert_equal(
+            list(overview3.values())[0].levels[2], level)
+
+        shutil.rmtree(datadir)
+        shutil.rmtree(cachedir)
+        shutil.rmtree(cachedir3)
+
+    def testChopperStream(self):
+        tmin = 1000.
+        ydata = num.random.normal(size=10000)
+        tr = trace.Trace(
+            'XX', 'A', '', 'HHZ', tmin=tmin, deltat=0.01, ydata=ydata)
+
+        p = pile.Pile()
+        p.add_file(pile.MemTracesFile(None, [tr]))
+
+        def pipe(target):
+            return trace.co_bandpass(target, 4, 1., 10.)
+
+        windows = list(p.chopper_stream(
+            pipe, tmin=tmin, tmax=tmin+100., tinc=7.))
+
+        assert len(windows) == 15
+        ydata_out = num.concatenate([w[0].ydata for w in windows])
+        tr.bandpass(4, 1., 10., demean=False)
+        assert numeq(ydata_out, tr.ydata, 1e-9)
+
+    def testChopperConcurrentModification(self):
+        import shutil
+        import threading
+        datadir = tempfile.mkdtemp()
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        for sta in range(10):
+            ydata = num.random.randint(-2**20, 2**20, 10000).astype(num.int32)
+            io.save(
+                [trace.Trace(
+                    'XX', 'S%i' % sta, '', 'HHZ', tmin=tmin, deltat=0.1,
+                    ydata=ydata)],
+                pjoin(datadir, 'test-%(station)s.mseed'))
+
+        filenames = util.select_files([datadir], show_progress=False)
+        p = pile.Pile()
+        p.load_files(filenames=filenames, show_progress=False)
+        injector = pile.Injector(p)
+
+        errors = []
+        stop = threading.Event()
+
+        def work():
+            try:
+                while not stop.is_set():
+                    for traces in p.chopper(
+                            tmin=tmin, tmax=tmin+1000., tinc=100.,
+                            accessor_id='worker'):
+
+                        for tr in traces:
+                            if tr.station != 'MEM':
+                                assert tr.ydata.size == 1000
+
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        try:
+            for i in range(200):
+                fn = filenames[i % len(filenames)]
+                mtime = os.stat(fn)[8] + 1
+                os.utime(fn, (mtime, mtime))
+                p.reload_modified()
+                injector.inject(trace.Trace(
+                    'XX', 'MEM', '', 'HHZ', tmin=tmin+i*10., deltat=0.1,
+                    ydata=num.zeros(100, dtype=num.int32)))
+
+        finally:
+            stop.set()
+            thread.join()
+
+        assert not errors, errors
+        shutil.rmtree(datadir)
+
+    def testInjectorAppend(self):
+        import shutil
+        datadir = tempfile.mkdtemp()
+        tmin = util.str_to_time('2017-01-01 00:00:00')
+        ydata = num.random.randint(-2**20, 2**20, 50000).astype(num.int32)
+
+        p = pile.Pile()
+        injector = pile.Injector(
+            p, fixation_length=100.,
+            path=pjoin(datadir, '%(network)s.%(station)s.mseed'))
+
+        files = set()
+        for i in range(50):
+            injector.inject(trace.Trace(
+                'XX', 'A', '', 'HHZ', tmin=tmin+i*10., deltat=0.01,
+                ydata=ydata[i*1000:(i+1)*1000]))
+
+            files.update(
+                file for file in p.iter_files() if file.abspath is not None)
+
+        injector.fixate_all()
+        injector._close_writer()
+
+        # appended traces are added to the same entry, without rescanning
+        file, = files
+        assert list(p.iter_files()) == [file]
+        assert len(file.traces) == 5
+        assert not file.data_loaded
+
+        tr, = p.all(include_last=True)
+        num.testing.assert_equal(tr.ydata, ydata)
+
+        shutil.rmtree(datadir)
+
     def testMemTracesFile(self):
         tr = trace.Trace(ydata=num.arange(100, dtype=num.float))
 
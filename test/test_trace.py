@@ -5,6 +5,7 @@ standard_library.install_aliases()  # noqa
 
 from builtins import range
 from pyrocko import trace, util, model, pile
+from pyrocko.guts import Dict, String, Float
 import unittest
 import math
 import time
@@ -125,6 +126,44 @@ class TraceTestCase(unittest.TestCase):
                 assert x.ydata.size == 18
                 assert numeq(x.ydata[8:10], res, 1e-6)
 
+    def testDegappingManyFragments(self):
+        dt = 0.1
+        n = 10
+        ydata = num.arange(10000*n, dtype=num.float)
+        traces = []
+        for i in range(10000):
+            if i % 100 == 50:
+                continue
+
+            traces.append(trace.Trace(
+                deltat=dt, ydata=ydata[i*n:(i+1)*n], tmin=i*n*dt))
+
+        for fillmethod in ('interpolate', 'zeros'):
+            xs = trace.degapper(
+                [tr.copy() for tr in traces], maxgap=n+1,
+                fillmethod=fillmethod)
+
+            assert len(xs) == 1
+            assert xs[0].ydata.size == ydata.size
+            num.testing.assert_equal(xs[0].ydata[:500], ydata[:500])
+            if fillmethod == 'interpolate':
+                num.testing.assert_equal(xs[0].ydata, ydata)
+            else:
+                assert num.all(xs[0].ydata[500:510] == 0.)
+
+        xs = trace.degapper(traces[:2], maxgap=0)
+        assert len(xs) == 1
+
+        a = trace.Trace(deltat=dt, ydata=num.ones(10), tmin=0.)
+        b = trace.Trace(deltat=dt, ydata=num.ones(10), tmin=0.5)
+        c = trace.Trace(deltat=dt, ydata=num.ones(10), tmin=1.0)
+        ya = a.ydata
+        xs = trace.degapper([a, b, c], deoverlap='add')
+        assert len(xs) == 1
+        num.testing.assert_equal(
+            xs[0].ydata, num.repeat([1., 2., 2., 1.], 5))
+        assert num.all(ya == 1.)
+
     def testRotation(self):
         s2 = math.sqrt(2.)
         ndata = num.array([s2, s2], dtype=num.float)
@@ -509,6 +548,194 @@ class TraceTestCase(unittest.TestCase):
                 assert (round(c2s[0].tmin / dt2) * dt2 - c2s[0].tmin) \
                     / dt1 < 0.5001
 
+    def testTraceArray(self):
+        deltat = 0.01
+        ntraces, nsamples = 5, 2000
+        traces = []
+        for itr in range(ntraces):
+            traces.append(trace.Trace(
+                'N', 'STA%i' % itr, '', 'Z',
+                tmin=1000.0 + itr*deltat, deltat=deltat,
+                ydata=num.random.normal(size=nsamples+ntraces)))
+
+        arr = trace.TraceArray.from_traces(traces, chop=True)
+        assert arr.data.shape == (ntraces, nsamples+1)
+        assert abs(arr.tmin - traces[-1].tmin) < 1e-6
+
+        with self.assertRaises(trace.MisalignedTraces):
+            trace.TraceArray.from_traces(traces)
+
+        ref = [tr.chop(arr.tmin, arr.tmax, include_last=True, inplace=False)
+               for tr in traces]
+
+        def check(arr, traces):
+            assert len(traces) == arr.ntraces
+            for tr_a, tr_b in zip(arr.to_traces(), traces):
+                assert tr_a.nslc_id == tr_b.nslc_id
+                assert abs(tr_a.tmin - tr_b.tmin) < 1e-6
+                assert abs(tr_a.deltat - tr_b.deltat) < 1e-9
+                num.testing.assert_allclose(
+                    tr_a.ydata, tr_b.ydata, rtol=1e-9, atol=1e-9)
+
+        check(arr, ref)
+
+        for method, args in [
+                ('lowpass', (4, 5.0)),
+                ('highpass', (4, 1.0)),
+                ('bandpass', (4, 1.0, 5.0)),
+                ('downsample', (4,)),
+                ('taper', (trace.CosFader(xfrac=0.1),))]:
+
+            arr_b = arr.copy()
+            getattr(arr_b, method)(*args)
+            traces_b = [tr.copy() for tr in ref]
+            for tr in traces_b:
+                getattr(tr, method)(*args)
+
+            check(arr_b, traces_b)
+
+        taper = trace.CosTaper(1005., 1006., 1012., 1014.)
+        arr_b = arr.copy()
+        arr_b.taper(taper, chop=True)
+        check(arr_b, [tr.taper(taper, inplace=False, chop=True)
+                      for tr in ref])
+
+        resp = trace.PoleZeroResponse(
+            zeros=[0., 0.], poles=[-1.0+1.0j, -1.0-1.0j], constant=2.0)
+
+        for tfade, cut_off_fading in [(0., True), (2., True), (2., False)]:
+            arr_b = arr.transfer(
+                tfade, (0.1, 0.2, 10., 20.), resp,
+                cut_off_fading=cut_off_fading, invert=True)
+
+            check(arr_b, [
+                tr.transfer(
+                    tfade, (0.1, 0.2, 10., 20.), resp,
+                    cut_off_fading=cut_off_fading, invert=True)
+                for tr in ref])
+
+    def testTransferCache(self):
+        cache = trace.transfer_cache
+        cache.clear()
+
+        traces = [
+            trace.Trace(
+                'N', 'STA%i' % i, '', 'Z', tmin=0., deltat=0.01,
+                ydata=num.random.normal(size=1000))
+            for i in range(10)]
+
+        def pz(constant=2.0):
+            return trace.PoleZeroResponse(
+                zeros=[0., 0.], poles=[-1.0+1.0j, -1.0-1.0j],
+                constant=constant)
+
+        flimits = (0.1, 0.2, 10., 20.)
+        outs = [tr.transfer(1., flimits, pz(), invert=True) for tr in traces]
+        stats = cache.stats()
+        assert stats['misses'] == 2
+        assert stats['hits'] == 18
+        assert stats['entries'] == 2
+
+        cache.clear()
+        for tr, out in zip(traces, outs):
+            out2 = tr.transfer(1., flimits, pz(), invert=True)
+            num.testing.assert_equal(out.ydata, out2.ydata)
+            cache.clear()
+
+        resp = pz()
+        traces[0].transfer(1., flimits, resp, invert=True)
+        resp.constant = 3.0
+        out = traces[0].transfer(1., flimits, resp, invert=True)
+        assert cache.stats()['misses'] == 3
+        cache.clear()
+        out2 = traces[0].transfer(1., flimits, pz(3.0), invert=True)
+        num.testing.assert_equal(out.ydata, out2.ydata)
+
+        cache_small = trace.TransferCache(maxbytes=30000)
+        for i in range(5):
+            cache_small.get(i, lambda: num.zeros(1000))
+
+        assert cache_small.stats()['evictions'] == 2
+        assert cache_small.stats()['entries'] == 3
+        cache.clear()
+
+    def testTransferCacheUncacheable(self):
+        cache = trace.transfer_cache
+        cache.clear()
+
+        class Gain(trace.FrequencyResponse):
+            def __init__(self, gain):
+                trace.FrequencyResponse.__init__(self)
+                self._gain = gain
+
+            def evaluate(self, freqs):
+                return num.ones(freqs.size, dtype=num.complex) * self._gain
+
+        class DictResponse(trace.FrequencyResponse):
+            params = Dict.T(String.T(), Float.T())
+
+            def evaluate(self, freqs):
+                return num.ones(freqs.size, dtype=num.complex) \
+                    * self.params['gain']
+
+        tr = trace.Trace(
+            tmin=0., deltat=0.01, ydata=num.random.normal(size=1000))
+
+        for make in (Gain, lambda g: DictResponse(params=dict(gain=g))):
+            out1 = tr.transfer(1., None, make(1.0))
+            out5 = tr.transfer(1., None, make(5.0))
+            num.testing.assert_allclose(out5.ydata, 5.0 * out1.ydata)
+
+        assert cache.stats()['entries'] == 3
+        cache.clear()
+
+    def testCoFilters(self):
+        dt = 0.01
+        y = num.random.normal(size=5000)
+        a = trace.Trace(tmin=0., deltat=dt, ydata=y)
+        bs = [trace.Trace(tmin=i*dt*500, deltat=dt, ydata=y[i*500:(i+1)*500])
+              for i in range(10)]
+
+        a.lowpass(4, 5., demean=False)
+        out = []
+        pipe = trace.co_lowpass(trace.co_list_append(out), 4, 5.)
+        for b in bs:
+            pipe.send(b)
+
+        pipe.close()
+        assert len(out) == 10
+        ydata = num.concatenate([tr.ydata for tr in out])
+        assert numeq(ydata, a.ydata, 1e-9)
+
+        # streamed STA/LTA equals trailing window averages over full trace
+        tshort, tlong = 0.1, 1.0
+        ns, nl = 10, 100
+        out = []
+        pipe = trace.co_sta_lta(trace.co_list_append(out), tshort, tlong)
+        for b in bs:
+            pipe.send(b)
+
+        pipe.close()
+        assert out[0].tmin == (nl-1)*dt
+        ydata = num.concatenate([tr.ydata for tr in out])
+        y2 = y**2
+        i = num.arange(nl-1, y.size)
+        expect = num.array([
+            num.mean(y2[j-ns+1:j+1]) / num.mean(y2[j-nl+1:j+1])
+            for j in i]) * ns / nl
+
+        assert numeq(ydata, expect, 1e-9)
+
+        # state is reset at gaps
+        out = []
+        pipe = trace.co_highpass(trace.co_list_append(out), 4, 1.)
+        pipe.send(bs[0])
+        pipe.send(bs[2])
+        pipe.close()
+        b2 = bs[2].copy()
+        b2.highpass(4, 1., demean=False)
+        assert numeq(out[1].ydata, b2.ydata, 1e-9)
+
     def testEqualizeSamplingRates(self):
         y = num.random.random(1000)
         t1 = trace.Trace(tmin=0, ydata=y, deltat=0.01)